@@ -1,10 +1,7 @@
 # app.py
+import os
 import streamlit as st
 from streamlit_option_menu import option_menu
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import pandas as pd
 from supabase_client import supabase
 
 # Configuración de página
@@ -20,132 +17,15 @@ st.set_page_config(
     }
 )
 
-# CSS personalizado profesional
-st.markdown("""
-<style>
-    /* Tema principal */
-    :root {
-        --primary-color: #1e40af;
-        --secondary-color: #3b82f6;
-        --success-color: #10b981;
-        --warning-color: #f59e0b;
-        --danger-color: #ef4444;
-        --bg-dark: #1f2937;
-    }
-    
-    /* Sidebar mejorado */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #1e3a8a 0%, #1e40af 100%);
-        box-shadow: 4px 0 20px rgba(0,0,0,0.1);
-    }
-    
-    [data-testid="stSidebar"] [data-testid="stMarkdownContainer"] {
-        color: white;
-    }
-    
-    /* Tarjetas de métricas */
-    [data-testid="stMetricValue"] {
-        font-size: 2rem;
-        font-weight: 700;
-        background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-    }
-    
-    /* Botones */
-    .stButton>button {
-        border-radius: 10px;
-        border: none;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    
-    .stButton>button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 12px rgba(0,0,0,0.2);
-    }
-    
-    /* Tablas */
-    [data-testid="stDataFrame"] {
-        border-radius: 10px;
-        overflow: hidden;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    
-    /* Headers */
-    h1 {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-weight: 800;
-    }
-    
-    /* Alertas personalizadas */
-    .custom-alert {
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        border-left: 4px solid;
-    }
-    
-    .alert-success {
-        background-color: #d1fae5;
-        border-color: var(--success-color);
-        color: #065f46;
-    }
-    
-    .alert-warning {
-        background-color: #fef3c7;
-        border-color: var(--warning-color);
-        color: #92400e;
-    }
-    
-    .alert-danger {
-        background-color: #fee2e2;
-        border-color: var(--danger-color);
-        color: #991b1b;
-    }
-    
-    /* Cards profesionales */
-    .metric-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 15px;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        border-left: 5px solid var(--primary-color);
-        transition: transform 0.3s ease;
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 15px 40px rgba(0,0,0,0.15);
-    }
-    
-    /* Tabs mejorados */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-        background-color: #f3f4f6;
-        padding: 0.5rem;
-        border-radius: 10px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        border-radius: 8px;
-        padding: 0.5rem 1.5rem;
-        font-weight: 600;
-    }
-    
-    /* Progress bars */
-    .stProgress > div > div {
-        background: linear-gradient(90deg, var(--success-color), var(--secondary-color));
-        border-radius: 10px;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Tema: CSS empaquetado y minificado una vez por proceso (utils/estilos/)
+from utils.tema import aplicar_tema
+aplicar_tema()
 
 # Importar autenticación
 from app.auth import autenticar, AuthManager
+from app.paginas import PAGINAS, TABLAS_EN_VIVO, cargar_pagina, precalentar
+from utils.graficos import precalentar as precalentar_graficos
+from utils.tiempo_real import estadisticas_tiempo_real, iniciar as iniciar_tiempo_real, mostrar_alertas
 
 # Verificar autenticación
 usuario = autenticar()
@@ -165,24 +45,8 @@ with st.sidebar:
     # Navegación con iconos
     selected = option_menu(
         menu_title="📋 Menú Principal",
-        options=[
-            "Dashboard", 
-            "Incidentes", 
-            "Inspecciones", 
-            "Capacitaciones", 
-            "EPP", 
-            "Documentos", 
-            "Reportes"
-        ],
-        icons=[
-            'speedometer2', 
-            'exclamation-triangle', 
-            'clipboard-check', 
-            'mortarboard', 
-            'shield-check', 
-            'file-earmark-text', 
-            'graph-up'
-        ],
+        options=list(PAGINAS),
+        icons=[icono for _, icono in PAGINAS.values()],
         menu_icon="cast",
         default_index=0,
         styles={
@@ -203,6 +67,10 @@ with st.sidebar:
         }
     )
     
+    # Cambios en tiempo real: toasts de riesgo alto y recarga de las páginas en vivo
+    iniciar_tiempo_real()
+    mostrar_alertas(usuario, TABLAS_EN_VIVO.get(selected, ()))
+    
     st.markdown("---")
     
     # Botón de cerrar sesión
@@ -210,35 +78,40 @@ with st.sidebar:
         AuthManager.logout()
         st.rerun()
     
+    # Métricas de la caché de datos (solo administradores)
+    if usuario['rol'] == 'admin':
+        from utils.data_access import estadisticas_cache
+        stats = estadisticas_cache()
+        with st.expander("📈 Caché de datos"):
+            st.caption(f"Aciertos: {stats['hits']} | Fallos: {stats['misses']} | "
+                       f"Tasa: {stats['tasa_aciertos']:.1f}% | Entradas: {stats['entradas']}")
+            from utils.sincronizacion import estadisticas_sincronizacion
+            sync = estadisticas_sincronizacion()
+            st.caption(f"Sincronización: {sync['completas']} completas | "
+                       f"{sync['incrementales']} incrementales | "
+                       f"{sync['filas_recibidas']} filas recibidas | Copias: {sync['copias']}")
+            vivo = estadisticas_tiempo_real()
+            st.caption(f"Tiempo real ({vivo['modo']}): {'conectado' if vivo['conectado'] else 'desconectado'} | "
+                       f"{vivo['recibidos']} eventos | {vivo['sesiones']} sesiones")
+        
+        from app.limitador import metricas
+        intentos = metricas()
+        with st.expander("🛡️ Intentos de login"):
+            st.caption(f"Permitidos: {intentos['permitidos']} | Fallidos: {intentos['fallos']} | "
+                       f"Rechazados por cuenta: {intentos['rechazados_email']} | "
+                       f"por cliente: {intentos['rechazados_cliente']} | "
+                       f"globales: {intentos['rechazados_global']}")
+    
     st.markdown("---")
     st.caption("🔒 SST Perú v2.0.0")
     st.caption("Ley 29783 - Cumplimiento Legal")
 
-# Contenido principal según selección
-if selected == "Dashboard":
-    from pages import dashboard_mejorado
-    dashboard_mejorado.mostrar(usuario)
-
-elif selected == "Incidentes":
-    from pages import incidentes_mejorado
-    incidentes_mejorado.mostrar(usuario)
-
-elif selected == "Inspecciones":
-    from pages import inspecciones_mejorado
-    inspecciones_mejorado.mostrar(usuario)
-
-elif selected == "Capacitaciones":
-    from pages import capacitaciones_mejorado
-    capacitaciones_mejorado.mostrar(usuario)
-
-elif selected == "EPP":
-    from pages import epp_mejorado
-    epp_mejorado.mostrar(usuario)
+# Contenido principal según selección (la página se importa al elegirla)
+cargar_pagina(selected)(usuario)
 
-elif selected == "Documentos":
-    from pages import documentos_mejorado
-    documentos_mejorado.mostrar(usuario)
+# Tras el login, el resto de páginas se importa en segundo plano
+if os.getenv("PRECARGAR_PAGINAS", "true").lower() == "true":
+    precalentar(excepto=selected)
 
-elif selected == "Reportes":
-    from pages import reportes_mejorado
-    reportes_mejorado.mostrar(usuario)
\ No newline at end of file
+# kaleido también arranca en segundo plano (los reportes usan el nativo mientras tanto)
+precalentar_graficos()
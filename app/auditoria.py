@@ -0,0 +1,183 @@
+# app/auditoria.py
+"""
+Registro asíncrono de auditoría de accesos.
+
+`registrar_acceso` solo encola el evento: un hilo de fondo los agrupa y los
+inserta por lotes en `auditoria_accesos`, y actualiza `usuarios.ultimo_acceso`
+(una vez por usuario y lote, sin reintentos). Si Supabase no responde, el lote se guarda en
+un archivo de spool local (JSONL) y se reenvía más tarde. Así el login solo
+espera la verificación de la contraseña.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+# Espera máxima antes de enviar un lote incompleto (segundos)
+INTERVALO_ENVIO = 2.0
+TAMANO_LOTE = 200
+# Tiempo entre reintentos del spool (segundos)
+REINTENTO_SPOOL = 60
+
+RUTA_SPOOL = os.getenv(
+    "AUDITORIA_SPOOL",
+    os.path.join(tempfile.gettempdir(), "sst_auditoria_spool.jsonl")
+)
+
+_cola = queue.Queue(maxsize=10000)
+_hilo = None
+_hilo_lock = threading.Lock()
+_ultimo_reintento = 0.0
+
+
+def registrar_acceso(usuario_id, accion):
+    """Encola un evento de auditoría (login/logout). No bloquea."""
+    evento = {
+        'usuario_id': usuario_id,
+        'accion': accion,
+        'ip_address': 'N/A',  # Streamlit no tiene acceso directo a IP
+        'user_agent': 'Streamlit App',
+        'ocurrido_en': datetime.now(timezone.utc).isoformat()
+    }
+    _asegurar_hilo()
+    try:
+        _cola.put_nowait(evento)
+    except queue.Full:
+        # Cola saturada (Supabase caído mucho tiempo): directo al spool
+        _guardar_spool([evento])
+
+
+def _asegurar_hilo():
+    global _hilo
+    with _hilo_lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_trabajar, name="auditoria", daemon=True)
+            _hilo.start()
+
+
+def _enviar(lote):
+    """Inserta el lote y actualiza el último acceso de cada usuario que hizo login.
+
+    Solo el insert decide si el lote vuelve al spool: reenviarlo por un fallo
+    en `ultimo_acceso` duplicaría los eventos ya insertados.
+    """
+    supabase.table('auditoria_accesos').insert(lote).execute()
+
+    ultimos = {}
+    for evento in lote:
+        if evento['accion'] == 'login':
+            ultimos[evento['usuario_id']] = max(ultimos.get(evento['usuario_id'], ''), evento['ocurrido_en'])
+    for usuario_id, fecha in ultimos.items():
+        try:
+            supabase.table('usuarios').update({'ultimo_acceso': fecha}).eq('id', usuario_id).execute()
+        except Exception as e:
+            logger.warning("No se pudo actualizar el último acceso de %s: %s", usuario_id, e)
+
+
+def _guardar_spool(lote):
+    try:
+        with open(RUTA_SPOOL, 'a', encoding='utf-8') as f:
+            for evento in lote:
+                f.write(json.dumps(evento) + "\n")
+    except OSError as e:
+        logger.error("No se pudo escribir el spool de auditoría (%s): %s eventos perdidos", e, len(lote))
+
+
+def _reenviar_spool():
+    """Reenvía los eventos guardados; lo que vuelva a fallar regresa al spool."""
+    global _ultimo_reintento
+    if not os.path.exists(RUTA_SPOOL) or time.monotonic() - _ultimo_reintento < REINTENTO_SPOOL:
+        return
+    _ultimo_reintento = time.monotonic()
+
+    procesando = f"{RUTA_SPOOL}.{os.getpid()}.procesando"
+    try:
+        os.replace(RUTA_SPOOL, procesando)
+    except OSError:
+        return
+    eventos = []
+    with open(procesando, encoding='utf-8') as f:
+        for numero, linea in enumerate(f, start=1):
+            if not linea.strip():
+                continue
+            try:
+                eventos.append(json.loads(linea))
+            except ValueError:
+                # Línea truncada (p.ej. caída a mitad de escritura): se descarta
+                logger.error("Línea %s del spool de auditoría ilegible, se descarta: %r",
+                             numero, linea[:200])
+
+    for inicio in range(0, len(eventos), TAMANO_LOTE):
+        lote = eventos[inicio:inicio + TAMANO_LOTE]
+        try:
+            _enviar(lote)
+        except Exception as e:
+            logger.warning("Supabase sigue sin responder, auditoría en spool: %s", e)
+            _guardar_spool(eventos[inicio:])
+            break
+    os.remove(procesando)
+
+
+def _tomar_lote():
+    """Bloquea hasta el primer evento y junta los que lleguen en INTERVALO_ENVIO."""
+    lote = [_cola.get()]
+    limite = time.monotonic() + INTERVALO_ENVIO
+    while len(lote) < TAMANO_LOTE:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        try:
+            lote.append(_cola.get(timeout=restante))
+        except queue.Empty:
+            break
+    return lote
+
+
+def _trabajar():
+    while True:
+        lote = _tomar_lote()
+        enviado = False
+        try:
+            _enviar(lote)
+            enviado = True
+        except Exception as e:
+            logger.warning("No se pudo registrar auditoría, se guarda en spool: %s", e)
+            _guardar_spool(lote)
+        finally:
+            for _ in lote:
+                _cola.task_done()
+        if enviado:
+            # Un error del spool no debe detener el hilo: los eventos nuevos siguen llegando
+            try:
+                _reenviar_spool()
+            except Exception:
+                logger.exception("Falló el reenvío del spool de auditoría")
+
+
+def vaciar(timeout=5.0):
+    """Espera a que se envíen los eventos encolados (p.ej. antes de apagar)."""
+    limite = time.monotonic() + timeout
+    while _cola.unfinished_tasks and time.monotonic() < limite:
+        time.sleep(0.05)
+
+
+@atexit.register
+def _al_salir():
+    # Lo que no alcanzó a enviarse queda en el spool para el próximo arranque
+    pendientes = []
+    while True:
+        try:
+            pendientes.append(_cola.get_nowait())
+        except queue.Empty:
+            break
+    if pendientes:
+        _guardar_spool(pendientes)
@@ -1,10 +1,9 @@
 # app/auth.py
 import streamlit as st
 from supabase_client import supabase
-import hashlib
 import re
-from datetime import datetime, timedelta
 import jwt
+from app import auditoria, credenciales, limitador, sesiones
 
 class AuthManager:
     """Gestor centralizado de autenticación y autorización"""
@@ -19,12 +18,8 @@ class AuthManager:
     
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash seguro de contraseña con salt"""
-        salt = "SST_PERU_2025_SECURE"
-        return hashlib.pbkdf2_hmac('sha256', 
-                                   password.encode('utf-8'), 
-                                   salt.encode('utf-8'), 
-                                   100000).hex()
+        """Hash seguro de contraseña con sal aleatoria por usuario"""
+        return credenciales.hash_password(password)
     
     @staticmethod
     def validar_password(password: str) -> tuple[bool, str]:
@@ -42,35 +37,40 @@ class AuthManager:
         return True, "Contraseña válida"
     
     @staticmethod
-    def login(email: str, password: str) -> dict:
-        """Autenticación de usuario"""
+    def login(email: str, password: str, huella: str = None) -> dict:
+        """Autenticación de usuario (lanza limitador.IntentosExcedidos)"""
+        # Antes de consultar la base de datos y de calcular ningún hash
+        limitador.verificar_intento(email, huella or limitador.huella_cliente())
+        
         try:
-            pwd_hash = AuthManager.hash_password(password)
-            
+            # Se busca solo por email; el hash se verifica en Python
             response = supabase.table('usuarios').select('*') \
                 .eq('email', email) \
-                .eq('password_hash', pwd_hash) \
                 .eq('activo', True) \
                 .execute()
             
-            if response.data:
-                usuario = response.data[0]
-                
-                # Actualizar último acceso
-                supabase.table('usuarios').update({
-                    'ultimo_acceso': datetime.now().isoformat()
-                }).eq('id', usuario['id']).execute()
+            if not response.data:
+                credenciales.verificar_relleno(password)
+                limitador.registrar_fallo(email)
+                return None
+            
+            usuario = response.data[0]
+            almacenado = usuario.pop('password_hash', None)
+            
+            if credenciales.verificar_password(password, almacenado):
+                # Migrar al algoritmo/costo actual de forma transparente
+                if credenciales.necesita_rehash(almacenado):
+                    supabase.table('usuarios').update({
+                        'password_hash': credenciales.hash_password(password)
+                    }).eq('id', usuario['id']).execute()
                 
-                # Registrar en auditoría
-                supabase.table('auditoria_accesos').insert({
-                    'usuario_id': usuario['id'],
-                    'accion': 'login',
-                    'ip_address': 'N/A',  # Streamlit no tiene acceso directo a IP
-                    'user_agent': 'Streamlit App'
-                }).execute()
+                # Auditoría y último acceso: en segundo plano, por lotes
+                auditoria.registrar_acceso(usuario['id'], 'login')
+                limitador.registrar_exito(email)
                 
                 return usuario
             
+            limitador.registrar_fallo(email)
             return None
             
         except Exception as e:
@@ -81,38 +81,21 @@ class AuthManager:
     def logout():
         """Cierre de sesión seguro"""
         if 'usuario' in st.session_state:
-            # Registrar logout
-            try:
-                supabase.table('auditoria_accesos').insert({
-                    'usuario_id': st.session_state.usuario['id'],
-                    'accion': 'logout',
-                    'ip_address': 'N/A',
-                    'user_agent': 'Streamlit App'
-                }).execute()
-            except:
-                pass
-            
-            st.session_state.clear()
+            # Registrar logout (asíncrono)
+            auditoria.registrar_acceso(st.session_state.usuario['id'], 'logout')
+        
+        # Revoca el token de sesión y limpia la URL
+        sesiones.cerrar_sesion()
     
     @staticmethod
     def require_auth():
         """Decorator para páginas que requieren autenticación"""
-        if 'usuario' not in st.session_state:
-            st.error("🔒 Debes iniciar sesión para acceder")
-            st.stop()
-        return st.session_state.usuario
+        return sesiones.require_auth()
     
     @staticmethod
     def require_role(roles_permitidos: list):
         """Decorator para control de acceso por rol"""
-        usuario = AuthManager.require_auth()
-        
-        if usuario['rol'] not in roles_permitidos:
-            st.error(f"❌ Acceso Denegado. Rol requerido: {', '.join(roles_permitidos)}")
-            st.info(f"Tu rol actual: **{usuario['rol']}**")
-            st.stop()
-        
-        return usuario
+        return sesiones.require_role(roles_permitidos)
     
     @staticmethod
     def tiene_permiso_mayor_o_igual(rol_usuario: str, rol_requerido: str) -> bool:
@@ -125,31 +108,7 @@ class AuthManager:
 def mostrar_login():
     """Página de login mejorada con diseño profesional"""
     
-    st.markdown("""
-        <style>
-        .login-container {
-            max-width: 400px;
-            margin: 0 auto;
-            padding: 2rem;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            border-radius: 20px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-        }
-        .login-title {
-            color: white;
-            text-align: center;
-            font-size: 2.5rem;
-            margin-bottom: 1rem;
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-        }
-        .login-subtitle {
-            color: #e0e7ff;
-            text-align: center;
-            font-size: 1rem;
-            margin-bottom: 2rem;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    # Las clases .login-* vienen en el tema global (utils/estilos/login.css)
     
     col1, col2, col3 = st.columns([1, 2, 1])
     
@@ -176,10 +135,14 @@ def mostrar_login():
                 st.error("❌ Completa todos los campos")
             else:
                 with st.spinner("Autenticando..."):
-                    usuario = AuthManager.login(email, password)
+                    try:
+                        usuario = AuthManager.login(email, password)
+                    except limitador.IntentosExcedidos as e:
+                        st.error(f"⏳ {e.motivo}. Intenta de nuevo en {e.espera} s")
+                        st.stop()
                     
                     if usuario:
-                        st.session_state.usuario = usuario
+                        sesiones.iniciar_sesion(usuario)
                         st.success(f"✅ Bienvenido, {usuario['nombre_completo']}")
                         st.balloons()
                         st.rerun()
@@ -265,8 +228,10 @@ def mostrar_registro():
 # Función principal de autenticación
 def autenticar():
     """Punto de entrada de autenticación"""
-    if 'usuario' in st.session_state:
-        return st.session_state.usuario
+    # Token firmado en sesión o en la URL: se valida sin consultar la base de datos
+    usuario = sesiones.restaurar_sesion()
+    if usuario:
+        return usuario
     
     if st.session_state.get('mostrar_registro', False):
         mostrar_registro()
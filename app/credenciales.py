@@ -0,0 +1,165 @@
+# app/credenciales.py
+"""
+Hash y verificación de contraseñas.
+
+Cada hash guarda su algoritmo y costo junto con una sal aleatoria propia:
+
+    scrypt$<n>$<r>$<p>$<sal_b64>$<hash_b64>
+    pbkdf2_sha256$<iteraciones>$<sal_b64>$<hash_b64>
+
+Los hashes antiguos (hex de PBKDF2 con sal fija) se siguen aceptando;
+`necesita_rehash` indica cuándo regrabar con la configuración actual, lo que
+el login hace de forma transparente. La configuración se ajusta por .env
+(`HASH_ALGORITMO`, `HASH_SCRYPT_N`, `HASH_PBKDF2_ITERACIONES`) con ayuda de
+`python -m app.credenciales`, que mide la latencia de cada costo.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+# Algoritmo y costos para hashes nuevos
+ALGORITMO = os.getenv("HASH_ALGORITMO", "scrypt")
+SCRYPT_N = int(os.getenv("HASH_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERACIONES = int(os.getenv("HASH_PBKDF2_ITERACIONES", "210000"))
+LARGO_SAL = 16
+LARGO_HASH = 32
+
+# Formato anterior: PBKDF2-SHA256 con sal fija, 100k iteraciones, hex
+_SAL_LEGADA = b"SST_PERU_2025_SECURE"
+_ITERACIONES_LEGADAS = 100000
+
+# Caché de verificaciones correctas recientes (reintentos, doble envío del form)
+TTL_VERIFICACION = 60
+_clave_cache = secrets.token_bytes(32)   # solo vive en este proceso
+_verificadas = {}
+_lock = threading.Lock()
+
+
+def _b64(datos):
+    return base64.b64encode(datos).decode('ascii').rstrip('=')
+
+
+def _desde_b64(texto):
+    return base64.b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _scrypt(password, sal, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=sal, n=n, r=r, p=p,
+                          maxmem=128 * r * n * 2, dklen=LARGO_HASH)
+
+
+def _pbkdf2(password, sal, iteraciones):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), sal, iteraciones, LARGO_HASH)
+
+
+def hash_password(password, algoritmo=None, costo=None):
+    """Descriptor `algoritmo$costo$sal$hash` con sal aleatoria.
+
+    `costo` es N para scrypt o las iteraciones para PBKDF2 (por defecto,
+    la configuración actual).
+    """
+    algoritmo = algoritmo or ALGORITMO
+    sal = secrets.token_bytes(LARGO_SAL)
+    if algoritmo == 'scrypt':
+        n = costo or SCRYPT_N
+        derivado = _scrypt(password, sal, n, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${n}${SCRYPT_R}${SCRYPT_P}${_b64(sal)}${_b64(derivado)}"
+    if algoritmo == 'pbkdf2_sha256':
+        iteraciones = costo or PBKDF2_ITERACIONES
+        derivado = _pbkdf2(password, sal, iteraciones)
+        return f"pbkdf2_sha256${iteraciones}${_b64(sal)}${_b64(derivado)}"
+    raise ValueError(f"Algoritmo de hash no soportado: {algoritmo}")
+
+
+def _verificar_sin_cache(password, almacenado):
+    partes = almacenado.split('$')
+    if partes[0] == 'scrypt' and len(partes) == 6:
+        n, r, p = (int(x) for x in partes[1:4])
+        esperado = _desde_b64(partes[5])
+        return hmac.compare_digest(_scrypt(password, _desde_b64(partes[4]), n, r, p), esperado)
+    if partes[0] == 'pbkdf2_sha256' and len(partes) == 4:
+        esperado = _desde_b64(partes[3])
+        return hmac.compare_digest(_pbkdf2(password, _desde_b64(partes[2]), int(partes[1])), esperado)
+    if len(almacenado) == 64:
+        derivado = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'),
+                                       _SAL_LEGADA, _ITERACIONES_LEGADAS).hex()
+        return hmac.compare_digest(derivado, almacenado)
+    return False
+
+
+def verificar_password(password, almacenado):
+    """True si `password` corresponde al hash `almacenado` (cualquier formato)."""
+    if not almacenado:
+        return False
+    clave = hmac.new(_clave_cache, f"{almacenado}\0{password}".encode('utf-8'), 'sha256').digest()
+    ahora = time.monotonic()
+    with _lock:
+        expira = _verificadas.get(clave)
+        if expira is not None and expira > ahora:
+            return True
+
+    valido = _verificar_sin_cache(password, almacenado)
+
+    if valido:
+        with _lock:
+            # Limpieza perezosa para que el dict no crezca sin límite
+            for k in [k for k, e in _verificadas.items() if e <= ahora]:
+                del _verificadas[k]
+            _verificadas[clave] = ahora + TTL_VERIFICACION
+    return valido
+
+
+def necesita_rehash(almacenado):
+    """True si el hash no usa el algoritmo/costo configurado actualmente."""
+    partes = (almacenado or '').split('$')
+    if ALGORITMO == 'scrypt':
+        return not (partes[0] == 'scrypt' and len(partes) == 6
+                    and partes[1:4] == [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)])
+    if ALGORITMO == 'pbkdf2_sha256':
+        return not (partes[0] == 'pbkdf2_sha256' and len(partes) == 4
+                    and partes[1] == str(PBKDF2_ITERACIONES))
+    return True
+
+
+_hash_relleno = None
+
+
+def verificar_relleno(password):
+    """Verificación contra un hash descartable cuando el email no existe,
+    para que el tiempo de respuesta no revele qué cuentas existen."""
+    global _hash_relleno
+    if _hash_relleno is None:
+        _hash_relleno = hash_password(secrets.token_urlsafe(16))
+    _verificar_sin_cache(password, _hash_relleno)
+
+
+def medir_costos(configuraciones=None, repeticiones=5):
+    """Latencia media (ms) de `hash_password` por (algoritmo, costo)."""
+    configuraciones = configuraciones or [
+        ('pbkdf2_sha256', 100000), ('pbkdf2_sha256', 210000), ('pbkdf2_sha256', 600000),
+        ('scrypt', 2 ** 13), ('scrypt', 2 ** 14), ('scrypt', 2 ** 15),
+    ]
+    resultados = []
+    for algoritmo, costo in configuraciones:
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            hash_password("Benchmark#2025", algoritmo, costo)
+        ms = (time.perf_counter() - inicio) / repeticiones * 1000
+        resultados.append({'algoritmo': algoritmo, 'costo': costo, 'ms': round(ms, 1),
+                           'logins_por_segundo_por_nucleo': round(1000 / ms, 1)})
+    return resultados
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.credenciales
+    print(f"{'algoritmo':<15}{'costo':>10}{'ms':>10}{'logins/s/núcleo':>18}")
+    for fila in medir_costos():
+        print(f"{fila['algoritmo']:<15}{fila['costo']:>10}{fila['ms']:>10}"
+              f"{fila['logins_por_segundo_por_nucleo']:>18}")
+    print(f"\nActual: {ALGORITMO} (N={SCRYPT_N}, iteraciones PBKDF2={PBKDF2_ITERACIONES})")
@@ -0,0 +1,253 @@
+# app/limitador.py
+"""
+Limitador de intentos de login, aplicado antes de verificar la contraseña.
+
+- Ventana deslizante de intentos fallidos por email (bloqueo temporal).
+- Ventana deslizante de intentos por cliente (IP de origen). La IP es la del
+  socket o, si el socket es un proxy de `LIMITADOR_PROXIES_CONFIABLES`, el
+  último salto de X-Forwarded-For que no es un proxy confiable (los saltos
+  anteriores los escribe el cliente). Sin IP confiable no hay ventana por
+  cliente: quedan la del email y el bucket global.
+- Token bucket global del proceso, que acota el CPU gastado en hashes.
+
+Las ventanas se guardan en memoria (dict con expulsión LRU) o, para varias
+réplicas, en la tabla `intentos_login` de Postgres (`LIMITADOR_ALMACEN`).
+"""
+import hashlib
+import ipaddress
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+# (intentos, segundos)
+LIMITE_FALLOS_EMAIL = (5, 300)
+LIMITE_INTENTOS_CLIENTE = (20, 60)
+# Token bucket global: capacidad y recarga por segundo
+CAPACIDAD_GLOBAL = 30
+RECARGA_GLOBAL = 10.0
+
+MAX_CLAVES_MEMORIA = 10000
+
+# IPs o redes (CIDR) de los proxies delante de la app, separadas por comas
+PROXIES_CONFIABLES = tuple(
+    ipaddress.ip_network(red.strip(), strict=False)
+    for red in os.getenv("LIMITADOR_PROXIES_CONFIABLES", "").split(",") if red.strip()
+)
+
+
+class IntentosExcedidos(RuntimeError):
+    """Intento de login rechazado por el limitador"""
+
+    def __init__(self, motivo, espera):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.espera = int(espera) + 1
+
+
+class AlmacenMemoria:
+    """Ventanas por clave en este proceso; las claves menos usadas se expulsan."""
+
+    def __init__(self, max_claves=MAX_CLAVES_MEMORIA):
+        self._ventanas = OrderedDict()
+        self._max_claves = max_claves
+        self._lock = threading.Lock()
+
+    def registrar(self, clave, ahora):
+        with self._lock:
+            ventana = self._ventanas.setdefault(clave, deque())
+            ventana.append(ahora)
+            self._ventanas.move_to_end(clave)
+            while len(self._ventanas) > self._max_claves:
+                self._ventanas.popitem(last=False)
+
+    def recientes(self, clave, desde):
+        """Instantes registrados para `clave` desde `desde` (en orden)."""
+        with self._lock:
+            ventana = self._ventanas.get(clave)
+            if not ventana:
+                return []
+            while ventana and ventana[0] < desde:
+                ventana.popleft()
+            return list(ventana)
+
+    def limpiar(self, clave):
+        with self._lock:
+            self._ventanas.pop(clave, None)
+
+
+class AlmacenPostgres:
+    """Ventanas compartidas entre réplicas en la tabla `intentos_login`."""
+
+    def registrar(self, clave, ahora):
+        supabase.table('intentos_login').insert({
+            'clave': clave,
+            'ocurrido_en': datetime.fromtimestamp(ahora, timezone.utc).isoformat()
+        }).execute()
+
+    def recientes(self, clave, desde):
+        filas = supabase.table('intentos_login').select('ocurrido_en') \
+            .eq('clave', clave) \
+            .gte('ocurrido_en', datetime.fromtimestamp(desde, timezone.utc).isoformat()) \
+            .order('ocurrido_en') \
+            .execute().data or []
+        return [datetime.fromisoformat(f['ocurrido_en']).timestamp() for f in filas]
+
+    def limpiar(self, clave):
+        supabase.table('intentos_login').delete().eq('clave', clave).execute()
+
+
+def _crear_almacen():
+    if os.getenv("LIMITADOR_ALMACEN", "memoria") == "postgres":
+        return AlmacenPostgres()
+    return AlmacenMemoria()
+
+
+_almacen = _crear_almacen()
+_lock = threading.Lock()
+_tokens = float(CAPACIDAD_GLOBAL)
+_recargado_en = time.monotonic()
+_metricas = {'permitidos': 0, 'rechazados_email': 0, 'rechazados_cliente': 0,
+             'rechazados_global': 0, 'fallos': 0}
+
+
+def _clave_email(email):
+    return f"email:{(email or '').strip().lower()}"
+
+
+def _clave_cliente(huella):
+    return f"cliente:{huella}"
+
+
+def _espera_ventana(almacen, clave, limite, ahora):
+    """Segundos hasta que la ventana admite otro intento (0 si ya lo admite)."""
+    maximo, segundos = limite
+    recientes = almacen.recientes(clave, ahora - segundos)
+    if len(recientes) < maximo:
+        return 0
+    return recientes[-maximo] + segundos - ahora
+
+
+def _tomar_token(ahora):
+    global _tokens, _recargado_en
+    monotono = time.monotonic()
+    _tokens = min(CAPACIDAD_GLOBAL, _tokens + (monotono - _recargado_en) * RECARGA_GLOBAL)
+    _recargado_en = monotono
+    if _tokens >= 1:
+        _tokens -= 1
+        return 0
+    return (1 - _tokens) / RECARGA_GLOBAL
+
+
+def _ip(valor):
+    try:
+        return ipaddress.ip_address((valor or '').strip())
+    except ValueError:
+        return None
+
+
+def _es_proxy_confiable(ip):
+    return ip is not None and any(ip in red for red in PROXIES_CONFIABLES)
+
+
+def ip_origen(remota, reenviado_por=()):
+    """IP del cliente: `remota` (socket) o, tras un proxy confiable, el último
+    salto de X-Forwarded-For que no es un proxy confiable. None si no se sabe."""
+    ip = _ip(remota)
+    saltos = [s for cabecera in reenviado_por for s in cabecera.split(',')]
+    while _es_proxy_confiable(ip) and saltos:
+        ip = _ip(saltos.pop())
+    if ip is None or _es_proxy_confiable(ip):
+        return None
+    return str(ip)
+
+
+def _conexion_sesion():
+    """(IP del socket, cabeceras X-Forwarded-For) de la sesión de Streamlit."""
+    import streamlit as st
+    remota, reenviado_por = None, []
+    try:
+        # `st.context` existe desde Streamlit 1.37
+        remota = getattr(st.context, 'ip_address', None)
+        reenviado_por = st.context.headers.get_all('X-Forwarded-For')
+        if remota is None:
+            # Streamlit < 1.45 no expone la IP: se toma de la petición del websocket
+            from streamlit.runtime.context import _get_request
+            peticion = _get_request()
+            remota = peticion.remote_ip if peticion is not None else None
+    except Exception as e:
+        logger.debug("Sin datos de conexión de la sesión: %s", e)
+    return remota, reenviado_por
+
+
+def huella_cliente():
+    """Huella de la IP de origen de la sesión; None si no hay IP confiable."""
+    origen = ip_origen(*_conexion_sesion())
+    if origen is None:
+        return None
+    return hashlib.sha256(origen.encode('utf-8')).hexdigest()[:32]
+
+
+def verificar_intento(email, huella):
+    """Registra el intento o lanza `IntentosExcedidos` con el tiempo de espera."""
+    ahora = time.time()
+    try:
+        espera = _espera_ventana(_almacen, _clave_email(email), LIMITE_FALLOS_EMAIL, ahora)
+        if espera > 0:
+            _contar('rechazados_email')
+            raise IntentosExcedidos("Demasiados intentos fallidos para esta cuenta", espera)
+
+        # Sin huella no hay ventana por cliente (una compartida bloquearía a todos)
+        if huella is not None:
+            espera = _espera_ventana(_almacen, _clave_cliente(huella), LIMITE_INTENTOS_CLIENTE, ahora)
+            if espera > 0:
+                _contar('rechazados_cliente')
+                raise IntentosExcedidos("Demasiados intentos desde este dispositivo", espera)
+
+            _almacen.registrar(_clave_cliente(huella), ahora)
+    except IntentosExcedidos:
+        raise
+    except Exception as e:
+        # Si el almacén compartido falla, el bucket global sigue protegiendo el CPU
+        logger.warning("Limitador sin almacén disponible: %s", e)
+
+    with _lock:
+        espera = _tomar_token(ahora)
+    if espera > 0:
+        _contar('rechazados_global')
+        raise IntentosExcedidos("El sistema está recibiendo demasiados inicios de sesión", espera)
+    _contar('permitidos')
+
+
+def registrar_fallo(email):
+    """Suma un fallo a la ventana del email (bloqueo tras LIMITE_FALLOS_EMAIL)."""
+    _contar('fallos')
+    try:
+        _almacen.registrar(_clave_email(email), time.time())
+    except Exception as e:
+        logger.warning("No se pudo registrar el intento fallido: %s", e)
+
+
+def registrar_exito(email):
+    """Un login correcto reinicia los fallos de la cuenta."""
+    try:
+        _almacen.limpiar(_clave_email(email))
+    except Exception as e:
+        logger.warning("No se pudo limpiar los intentos de la cuenta: %s", e)
+
+
+def _contar(clave):
+    with _lock:
+        _metricas[clave] += 1
+
+
+def metricas():
+    """Contadores de intentos permitidos y rechazados en este proceso."""
+    with _lock:
+        return dict(_metricas)
@@ -0,0 +1,127 @@
+# app/paginas.py
+"""
+Registro de páginas del menú con importación diferida.
+
+Cada entrada del menú apunta a un módulo `pages.*_mejorado` que solo se
+importa al seleccionarla (o al precalentar en segundo plano tras el login).
+
+Perfil de arranque en frío (`-X importtime`) de cada página:
+
+    python -m app.paginas [--limite-ms 1500]
+
+`tests/test_paginas.py` falla si alguna página supera `PAGINAS_LIMITE_MS`.
+"""
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Entrada del menú -> (módulo, icono)
+PAGINAS = {
+    "Dashboard": ("pages.dashboard_mejorado", 'speedometer2'),
+    "Incidentes": ("pages.incidentes_mejorado", 'exclamation-triangle'),
+    "Inspecciones": ("pages.inspecciones_mejorado", 'clipboard-check'),
+    "Capacitaciones": ("pages.capacitaciones_mejorado", 'mortarboard'),
+    "EPP": ("pages.epp_mejorado", 'shield-check'),
+    "Documentos": ("pages.documentos_mejorado", 'file-earmark-text'),
+    "Reportes": ("pages.reportes_mejorado", 'graph-up'),
+}
+
+# Páginas que se relanzan al llegar cambios en tiempo real de estas tablas
+# (las de formularios no, para no interrumpir la captura)
+TABLAS_EN_VIVO = {
+    "Dashboard": ('incidentes', 'inspecciones'),
+}
+
+_lock = threading.Lock()
+_cargadas = {}
+_precalentado = False
+
+
+def cargar_pagina(nombre):
+    """Función `mostrar(usuario)` de la página (importada una sola vez)."""
+    mostrar = _cargadas.get(nombre)
+    if mostrar is None:
+        modulo = importlib.import_module(PAGINAS[nombre][0])
+        mostrar = _cargadas.setdefault(nombre, modulo.mostrar)
+    return mostrar
+
+
+def _precalentar(nombres):
+    for nombre in nombres:
+        try:
+            cargar_pagina(nombre)
+        except Exception as e:
+            logger.warning("No se pudo precargar la página %s: %s", nombre, e)
+
+
+def precalentar(excepto=None):
+    """Importa el resto de páginas en un hilo de fondo (una vez por proceso)."""
+    global _precalentado
+    with _lock:
+        if _precalentado:
+            return
+        _precalentado = True
+    pendientes = [n for n in PAGINAS if n != excepto and n not in _cargadas]
+    threading.Thread(target=_precalentar, args=(pendientes,),
+                     name="precalentar-paginas", daemon=True).start()
+
+
+# ------------------------------------------------------------
+# Perfil de importación
+# ------------------------------------------------------------
+def perfil_importacion(modulo):
+    """(total_ms, {paquete: ms_propios}) al importar `modulo` en un intérprete nuevo."""
+    import subprocess
+    import sys
+
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr.strip().splitlines()[-1])
+
+    total = None
+    por_paquete = {}
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        paquete = nombre.strip().split(".")[0]
+        por_paquete[paquete] = por_paquete.get(paquete, 0) + int(propio) / 1000
+        # El total es el acumulado del propio módulo (incluye todo lo que importa)
+        if nombre.strip() == modulo:
+            total = int(acumulado) / 1000
+    if total is None:
+        raise RuntimeError(f"{modulo} no aparece en el perfil de importación")
+    return total, por_paquete
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Perfil de importación en frío de las páginas")
+    parser.add_argument("--limite-ms", type=float, default=None,
+                        help="falla (código 1) si alguna página supera este tiempo")
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    excedidas = []
+    for nombre, (modulo, _) in PAGINAS.items():
+        try:
+            total, por_paquete = perfil_importacion(modulo)
+        except RuntimeError as e:
+            print(f"{nombre:<16} error: {e}")
+            continue
+        principales = sorted(por_paquete.items(), key=lambda p: p[1], reverse=True)[:args.top]
+        print(f"{nombre:<16} {total:8.0f} ms  " +
+              ", ".join(f"{p} {ms:.0f}" for p, ms in principales))
+        if args.limite_ms is not None and total > args.limite_ms:
+            excedidas.append(nombre)
+
+    if excedidas:
+        print(f"Superan {args.limite_ms:.0f} ms: {', '.join(excedidas)}")
+        sys.exit(1)
@@ -0,0 +1,184 @@
+# app/sesiones.py
+"""
+Sesiones con token firmado (JWT HS256).
+
+Al iniciar sesión se emite un token con id, email, nombre, rol y área. Se
+guarda en `st.session_state` y en el parámetro `?sesion=` de la URL, así un
+refresco del navegador o una reconexión del websocket restauran la sesión
+validando la firma localmente, sin consultar `usuarios`.
+
+Revocación: `cerrar_sesion` agrega el `jti` del token a una lista local y a
+la tabla `sesiones_revocadas`, que cada proceso relee como mucho cada
+`SINCRONIZACION_REVOCADOS` segundos.
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import streamlit as st
+
+from supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+ALGORITMO_JWT = "HS256"
+DURACION_SESION = timedelta(hours=int(os.getenv("SESION_HORAS", "12")))
+PARAMETRO_URL = "sesion"
+SINCRONIZACION_REVOCADOS = 30
+
+_SECRETO = os.getenv("JWT_SECRET")
+if not _SECRETO:
+    # Sin secreto configurado los tokens solo valen mientras viva el proceso
+    logger.warning("JWT_SECRET no configurado: las sesiones no sobreviven a un reinicio")
+    _SECRETO = secrets.token_urlsafe(32)
+
+_lock = threading.Lock()
+_revocados = {}              # jti -> exp (epoch)
+_revocados_sincronizado = 0.0
+
+
+def emitir_token(usuario):
+    """JWT firmado con los datos del usuario necesarios para las páginas."""
+    ahora = datetime.now(timezone.utc)
+    claims = {
+        'sub': str(usuario['id']),
+        'email': usuario.get('email'),
+        'nombre_completo': usuario.get('nombre_completo'),
+        'rol': usuario.get('rol'),
+        'area': usuario.get('area'),
+        'iat': ahora,
+        'exp': ahora + DURACION_SESION,
+        'jti': uuid.uuid4().hex,
+    }
+    return jwt.encode(claims, _SECRETO, algorithm=ALGORITMO_JWT)
+
+
+def _sincronizar_revocados():
+    """Relee la lista de revocación compartida (tolerante a que la tabla no exista)."""
+    global _revocados_sincronizado
+    if time.monotonic() - _revocados_sincronizado < SINCRONIZACION_REVOCADOS:
+        return
+    _revocados_sincronizado = time.monotonic()
+    try:
+        filas = supabase.table('sesiones_revocadas').select('jti,expira_en') \
+            .gt('expira_en', datetime.now(timezone.utc).isoformat()) \
+            .execute().data or []
+    except Exception as e:
+        logger.warning("No se pudo leer sesiones_revocadas: %s", e)
+        return
+    ahora = time.time()
+    with _lock:
+        for jti in [j for j, exp in _revocados.items() if exp < ahora]:
+            del _revocados[jti]
+        for fila in filas:
+            _revocados[fila['jti']] = datetime.fromisoformat(fila['expira_en']).timestamp()
+
+
+def validar_token(token):
+    """Usuario (dict) del token si la firma, la expiración y la revocación son válidas."""
+    if not token:
+        return None
+    try:
+        claims = jwt.decode(token, _SECRETO, algorithms=[ALGORITMO_JWT],
+                            options={'require': ['exp', 'sub', 'jti']})
+    except jwt.InvalidTokenError:
+        return None
+
+    _sincronizar_revocados()
+    with _lock:
+        if claims['jti'] in _revocados:
+            return None
+
+    return {
+        'id': claims['sub'],
+        'email': claims.get('email'),
+        'nombre_completo': claims.get('nombre_completo'),
+        'rol': claims.get('rol'),
+        'area': claims.get('area'),
+    }
+
+
+def revocar_token(token):
+    """Invalida el token en este proceso y en la lista compartida."""
+    try:
+        claims = jwt.decode(token, _SECRETO, algorithms=[ALGORITMO_JWT],
+                            options={'verify_exp': False})
+    except jwt.InvalidTokenError:
+        return
+    with _lock:
+        _revocados[claims['jti']] = claims['exp']
+    try:
+        supabase.table('sesiones_revocadas').insert({
+            'jti': claims['jti'],
+            'usuario_id': claims['sub'],
+            'expira_en': datetime.fromtimestamp(claims['exp'], timezone.utc).isoformat()
+        }).execute()
+    except Exception as e:
+        logger.warning("No se pudo registrar la revocación en sesiones_revocadas: %s", e)
+
+
+# ------------------------------------------------------------
+# Integración con Streamlit
+# ------------------------------------------------------------
+def iniciar_sesion(usuario):
+    """Emite el token y lo deja en la sesión y en la URL."""
+    token = emitir_token(usuario)
+    st.session_state.usuario = usuario
+    st.session_state.token_sesion = token
+    st.query_params[PARAMETRO_URL] = token
+    return token
+
+
+def restaurar_sesion():
+    """Usuario de la sesión actual, o None. No consulta la base de datos."""
+    token = st.session_state.get('token_sesion') or st.query_params.get(PARAMETRO_URL)
+    usuario = validar_token(token)
+
+    if usuario is None:
+        for clave in ('usuario', 'token_sesion'):
+            st.session_state.pop(clave, None)
+        if PARAMETRO_URL in st.query_params:
+            del st.query_params[PARAMETRO_URL]
+        return None
+
+    if 'usuario' not in st.session_state:
+        st.session_state.usuario = usuario
+        st.session_state.token_sesion = token
+    elif st.query_params.get(PARAMETRO_URL) != token:
+        # La navegación puede limpiar la URL: se vuelve a fijar el token
+        st.query_params[PARAMETRO_URL] = token
+    return st.session_state.usuario
+
+
+def cerrar_sesion():
+    """Revoca el token y limpia la sesión y la URL."""
+    token = st.session_state.get('token_sesion') or st.query_params.get(PARAMETRO_URL)
+    if token:
+        revocar_token(token)
+    if PARAMETRO_URL in st.query_params:
+        del st.query_params[PARAMETRO_URL]
+    st.session_state.clear()
+
+
+def require_auth():
+    """Detiene la página si no hay una sesión válida; devuelve el usuario."""
+    usuario = restaurar_sesion()
+    if usuario is None:
+        st.error("🔒 Debes iniciar sesión para acceder")
+        st.stop()
+    return usuario
+
+
+def require_role(roles_permitidos):
+    """Como `require_auth`, exigiendo además uno de `roles_permitidos`."""
+    usuario = require_auth()
+    if usuario['rol'] not in roles_permitidos:
+        st.error(f"❌ Acceso Denegado. Rol requerido: {', '.join(roles_permitidos)}")
+        st.info(f"Tu rol actual: **{usuario['rol']}**")
+        st.stop()
+    return usuario
@@ -5,19 +5,15 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta, date
 from supabase_client import supabase
+from utils.data_access import consultar, invalidar
+from utils.esquemas import normalizar
+from utils.asistencias import emparejar_nomina, leer_nomina, registrar_asistencia
+from utils.uploads import extension_de, ruta_por_contenido, subir_archivos
 import json
 import os
-import io
-import base64
 
 from dotenv import load_dotenv
 
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER
-
 load_dotenv()
 
 
@@ -117,12 +113,10 @@ def crear_capacitacion(usuario):
             try:
                 material_url = None
                 if material_capacitacion:
-                    ruta = f"capacitaciones/{fecha_capacitacion.isoformat()}/{material_capacitacion.name}"
-                    supabase.storage.from_("sst-documentos").upload(
-                        ruta, material_capacitacion.getvalue(),
-                        file_options={"content-type": "application/pdf"}
-                    )
-                    material_url = supabase.storage.from_("sst-documentos").get_public_url(ruta)
+                    # Almacén por contenido: el mismo PDF reutilizado no se vuelve a subir
+                    contenido = material_capacitacion.getvalue()
+                    ruta = ruta_por_contenido(contenido, ".pdf")
+                    material_url = subir_archivos([(ruta, contenido, "application/pdf")], "sst-documentos")[0]
 
                 fecha_hora = datetime.combine(fecha_capacitacion, hora_inicio)
                 codigo = f"CAP-{fecha_capacitacion.strftime('%Y%m%d')}-{tema[:10].upper().replace(' ', '')}"
@@ -141,6 +135,7 @@ def crear_capacitacion(usuario):
                 }
 
                 supabase.table('capacitaciones').insert(data).execute()
+                invalidar('capacitaciones')
 
                 st.success(f"✅ Capacitación programada ({codigo})")
                 st.balloons()
@@ -169,21 +164,21 @@ def calendario_capacitaciones(usuario):
         fin = date(anio, mes, 28) + timedelta(days=4)
         fin = fin.replace(day=1) - timedelta(days=1)
 
-        query = supabase.table('capacitaciones').select('*') \
-            .gte("fecha", inicio.isoformat()) \
-            .lte("fecha", fin.isoformat())
+        filtros = [
+            ("gte", "fecha", inicio.isoformat()),
+            ("lte", "fecha", fin.isoformat())
+        ]
 
         if estados:
-            query = query.in_("estado", estados)
+            filtros.append(("in_", "estado", estados))
 
-        data = query.order("fecha").execute().data or []
+        data = consultar('capacitaciones', filtros=filtros, orden=("fecha", False))
 
         if not data:
             st.info("No hay capacitaciones.")
             return
 
-        df = pd.DataFrame(data)
-        df['fecha'] = pd.to_datetime(df['fecha'])
+        df = normalizar(pd.DataFrame(data), 'capacitaciones')
 
         st.metric("Total", len(df))
         st.metric("Realizadas", len(df[df['estado'] == 'Realizada']))
@@ -205,10 +200,10 @@ def control_asistencia(usuario):
 
     try:
         hoy = date.today()
-        data = supabase.table('capacitaciones').select('*') \
-            .eq("estado", "Programada") \
-            .gte("fecha", hoy.isoformat()) \
-            .limit(20).execute().data or []
+        data = consultar('capacitaciones', filtros=[
+            ("eq", "estado", "Programada"),
+            ("gte", "fecha", hoy.isoformat())
+        ], limite=20)
 
         if not data:
             st.warning("No hay capacitaciones programadas próximamente.")
@@ -224,7 +219,7 @@ def control_asistencia(usuario):
 
         st.markdown("### 📝 Registrar Asistencia")
 
-        usuarios = supabase.table("usuarios").select("id,nombre_completo,area").execute().data or []
+        usuarios = consultar("usuarios", "id,nombre_completo,area,dni,email")
 
         with st.form("asistencia_form"):
             seleccionados = st.multiselect(
@@ -233,6 +228,12 @@ def control_asistencia(usuario):
                 format_func=lambda x: next((u['nombre_completo'] for u in usuarios if u['id'] == x), "Desconocido")
             )
 
+            nomina = st.file_uploader(
+                "Nómina de asistentes (CSV/Excel con columna dni o email)",
+                type=['csv', 'xlsx', 'xls'],
+                help="Para inducciones masivas: se suman a los asistentes seleccionados"
+            )
+
             externos = st.text_area("Participantes Externos (uno por línea)")
             evidencia = st.file_uploader("Lista firmada", type=['pdf', 'jpg', 'png'])
             
@@ -266,38 +267,27 @@ def control_asistencia(usuario):
             try:
                 urls = []
                 if evidencia:
-                    ruta = f"capacitaciones/{cap_id}/asistencia_{evidencia.name}"
-                    supabase.storage.from_("sst-documentos").upload(
-                        ruta, 
-                        evidencia.getvalue(),
-                        file_options={"content-type": evidencia.type}
-                    )
-                    urls.append(supabase.storage.from_("sst-documentos").get_public_url(ruta))
-
-                # Registrar asistentes internos
-                for trabajador_id in seleccionados:
-                    datos_asistente = {
-                        "capacitacion_id": int(cap_id),  # Asegurar INTEGER
-                        "trabajador_id": str(trabajador_id),  # Asegurar string UUID
-                        "asistio": True,
-                        "calificacion": int(calificacion_individual) if eval_flag else None  # INTEGER 1-5 o NULL
-                    }
-                    
-                    supabase.table("asistentes_capacitacion").insert(datos_asistente).execute()
+                    contenido = evidencia.getvalue()
+                    ruta = ruta_por_contenido(contenido, extension_de(evidencia.name))
+                    urls = subir_archivos([(ruta, contenido, evidencia.type)], "sst-documentos")
+
+                # Asistentes internos: seleccionados + nómina subida
+                asistentes_ids = list(seleccionados)
+                if nomina:
+                    ids_nomina, no_encontrados = emparejar_nomina(leer_nomina(nomina), usuarios)
+                    asistentes_ids.extend(ids_nomina)
+                    if no_encontrados:
+                        st.warning(f"⚠️ {len(no_encontrados)} filas de la nómina no coinciden con ningún usuario")
+                        st.dataframe(pd.DataFrame(no_encontrados), use_container_width=True)
+                asistentes_ids = list(dict.fromkeys(asistentes_ids))
 
                 # Procesar externos
                 participantes_externos = []
                 if externos:
                     participantes_externos = [x.strip() for x in externos.split("\n") if x.strip()]
 
-                # Calcular total (asegurar INTEGER)
-                total_asistentes = int(len(seleccionados) + len(participantes_externos))
-
-                # Actualizar capacitación
-                update = {
-                    "estado": "Realizada", 
-                    "participantes": total_asistentes  # INTEGER
-                }
+                # Actualización de la capacitación
+                update = {"estado": "Realizada"}
                 
                 if eval_flag:
                     # DECIMAL(3,2) según tu BD - escala 1-5
@@ -309,7 +299,13 @@ def control_asistencia(usuario):
                 if participantes_externos:
                     update["participantes_externos"] = "\n".join(participantes_externos)
 
-                supabase.table("capacitaciones").update(update).eq("id", cap_id).execute()
+                # Asistentes (upsert idempotente) + capacitación en una sola operación
+                total_asistentes = registrar_asistencia(
+                    cap_id,
+                    asistentes_ids,
+                    calificacion=calificacion_individual if eval_flag else None,
+                    actualizacion=update
+                )
 
                 # Mostrar resumen
                 st.success("✅ Asistencia registrada exitosamente!")
@@ -319,7 +315,7 @@ def control_asistencia(usuario):
                     col1, col2 = st.columns(2)
                     with col1:
                         st.metric("Total asistentes", total_asistentes)
-                        st.metric("Internos", len(seleccionados))
+                        st.metric("Internos", len(asistentes_ids))
                         st.metric("Externos", len(participantes_externos))
                     with col2:
                         if eval_flag:
@@ -352,17 +348,16 @@ def dashboard_capacitaciones(usuario):
         st.rerun()
 
     try:
-        data = supabase.table("capacitaciones").select("*") \
-            .gte("fecha", desde.isoformat()) \
-            .lte("fecha", hasta.isoformat()) \
-            .execute().data or []
+        data = consultar("capacitaciones", filtros=[
+            ("gte", "fecha", desde.isoformat()),
+            ("lte", "fecha", hasta.isoformat())
+        ])
 
         if not data:
             st.info("No hay datos")
             return
 
-        df = pd.DataFrame(data)
-        df["fecha"] = pd.to_datetime(df["fecha"])
+        df = normalizar(pd.DataFrame(data), "capacitaciones")
 
         total = len(df)
         realizadas = len(df[df['estado'] == "Realizada"])
@@ -387,11 +382,14 @@ def dashboard_capacitaciones(usuario):
 #            5. GENERAR CERTIFICADOS
 # ------------------------------------------------------------
 def generar_certificados(usuario):
+    # ReportLab solo se carga al abrir esta pestaña
+    from utils.certificados import generar_zip, nombre_archivo, renderizar_certificado
+
     st.subheader("🎓 Generar Certificados")
 
     try:
-        data = supabase.table("capacitaciones").select("*") \
-            .eq("estado", "Realizada").order("fecha", desc=True).limit(50).execute().data or []
+        data = consultar("capacitaciones", filtros=[("eq", "estado", "Realizada")],
+                         orden=("fecha", True), limite=50)
 
         if not data:
             st.warning("No hay capacitaciones realizadas")
@@ -405,17 +403,15 @@ def generar_certificados(usuario):
 
         st.info(f"**Tema:** {cap['tema']}  \n **Instructor:** {cap['responsable']}")
 
-        asistentes = supabase.table("asistentes_capacitacion").select(
-            "trabajador_id,calificacion"
-        ).eq("capacitacion_id", cap_id).execute().data or []
+        asistentes = consultar("asistentes_capacitacion", "trabajador_id,calificacion",
+                               filtros=[("eq", "capacitacion_id", cap_id)])
 
         if not asistentes:
             st.warning("No hay asistentes registrados")
             return
 
-        trabajadores = supabase.table("usuarios").select(
-            "id,nombre_completo,dni"
-        ).in_("id", [a["trabajador_id"] for a in asistentes]).execute().data or []
+        trabajadores = consultar("usuarios", "id,nombre_completo,dni",
+                                 filtros=[("in_", "id", [a["trabajador_id"] for a in asistentes])])
 
         map_trab = {t["id"]: t for t in trabajadores}
 
@@ -434,45 +430,61 @@ def generar_certificados(usuario):
 
         st.markdown("---")
 
-        for a in asistentes:
-            t = map_trab.get(a["trabajador_id"])
-            if not t:
-                continue
-
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4)
-
-            styles = getSampleStyleSheet()
-            styles.add(ParagraphStyle(
-                name="Center", alignment=TA_CENTER, fontSize=16, leading=20
-            ))
-
-            elements = [
-                Spacer(1, 2 * inch),
-                Paragraph("🎓 Certificado de Capacitación", styles["Title"]),
-                Spacer(1, 0.5 * inch),
-                Paragraph(
-                    f"Se certifica que <b>{t['nombre_completo']}</b> ha completado la capacitación "
-                    f"<b>{cap['tema']}</b> realizada el <b>{cap['fecha'][:10]}</b>.",
-                    styles["BodyText"]
-                ),
-                Spacer(1, 0.5 * inch),
-                Paragraph(f"Duración: <b>{cap['duracion_horas']} horas</b>", styles["BodyText"]),
-                Spacer(1, 1 * inch),
-                Paragraph(
-                    f"_____________________________<br/>{firmante_nombre}<br/>{firmante_cargo}<br/>{empresa}",
-                    styles["Center"]
-                )
-            ]
-
-            doc.build(elements)
-            pdf = buffer.getvalue()
-            buffer.close()
+        certificados = [
+            {
+                'nombre': map_trab[a["trabajador_id"]]['nombre_completo'],
+                'dni': map_trab[a["trabajador_id"]].get('dni'),
+                'tema': cap['tema'],
+                'fecha': cap['fecha'][:10],
+                'duracion_horas': cap['duracion_horas'],
+                'firmante_nombre': firmante_nombre,
+                'firmante_cargo': firmante_cargo,
+                'empresa': empresa
+            }
+            for a in asistentes if a["trabajador_id"] in map_trab
+        ]
+
+        # Los PDFs solo se generan a pedido; el ZIP queda en sesión mientras
+        # no cambien la capacitación, los asistentes ni la configuración
+        clave_zip = repr((cap_id, certificados))
+        zip_generado = st.session_state.get("certificados_zip")
 
-            b64 = base64.b64encode(pdf).decode("utf-8")
-            link = f'<a href="data:application/pdf;base64,{b64}" download="Cert_{t["nombre_completo"].replace(" ", "_")}.pdf">📥 Descargar - {t["nombre_completo"]}</a>'
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button(f"📦 Generar {len(certificados)} certificados (ZIP)", type="primary",
+                         use_container_width=True):
+                barra = st.progress(0.0, text="Generando certificados")
+                zip_bytes = generar_zip(
+                    certificados,
+                    progreso=lambda n, total: barra.progress(n / total, text=f"Generando certificados: {n}/{total}")
+                )
+                zip_generado = {'clave': clave_zip, 'datos': zip_bytes}
+                st.session_state.certificados_zip = zip_generado
+
+            if zip_generado and zip_generado['clave'] == clave_zip:
+                st.download_button(
+                    "📥 Descargar ZIP",
+                    zip_generado['datos'],
+                    f"Certificados_{cap['codigo']}.zip",
+                    "application/zip",
+                    use_container_width=True
+                )
 
-            st.markdown(link, unsafe_allow_html=True)
+        with col2:
+            # Certificado individual, renderizado solo para la persona elegida
+            idx = st.selectbox(
+                "Certificado individual",
+                range(len(certificados)),
+                format_func=lambda i: certificados[i]['nombre']
+            )
+            if idx is not None and st.button("📄 Preparar certificado", use_container_width=True):
+                st.download_button(
+                    f"📥 Descargar - {certificados[idx]['nombre']}",
+                    renderizar_certificado(certificados[idx]),
+                    nombre_archivo(certificados[idx]),
+                    "application/pdf",
+                    use_container_width=True
+                )
 
     except Exception as e:
         st.error(f"Error: {e}")
\ No newline at end of file
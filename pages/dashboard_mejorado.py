@@ -2,11 +2,25 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import pandas as pd
 from datetime import datetime, timedelta
-from supabase_client import supabase
 from app.auth import AuthManager
+from utils.data_access import columnas_requeridas
+from utils.esquemas import normalizar
+from utils.kpis import kpis_dashboard
+from utils.sincronizacion import sincronizar
+from utils.tema import tarjeta_kpi
+
+# Columnas que consume cada widget del dashboard; los loaders solo piden estas.
+# Las tarjetas KPI y el cumplimiento usan el payload agregado de `kpis_dashboard`.
+COLUMNAS_POR_WIDGET = {
+    'tendencias': {'incidentes': ['fecha']},
+    'area': {'incidentes': ['area']},
+    'riesgos': {'incidentes': ['nivel_riesgo']},
+}
+
+# Ventana de vencimiento de EPP usada por el KPI "por vencer"
+DIAS_EPP_POR_VENCER = 30
 
 def mostrar(usuario):
     """Dashboard ejecutivo con métricas avanzadas"""
@@ -42,14 +56,14 @@ def mostrar(usuario):
         )
     
     with col_f3:
-        if st.button("🔄 Actualizar", type="primary", use_container_width=True):
-            st.rerun()
+        # Solo se descargan las filas cambiadas desde la última sincronización
+        refrescar = st.button("🔄 Actualizar", type="primary", use_container_width=True)
     
     st.markdown("---")
     
     # Cargar datos
     with st.spinner("Cargando datos..."):
-        data = cargar_datos_dashboard(fecha_inicio, fecha_fin)
+        data = cargar_datos_dashboard(fecha_inicio, fecha_fin, refrescar)
     
     # KPIs principales con cards profesionales
     mostrar_kpis_principales(data)
@@ -77,45 +91,36 @@ def mostrar(usuario):
         mostrar_cumplimiento(data)
 
 
-def cargar_datos_dashboard(fecha_inicio, fecha_fin):
-    """Carga optimizada de datos con caché"""
+def cargar_datos_dashboard(fecha_inicio, fecha_fin, refrescar=False):
+    """Carga incremental (por updated_at) con proyección de columnas"""
     
     try:
-        # Incidentes
-        incidentes = supabase.table('incidentes').select('*') \
-            .gte('fecha', fecha_inicio.isoformat()) \
-            .lte('fecha', fecha_fin.isoformat()) \
-            .execute().data or []
-        
-        # Capacitaciones
-        capacitaciones = supabase.table('capacitaciones').select('*') \
-            .gte('fecha', fecha_inicio.isoformat()) \
-            .lte('fecha', fecha_fin.isoformat()) \
-            .execute().data or []
+        rango_fechas = [
+            ('gte', 'fecha', fecha_inicio.isoformat()),
+            ('lte', 'fecha', fecha_fin.isoformat())
+        ]
         
-        # EPP
-        epp = supabase.table('epp').select('*').execute().data or []
+        # Incidentes
+        incidentes = sincronizar(
+            'incidentes',
+            columnas_requeridas(COLUMNAS_POR_WIDGET, 'incidentes'),
+            filtros=rango_fechas,
+            refrescar=refrescar
+        )
         
-        # Inspecciones
-        inspecciones = supabase.table('inspecciones').select('*') \
-            .gte('fecha', fecha_inicio.isoformat()) \
-            .lte('fecha', fecha_fin.isoformat()) \
-            .execute().data or []
+        # KPIs agregados en el servidor (RPC con respaldo local)
+        kpis = kpis_dashboard(fecha_inicio, fecha_fin, DIAS_EPP_POR_VENCER, refrescar=refrescar)
         
         return {
-            'incidentes': pd.DataFrame(incidentes),
-            'capacitaciones': pd.DataFrame(capacitaciones),
-            'epp': pd.DataFrame(epp),
-            'inspecciones': pd.DataFrame(inspecciones)
+            'incidentes': incidentes,
+            'kpis': kpis
         }
     
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
         return {
             'incidentes': pd.DataFrame(),
-            'capacitaciones': pd.DataFrame(),
-            'epp': pd.DataFrame(),
-            'inspecciones': pd.DataFrame()
+            'kpis': {}
         }
 
 
@@ -126,108 +131,39 @@ def mostrar_kpis_principales(data):
     
     # KPI 1: Incidentes
     with col1:
-        total_inc = len(data['incidentes'])
-        inc_criticos = len(data['incidentes'][data['incidentes'].get('nivel_riesgo', pd.Series(dtype=int)) >= 15]) if not data['incidentes'].empty and 'nivel_riesgo' in data['incidentes'].columns else 0
+        kpi_inc = data['kpis'].get('incidentes', {})
+        total_inc = kpi_inc.get('total', 0)
+        inc_criticos = kpi_inc.get('criticos', 0)
         
-        st.markdown(f"""
-            <div class="metric-card">
-                <div style="display: flex; justify-content: space-between; align-items: center;">
-                    <div>
-                        <p style="color: #6b7280; margin: 0; font-size: 0.875rem; font-weight: 600;">
-                            INCIDENTES TOTALES
-                        </p>
-                        <h2 style="margin: 0.5rem 0; color: #1f2937; font-size: 2.5rem; font-weight: 800;">
-                            {total_inc}
-                        </h2>
-                        <p style="color: #ef4444; margin: 0; font-size: 0.75rem;">
-                            🔴 {inc_criticos} críticos
-                        </p>
-                    </div>
-                    <div style="font-size: 3rem;">🚨</div>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(tarjeta_kpi("INCIDENTES TOTALES", total_inc, f"🔴 {inc_criticos} críticos", "🚨", "peligro"),
+                    unsafe_allow_html=True)
     
     # KPI 2: Capacitaciones
     with col2:
-        total_cap = len(data['capacitaciones'])
-        participantes = data['capacitaciones']['participantes'].sum() if not data['capacitaciones'].empty and 'participantes' in data['capacitaciones'].columns else 0
+        kpi_cap = data['kpis'].get('capacitaciones', {})
+        total_cap = kpi_cap.get('total', 0)
+        participantes = kpi_cap.get('participantes', 0)
         
-        st.markdown(f"""
-            <div class="metric-card">
-                <div style="display: flex; justify-content: space-between; align-items: center;">
-                    <div>
-                        <p style="color: #6b7280; margin: 0; font-size: 0.875rem; font-weight: 600;">
-                            CAPACITACIONES
-                        </p>
-                        <h2 style="margin: 0.5rem 0; color: #1f2937; font-size: 2.5rem; font-weight: 800;">
-                            {total_cap}
-                        </h2>
-                        <p style="color: #10b981; margin: 0; font-size: 0.75rem;">
-                            ✅ {participantes} participantes
-                        </p>
-                    </div>
-                    <div style="font-size: 3rem;">🎓</div>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(tarjeta_kpi("CAPACITACIONES", total_cap, f"✅ {participantes} participantes", "🎓", "exito"),
+                    unsafe_allow_html=True)
     
     # KPI 3: EPP por vencer
     with col3:
-        if not data['epp'].empty and 'fecha_vencimiento' in data['epp'].columns:
-            data['epp']['fecha_vencimiento'] = pd.to_datetime(data['epp']['fecha_vencimiento'], errors='coerce')
-            hoy = pd.Timestamp(datetime.now().date())
-            limite = hoy + pd.Timedelta(days=30)
-            epp_por_vencer = len(data['epp'][(data['epp']['fecha_vencimiento'].notna()) & 
-                                              (data['epp']['fecha_vencimiento'] >= hoy) & 
-                                              (data['epp']['fecha_vencimiento'] <= limite)])
-        else:
-            epp_por_vencer = 0
-        
-        total_epp = len(data['epp'])
+        kpi_epp = data['kpis'].get('epp', {})
+        epp_por_vencer = kpi_epp.get('por_vencer', 0)
+        total_epp = kpi_epp.get('total', 0)
         
-        st.markdown(f"""
-            <div class="metric-card">
-                <div style="display: flex; justify-content: space-between; align-items: center;">
-                    <div>
-                        <p style="color: #6b7280; margin: 0; font-size: 0.875rem; font-weight: 600;">
-                            EPP REGISTRADOS
-                        </p>
-                        <h2 style="margin: 0.5rem 0; color: #1f2937; font-size: 2.5rem; font-weight: 800;">
-                            {total_epp}
-                        </h2>
-                        <p style="color: #f59e0b; margin: 0; font-size: 0.75rem;">
-                            ⏰ {epp_por_vencer} por vencer
-                        </p>
-                    </div>
-                    <div style="font-size: 3rem;">🛡️</div>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(tarjeta_kpi("EPP REGISTRADOS", total_epp, f"⏰ {epp_por_vencer} por vencer", "🛡️", "aviso"),
+                    unsafe_allow_html=True)
     
     # KPI 4: Inspecciones
     with col4:
-        total_insp = len(data['inspecciones'])
-        insp_pendientes = len(data['inspecciones'][data['inspecciones'].get('estado', pd.Series(dtype=str)) == 'Pendiente']) if not data['inspecciones'].empty and 'estado' in data['inspecciones'].columns else 0
+        kpi_insp = data['kpis'].get('inspecciones', {})
+        total_insp = kpi_insp.get('total', 0)
+        insp_pendientes = kpi_insp.get('pendientes', 0)
         
-        st.markdown(f"""
-            <div class="metric-card">
-                <div style="display: flex; justify-content: space-between; align-items: center;">
-                    <div>
-                        <p style="color: #6b7280; margin: 0; font-size: 0.875rem; font-weight: 600;">
-                            INSPECCIONES
-                        </p>
-                        <h2 style="margin: 0.5rem 0; color: #1f2937; font-size: 2.5rem; font-weight: 800;">
-                            {total_insp}
-                        </h2>
-                        <p style="color: #3b82f6; margin: 0; font-size: 0.75rem;">
-                            📋 {insp_pendientes} pendientes
-                        </p>
-                    </div>
-                    <div style="font-size: 3rem;">🔍</div>
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+        st.markdown(tarjeta_kpi("INSPECCIONES", total_insp, f"📋 {insp_pendientes} pendientes", "🔍", "info"),
+                    unsafe_allow_html=True)
 
 
 def mostrar_tendencias(data):
@@ -237,9 +173,7 @@ def mostrar_tendencias(data):
         st.info("📊 No hay datos de incidentes para mostrar tendencias")
         return
     
-    df = data['incidentes'].copy()
-    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-    df = df.dropna(subset=['fecha'])
+    df = normalizar(data['incidentes'], 'incidentes').dropna(subset=['fecha'])
     
     # Gráfico de línea temporal
     df_grouped = df.groupby(df['fecha'].dt.to_period('D')).size().reset_index(name='count')
@@ -345,9 +279,7 @@ def mostrar_analisis_riesgos(data):
         st.info("📊 No hay datos de riesgo para analizar")
         return
     
-    df = data['incidentes'].copy()
-    df['nivel_riesgo'] = pd.to_numeric(df['nivel_riesgo'], errors='coerce')
-    df = df.dropna(subset=['nivel_riesgo'])
+    df = normalizar(data['incidentes'], 'incidentes').dropna(subset=['nivel_riesgo'])
     
     # Clasificar riesgos
     df['categoria_riesgo'] = pd.cut(
@@ -414,9 +346,11 @@ def mostrar_cumplimiento(data):
     st.subheader("✅ Cumplimiento Ley 29783")
     
     # Calcular métricas de cumplimiento
-    total_cap = len(data['capacitaciones'])
-    total_insp = len(data['inspecciones'])
-    insp_completadas = len(data['inspecciones'][data['inspecciones'].get('estado', pd.Series(dtype=str)) == 'Resuelto']) if not data['inspecciones'].empty and 'estado' in data['inspecciones'].columns else 0
+    kpis = data['kpis']
+    total_cap = kpis.get('capacitaciones', {}).get('total', 0)
+    total_insp = kpis.get('inspecciones', {}).get('total', 0)
+    insp_completadas = kpis.get('inspecciones', {}).get('resueltas', 0)
+    total_inc = kpis.get('incidentes', {}).get('total', 0)
     
     tasa_insp = (insp_completadas / total_insp * 100) if total_insp > 0 else 0
     
@@ -443,7 +377,7 @@ def mostrar_cumplimiento(data):
         tasa_insp,
         85,  # Placeholder
         90,  # Placeholder
-        max(100 - (len(data['incidentes']) * 5), 60)
+        max(100 - (total_inc * 5), 60)
     ]
     
     fig = go.Figure(data=go.Scatterpolar(
@@ -6,6 +6,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 from supabase_client import supabase
+from utils.data_access import consultar, invalidar
+from utils.esquemas import normalizar
+from utils.busqueda import buscar_documentos, indexar_documento, resaltar
+from utils.extraccion_texto import encolar_extraccion, estado_extraccion, reindexar_biblioteca
+from utils.uploads import extension_de, ruta_por_contenido, subidas_con_rollback
 import os
 from dotenv import load_dotenv
 import io
@@ -13,6 +18,11 @@ import re
 
 load_dotenv()
 
+# Columnas de cada vista: '*' traería también `contenido_texto` (hasta 200k caracteres por documento)
+COLUMNAS_REPOSITORIO = 'id,titulo,codigo,tipo,area,version,estado,fecha_emision,fecha_vigencia,archivo_url'
+COLUMNAS_DASHBOARD = 'id,tipo,estado,fecha_vigencia'
+COLUMNAS_VERSIONES = 'id,titulo,codigo,version,estado,fecha_emision,archivo_url'
+
 # ============= FUNCIONES AUXILIARES =============
 
 def subir_documento(usuario):
@@ -97,6 +107,11 @@ def subir_documento(usuario):
             
             aprobado = st.checkbox("Documento Aprobado", value=False)
         
+        observaciones = st.text_area(
+            "Observaciones",
+            placeholder="Cambios respecto a la versión anterior, notas de revisión, etc."
+        )
+        
         archivo = st.file_uploader(
             "Cargar Archivo*",
             type=["pdf", "docx", "doc", "xlsx", "xls"],
@@ -114,47 +129,46 @@ def subir_documento(usuario):
                 return
             
             try:
-                import re
-                # Subir archivo
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                nombre_limpio = re.sub(r'[^a-zA-Z0-9_.-]', '_', archivo.name)
-                nombre_limpio=nombre_limpio.replace("__ ","_").strip('_')
-                nombre_archivo = f"{timestamp}_{nombre_limpio}"
-                ruta = f"documentos/{nombre_archivo}"
-                
-                bucket_name = "sst-documentos"
                 
-                st.info(f"⏳ Subiendo a {bucket_name}/{ruta}")
-                
-                upload_response = supabase.storage.from_(bucket_name).upload(ruta, archivo.getvalue(),file_options={"content-type","upsert": "true"})
+                # Ruta por contenido (SHA-256): si el mismo archivo ya se subió
+                # antes no se vuelve a subir y la fila referencia el objeto existente
+                contenido = archivo.getvalue()
+                ruta = ruta_por_contenido(contenido, extension_de(archivo.name))
                 
-                archivo_url = supabase.storage.from_(bucket_name).get_public_url(ruta)
+                bucket_name = os.getenv("BUCKET_NAME")
                 
-                st.success(f"✅ Archivo subido correctamente: {archivo_url}")
-                
-                # Insertar documento
-                documento_data = {
-                    'codigo': codigo_documento if codigo_documento else f"DOC-{timestamp}",
-                    'titulo': titulo,
-                    'tipo': tipo_documento,
-                    'version': version,
-                    'fecha_emision': fecha_emision.isoformat(),
-                    'fecha_vigencia': fecha_vigencia.isoformat(),
-                    'archivo_url': archivo_url,
-                    'area': ','.join(area_aplicacion),
-                    'estado': estado_documento,
-                    'responsable_id': usuario['id'],
-                    'aprobado': aprobado,
-                    'keywords': palabras_clave or '',
-                    'observaciones': observaciones or ''
-                }
+                st.info(f"⏳ Subiendo a {bucket_name}/{ruta}")
                 
-                st.info("⏳ Registrando documento en la base de datos...")
-                result = supabase.table('documentos_sst').insert(documento_data).execute()
+                with subidas_con_rollback([(ruta, contenido, archivo.type)], bucket_name) as urls:
+                    archivo_url = urls[0]
+                    st.success(f"✅ Archivo subido correctamente: {archivo_url}")
+                    
+                    # Insertar documento
+                    documento_data = {
+                        'codigo': codigo_documento if codigo_documento else f"DOC-{timestamp}",
+                        'titulo': titulo,
+                        'tipo': tipo_documento,
+                        'version': version,
+                        'fecha_emision': fecha_emision.isoformat(),
+                        'fecha_vigencia': fecha_vigencia.isoformat(),
+                        'archivo_url': archivo_url,
+                        'area': ','.join(area_aplicacion),
+                        'estado': estado_documento,
+                        'responsable_id': usuario['id'],
+                        'aprobado': aprobado,
+                        'keywords': palabras_clave or '',
+                        'observaciones': observaciones or ''
+                    }
                 
-                supabase.table('documentos_sst').insert(documento_data).execute()
+                    st.info("⏳ Registrando documento en la base de datos...")
+                    result = supabase.table('documentos_sst').insert(documento_data).execute()
+                invalidar('documentos_sst')
                 
                 if result.data:
+                    indexar_documento(result.data[0])
+                    # Texto del PDF/DOCX para la búsqueda, en segundo plano
+                    encolar_extraccion(result.data[0], contenido=contenido, nombre=archivo.name)
                     st.success(f"✅ Documento '{titulo}' registrado correctamente.")
                     st.balloons()
                 else:
@@ -171,14 +185,13 @@ def repositorio_documentos(usuario):
     st.subheader("📋 Repositorio de Documentos")
     
     try:
-        documentos = supabase.table('documentos_sst').select('*').order('fecha_emision', desc=True).execute().data or []
+        documentos = consultar('documentos_sst', COLUMNAS_REPOSITORIO, orden=('fecha_emision', True))
         
         if not documentos:
             st.info("📭 No hay documentos registrados")
             return
         
-        df = pd.DataFrame(documentos)
-        df['fecha_vigencia'] = pd.to_datetime(df['fecha_vigencia'], errors='coerce')
+        df = normalizar(pd.DataFrame(documentos), 'documentos_sst')
         
         # Calcular días de vigencia
         hoy = pd.Timestamp(date.today())
@@ -240,48 +253,83 @@ def busqueda_avanzada(usuario):
     
     st.subheader("🔍 Búsqueda Avanzada")
     
-    termino = st.text_input("Buscar", placeholder="Título, código o palabras clave...")
+    col1, col2 = st.columns([4, 1])
+    
+    with col1:
+        termino = st.text_input("Buscar", placeholder="Título, código o palabras clave...")
+    
+    with col2:
+        tamano = st.selectbox("Por página", [10, 20, 50], index=1)
     
     if termino:
         try:
-            documentos = supabase.table('documentos_sst').select('*').execute().data or []
+            # Volver a la primera página cuando cambia la búsqueda
+            if st.session_state.get('busqueda_termino') != (termino, tamano):
+                st.session_state.busqueda_termino = (termino, tamano)
+                st.session_state.busqueda_pagina = 1
             
-            if not documentos:
-                st.info("No hay documentos")
+            pagina = st.session_state.busqueda_pagina
+            resultados, total, motor = buscar_documentos(termino, pagina, tamano)
+            
+            if not total:
+                st.warning(f"No se encontraron documentos con '{termino}'")
                 return
             
-            df = pd.DataFrame(documentos)
+            paginas = max(1, -(-total // tamano))
+            st.success(f"✅ {total} documentos encontrados - página {pagina} de {paginas}")
+            st.caption("Búsqueda en Postgres" if motor == 'postgres' else "Búsqueda en índice local")
             
-            # Búsqueda
-            mask = (
-                df['titulo'].str.contains(termino, case=False, na=False) |
-                df['codigo'].str.contains(termino, case=False, na=False) |
-                df['keywords'].str.contains(termino, case=False, na=False)
-            )
+            for doc in resultados:
+                with st.container():
+                    col1, col2 = st.columns([3, 1])
+                    
+                    with col1:
+                        st.markdown(f"### 📄 {doc['titulo']}")
+                        st.markdown(f"**Código:** {doc.get('codigo') or 'N/A'} | **Tipo:** {doc['tipo']}")
+                        if doc.get('fragmento'):
+                            st.markdown(
+                                f"<div style='color: #4b5563; font-size: 0.9rem;'>{resaltar(doc['fragmento'])}</div>",
+                                unsafe_allow_html=True
+                            )
+                    
+                    with col2:
+                        if doc.get('archivo_url'):
+                            st.link_button("📥 Ver", doc['archivo_url'])
+                    
+                    st.markdown("---")
             
-            df_resultado = df[mask]
+            col_ant, col_sig, _ = st.columns([1, 1, 4])
             
-            if df_resultado.empty:
-                st.warning(f"No se encontraron documentos con '{termino}'")
-            else:
-                st.success(f"✅ {len(df_resultado)} documentos encontrados")
-                
-                for _, doc in df_resultado.iterrows():
-                    with st.container():
-                        col1, col2 = st.columns([3, 1])
-                        
-                        with col1:
-                            st.markdown(f"### 📄 {doc['titulo']}")
-                            st.markdown(f"**Código:** {doc.get('codigo', 'N/A')} | **Tipo:** {doc['tipo']}")
-                        
-                        with col2:
-                            if doc.get('archivo_url'):
-                                st.link_button("📥 Ver", doc['archivo_url'])
-                        
-                        st.markdown("---")
+            with col_ant:
+                if st.button("⬅️ Anterior", disabled=pagina <= 1, use_container_width=True):
+                    st.session_state.busqueda_pagina -= 1
+                    st.rerun()
+            
+            with col_sig:
+                if st.button("Siguiente ➡️", disabled=pagina >= paginas, use_container_width=True):
+                    st.session_state.busqueda_pagina += 1
+                    st.rerun()
         
         except Exception as e:
             st.error(f"Error: {e}")
+    
+    # Indexación del contenido de la biblioteca existente
+    if usuario['rol'] in ['admin', 'sst']:
+        with st.expander("⚙️ Indexación de contenido"):
+            estado = estado_extraccion()
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("En cola", estado['pendientes'])
+            col2.metric("Indexados", estado['procesados'])
+            col3.metric("Sin texto", estado['sin_texto'])
+            col4.metric("Errores", estado['errores'])
+            
+            solo_pendientes = st.checkbox("Solo documentos sin indexar", value=True)
+            if st.button("🔄 Reindexar biblioteca"):
+                try:
+                    encolados = reindexar_biblioteca(solo_pendientes)
+                    st.success(f"✅ {encolados} documentos en cola de extracción")
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
 def dashboard_documentos(usuario):
     """Dashboard de documentos"""
@@ -289,14 +337,13 @@ def dashboard_documentos(usuario):
     st.subheader("📊 Dashboard de Documentos")
     
     try:
-        documentos = supabase.table('documentos_sst').select('*').execute().data or []
+        documentos = consultar('documentos_sst', COLUMNAS_DASHBOARD)
         
         if not documentos:
             st.info("No hay datos")
             return
         
-        df = pd.DataFrame(documentos)
-        df['fecha_vigencia'] = pd.to_datetime(df['fecha_vigencia'], errors='coerce')
+        df = normalizar(pd.DataFrame(documentos), 'documentos_sst')
         
         # KPIs
         col1, col2, col3, col4 = st.columns(4)
@@ -352,7 +399,7 @@ def control_versiones(usuario):
     st.info("💡 Historial de versiones por documento")
     
     try:
-        documentos = supabase.table('documentos_sst').select('*').order('fecha_emision', desc=True).execute().data or []
+        documentos = consultar('documentos_sst', COLUMNAS_VERSIONES, orden=('fecha_emision', True))
         
         if not documentos:
             st.warning("No hay documentos")
@@ -9,6 +9,10 @@ import json
 import os
 from dotenv import load_dotenv
 from app.auth import AuthManager
+from utils.data_access import consultar, invalidar
+from utils.esquemas import normalizar
+from utils.uploads import subidas_con_rollback
+from utils.evidencias import preparar_evidencias, leer_evidencias
 
 load_dotenv()
 
@@ -136,6 +140,7 @@ def inventario_epp(usuario):
             }
                         
                         result = supabase.table('epp').insert(epp_record).execute()
+                        invalidar('epp')
                         if result.data :
                             st.success(f"✅ EPP agregado al inventario. Código: {codigo_epp}")
                             st.info(f"📦 Tipo: {tipo_epp} - Cant: {cantidad_stock} - Costo total: S/ {cantidad_stock * costo_unitario:.2f}")
@@ -151,7 +156,7 @@ def inventario_epp(usuario):
     st.markdown("---")
     st.markdown("### 📋 Stock Actual de EPP")
     try:
-        epp_registros = supabase.table('epp').select('*').execute().data or []
+        epp_registros = consultar('epp')
         if epp_registros:
             df = pd.DataFrame(epp_registros)
             # Mostrar resumen agrupado
@@ -174,7 +179,7 @@ def registrar_entrega(usuario):
         st.markdown("### 👷 Información del Trabajador")
         col1, col2 = st.columns(2)
         with col1:
-            usuarios = supabase.table('usuarios').select('id', 'nombre_completo', 'area').execute().data or []
+            usuarios = consultar('usuarios', 'id,nombre_completo,area')
             if usuarios:
                 trabajador_id = st.selectbox(
                     "Seleccionar Trabajador Registrado",
@@ -227,11 +232,10 @@ def registrar_entrega(usuario):
                 st.error("❌ Completa los campos obligatorios")
                 return
             try:
-                evidencia_url = None
-                if evidencia_entrega:
-                    ruta = f"epp/{fecha_entrega.isoformat()}/{evidencia_entrega.name}"
-                    supabase.storage.from_(os.getenv("BUCKET_NAME")).upload(ruta, evidencia_entrega.getvalue())
-                    evidencia_url = supabase.storage.from_(os.getenv("BUCKET_NAME")).get_public_url(ruta)
+                # Las fotos se reducen y recomprimen; el acta en PDF se sube tal cual
+                archivos, datos_evidencia = preparar_evidencias(
+                    [evidencia_entrega] if evidencia_entrega else []
+                )
                 dias_restantes = (fecha_vencimiento - date.today()).days
                 if dias_restantes <= 0:
                     estado = "Vencido"
@@ -248,19 +252,23 @@ def registrar_entrega(usuario):
                     'fecha_entrega': fecha_entrega.isoformat(),
                     'fecha_vencimiento': fecha_vencimiento.isoformat(),
                     'estado': estado,
-                    'evidencia_entrega': evidencia_url,
+                    'evidencia_entrega': None,
                     'numero_serie': numero_serie,
                     'condicion': condicion,
                     'tipo_entrega': tipo_entrega,
                     'observaciones': observaciones,
                     'usuario_id': usuario['id']
                 }
-                result = supabase.table('epp').insert(epp_data).execute()
-                if not (result and getattr(result, 'data', None)):
-                    st.error("Error registrando entrega: " + str(getattr(result, 'error', 'sin detalles')))
-                else:
-                    st.success("✅ EPP registrado exitosamente")
-                    st.info(f"📋 Resumen: Trabajador: {trabajador_nombre} - EPP: {tipo_epp} - Cant: {cantidad}")
+                # La evidencia se elimina del bucket si la inserción falla
+                with subidas_con_rollback(archivos):
+                    # Misma estructura que `evidencia` de incidentes: [{"url", "miniatura"}]
+                    epp_data['evidencia_entrega'] = json.dumps(datos_evidencia) if datos_evidencia else None
+                    result = supabase.table('epp').insert(epp_data).execute()
+                    if not (result and getattr(result, 'data', None)):
+                        raise RuntimeError(str(getattr(result, 'error', 'sin detalles')))
+                invalidar('epp')
+                st.success("✅ EPP registrado exitosamente")
+                st.info(f"📋 Resumen: Trabajador: {trabajador_nombre} - EPP: {tipo_epp} - Cant: {cantidad}")
             except Exception as e:
                 st.error(f"Error registrando entrega: {e}")
 
@@ -276,13 +284,11 @@ def control_vencimientos(usuario):
     with col3:
         mostrar_vencidos = st.checkbox("Mostrar también vencidos", value=True)
     try:
-        epp_registros = supabase.table('epp').select('*').execute().data or []
+        epp_registros = consultar('epp')
         if not epp_registros:
             st.info("No hay registros de EPP en el sistema")
             return
-        df = pd.DataFrame(epp_registros)
-        df['fecha_vencimiento'] = pd.to_datetime(df['fecha_vencimiento'], errors='coerce')
-        df['fecha_entrega'] = pd.to_datetime(df['fecha_entrega'], errors='coerce')
+        df = normalizar(pd.DataFrame(epp_registros), 'epp')
         hoy = pd.Timestamp(date.today())
         df['dias_restantes'] = (df['fecha_vencimiento'] - hoy).dt.days
         limite = hoy + pd.Timedelta(days=dias_anticipo)
@@ -314,7 +320,7 @@ def epp_por_trabajador(usuario):
     """Ver EPP asignado a cada trabajador"""
     st.subheader("👷 EPP por Trabajador")
     try:
-        epp_registros = supabase.table('epp').select('*').execute().data or []
+        epp_registros = consultar('epp')
         if not epp_registros:
             st.info("No hay registros de EPP")
             return
@@ -349,8 +355,14 @@ def epp_por_trabajador(usuario):
                         st.markdown(f"**Tipo:** {epp['tipo_epp']}  \n**Serie:** {epp.get('numero_serie','N/A')}  \n**Condición:** {epp.get('condicion','N/A')}  \n**Fecha Entrega:** {epp['fecha_entrega'][:10]}  \n**Vencimiento:** {epp['fecha_vencimiento'][:10]}")
                     with colB:
                         st.markdown(f"<div style='background:{color}; padding:0.6rem; border-radius:8px;'><b>Estado:</b> {epp['estado']}</div>", unsafe_allow_html=True)
-                        if epp.get('evidencia_entrega'):
-                            st.markdown(f"[📸 Ver Evidencia]({epp['evidencia_entrega']})")
+                        # Miniatura; la imagen completa solo a pedido
+                        for idx, ev in enumerate(leer_evidencias(epp.get('evidencia_entrega'))):
+                            if ev['miniatura']:
+                                st.image(ev['miniatura'], use_container_width=True)
+                                if st.toggle("🔍 Ver original", key=f"epp_ev_{epp['id']}_{idx}"):
+                                    st.image(ev['url'], use_container_width=True)
+                            else:
+                                st.markdown(f"[📸 Ver Evidencia]({ev['url']})")
             csv = df_trabajador.to_csv(index=False).encode('utf-8')
             st.download_button(f"📥 Exportar EPP de {trabajador_seleccionado}", csv, f"epp_{trabajador_seleccionado.replace(' ','_')}.csv", "text/csv")
     except Exception as e:
@@ -361,12 +373,11 @@ def dashboard_epp(usuario):
     """Dashboard ejecutivo de EPP"""
     st.subheader("📊 Dashboard de EPP")
     try:
-        epp_registros = supabase.table('epp').select('*').execute().data or []
+        epp_registros = consultar('epp')
         if not epp_registros:
             st.info("No hay datos para mostrar")
             return
-        df = pd.DataFrame(epp_registros)
-        df['fecha_vencimiento'] = pd.to_datetime(df['fecha_vencimiento'], errors='coerce')
+        df = normalizar(pd.DataFrame(epp_registros), 'epp')
         # KPIs
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -385,7 +396,7 @@ def dashboard_epp(usuario):
         fig = px.histogram(df, x='tipo_epp', title='EPP por Tipo')
         fig.update_layout(height=350)
         st.plotly_chart(fig, use_container_width=True)
-        df['mes'] = pd.to_datetime(df['fecha_entrega']).dt.to_period('M').dt.to_timestamp()
+        df['mes'] = df['fecha_entrega'].dt.to_period('M').dt.to_timestamp()
         monthly = df.groupby('mes').size().reset_index(name='count')
         fig2 = px.bar(monthly, x='mes', y='count', title='Entregas por Mes')
         st.plotly_chart(fig2, use_container_width=True)
@@ -397,7 +408,7 @@ def analisis_epp(usuario):
     """Análisis y reportes de EPP"""
     st.subheader("📈 Análisis de EPP")
     try:
-        epp_registros = supabase.table('epp').select('*').execute().data or []
+        epp_registros = consultar('epp')
         if not epp_registros:
             st.info("No hay datos para analizar")
             return
@@ -3,16 +3,26 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from datetime import datetime, timedelta, date
 from supabase_client import supabase
 import json
 import os
 from dotenv import load_dotenv
 from app.auth import AuthManager
+from utils.data_access import consultar, consultar_pagina, invalidar
+from utils.esquemas import normalizar
+from utils.kpis import kpis_incidentes
+from utils.uploads import barra_progreso, subidas_con_rollback
+from utils.evidencias import preparar_evidencias, leer_evidencias
+from utils.tiempo_real import notificar_local
 
 load_dotenv()
 
+# Historial: tamaños de página y columnas de la vista compacta
+TAMANOS_PAGINA_HISTORIAL = [25, 50, 100]
+COLUMNAS_RESUMEN_HISTORIAL = 'id,codigo,fecha,tipo,area,nivel_riesgo,estado'
+
+
 def mostrar(usuario):
     """Módulo Profesional de Gestión de Incidentes y Accidentes"""
     
@@ -265,41 +275,35 @@ def registrar_incidente(usuario):
                 return
             
             try:
-                # Subir evidencias
-                urls_evidencias = []
-                if evidencias:
-                    for evidencia in evidencias[:5]:
-                        ruta = f"incidentes/{fecha_incidente.isoformat()}/{evidencia.name}"
-                        supabase.storage.from_(os.getenv("BUCKET_NAME")).upload(
-                            ruta, 
-                            evidencia.getvalue(),
-                            file_options={"content-type": evidencia.type}
-                        )
-                        url = supabase.storage.from_(os.getenv("BUCKET_NAME")).get_public_url(ruta)
-                        urls_evidencias.append(url)
+                # Reducir/recomprimir fotos y subirlas en paralelo; se eliminan si falla la inserción
+                archivos, datos_evidencias = preparar_evidencias((evidencias or [])[:5])
+                progreso = barra_progreso() if archivos else None
                 
                 # Combinar fecha y hora
                 fecha_hora = datetime.combine(fecha_incidente, hora_incidente)
                 
-                # Insertar incidente
-                incidente_data = {
-                    'tipo': tipo_incidente,
-                    'descripcion': descripcion,
-                    'area': area,
-                    'puesto_trabajo': puesto_trabajo,
-                    'trabajador_nombre': trabajador_nombre,
-                    'nivel_riesgo': nivel_riesgo,
-                    'fecha': fecha_hora.isoformat(),
-                    'estado': 'Pendiente',
-                    'evidencia': json.dumps(urls_evidencias) if urls_evidencias else None,
-                    'consecuencias': consecuencias,
-                    'testigos': testigos,
-                    'causa_raiz': causa_raiz,
-                    'acciones_correctivas': acciones_correctivas,
-                    'usuario_id': usuario['id']
-                }
-                
-                result = supabase.table('incidentes').insert(incidente_data).execute()
+                with subidas_con_rollback(archivos, progreso=progreso):
+                    # Insertar incidente
+                    incidente_data = {
+                        'tipo': tipo_incidente,
+                        'descripcion': descripcion,
+                        'area': area,
+                        'puesto_trabajo': puesto_trabajo,
+                        'trabajador_nombre': trabajador_nombre,
+                        'nivel_riesgo': nivel_riesgo,
+                        'fecha': fecha_hora.isoformat(),
+                        'estado': 'Pendiente',
+                        'evidencia': json.dumps(datos_evidencias) if datos_evidencias else None,
+                        'consecuencias': consecuencias,
+                        'testigos': testigos,
+                        'causa_raiz': causa_raiz,
+                        'acciones_correctivas': acciones_correctivas,
+                        'usuario_id': usuario['id']
+                    }
+                    
+                    result = supabase.table('incidentes').insert(incidente_data).execute()
+                invalidar('incidentes')
+                notificar_local('incidentes', 'INSERT', result.data[0])
                 
                 incidente_id = result.data[0]['id']
                 
@@ -312,16 +316,19 @@ def registrar_incidente(usuario):
                     'fecha_limite': fecha_limite.isoformat(),
                     'estado': 'Abierta'
                 }).execute()
+                invalidar('acciones_correctivas')
                 
                 # Crear notificación si es riesgo alto
                 if nivel_riesgo >= 15:
-                    supabase.table('notificaciones').insert({
+                    notificacion = supabase.table('notificaciones').insert({
                         'usuario_id': usuario['id'],
                         'tipo': 'riesgo_alto',
                         'titulo': f'⚠️ Incidente de Riesgo {nivel_texto}',
                         'mensaje': f'Se ha registrado un incidente de riesgo {nivel_texto} en {area}',
                         'leida': False
                     }).execute()
+                    invalidar('notificaciones')
+                    notificar_local('notificaciones', 'INSERT', notificacion.data[0])
                 
                 st.success(f"✅ Incidente registrado exitosamente. Código: INC-{incidente_id}")
                 
@@ -433,37 +440,29 @@ def dashboard_incidentes(usuario):
         )
     
     with col3:
-        if st.button("🔄 Actualizar", type="primary", use_container_width=True):
-            st.rerun()
+        refrescar = st.button("🔄 Actualizar", type="primary", use_container_width=True)
     
     try:
-        # Cargar incidentes
-        incidentes = supabase.table('incidentes').select('*') \
-            .gte('fecha', fecha_desde.isoformat()) \
-            .lte('fecha', fecha_hasta.isoformat()) \
-            .execute().data or []
+        # KPIs agregados en el servidor (RPC con respaldo local incremental)
+        kpis = kpis_incidentes(fecha_desde, fecha_hasta, refrescar=refrescar)
         
-        if not incidentes:
+        if not kpis.get('total'):
             st.info("📊 No hay incidentes registrados en este período")
             return
         
-        df = pd.DataFrame(incidentes)
-        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-        df['nivel_riesgo'] = pd.to_numeric(df['nivel_riesgo'], errors='coerce')
-        
         # KPIs principales
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total = len(df)
+            total = kpis['total']
             st.metric(
                 "Total Incidentes",
                 total,
-                delta=f"+{len(df[df['fecha'] >= (datetime.now() - timedelta(days=7))])}"
+                delta=f"+{kpis.get('ultimos_7_dias', 0)}"
             )
         
         with col2:
-            criticos = len(df[df['nivel_riesgo'] >= 15])
+            criticos = kpis.get('criticos', 0)
             st.metric(
                 "🔴 Críticos",
                 criticos,
@@ -472,7 +471,7 @@ def dashboard_incidentes(usuario):
             )
         
         with col3:
-            pendientes = len(df[df['estado'] == 'Pendiente'])
+            pendientes = kpis.get('pendientes', 0)
             st.metric(
                 "⏳ Pendientes",
                 pendientes,
@@ -480,7 +479,7 @@ def dashboard_incidentes(usuario):
             )
         
         with col4:
-            riesgo_prom = df['nivel_riesgo'].mean()
+            riesgo_prom = float(kpis.get('riesgo_promedio') or 0)
             st.metric(
                 "📊 Riesgo Promedio",
                 f"{riesgo_prom:.1f}",
@@ -495,7 +494,10 @@ def dashboard_incidentes(usuario):
         
         with col1:
             # Evolución temporal
-            df_grouped = df.groupby(df['fecha'].dt.date).size().reset_index(name='count')
+            df_grouped = pd.DataFrame(
+                sorted(kpis.get('por_dia', {}).items()),
+                columns=['fecha', 'count']
+            )
             
             fig1 = px.line(
                 df_grouped,
@@ -511,8 +513,10 @@ def dashboard_incidentes(usuario):
         
         with col2:
             # Por tipo
-            tipo_counts = df['tipo'].value_counts().reset_index()
-            tipo_counts.columns = ['tipo', 'count']
+            tipo_counts = pd.DataFrame(
+                list(kpis.get('por_tipo', {}).items()),
+                columns=['tipo', 'count']
+            ).sort_values('count', ascending=False)
             
             fig2 = px.pie(
                 tipo_counts,
@@ -530,8 +534,10 @@ def dashboard_incidentes(usuario):
         
         with col1:
             # Por área
-            area_counts = df['area'].value_counts().reset_index()
-            area_counts.columns = ['area', 'count']
+            area_counts = pd.DataFrame(
+                list(kpis.get('por_area', {}).items()),
+                columns=['area', 'count']
+            ).sort_values('count', ascending=False)
             
             fig3 = px.bar(
                 area_counts,
@@ -547,14 +553,10 @@ def dashboard_incidentes(usuario):
         
         with col2:
             # Distribución de riesgo
-            df['categoria_riesgo'] = pd.cut(
-                df['nivel_riesgo'],
-                bins=[0, 5, 12, 16, 25],
-                labels=['Bajo', 'Medio', 'Alto', 'Crítico']
-            )
-            
-            riesgo_counts = df['categoria_riesgo'].value_counts().reset_index()
-            riesgo_counts.columns = ['categoria', 'count']
+            riesgo_counts = pd.DataFrame(
+                list(kpis.get('por_categoria', {}).items()),
+                columns=['categoria', 'count']
+            ).sort_values('count', ascending=False)
             
             fig4 = px.bar(
                 riesgo_counts,
@@ -613,84 +615,92 @@ def historial_incidentes(usuario):
             value=1
         )
     
+    col_p1, col_p2 = st.columns([1, 3])
+    
+    with col_p1:
+        tamano_pagina = st.selectbox(
+            "Incidentes por página",
+            TAMANOS_PAGINA_HISTORIAL,
+            index=0,
+            key="hist_tamano_pagina"
+        )
+    
     try:
-        # Cargar con filtros
-        query = supabase.table('incidentes').select('*')
+        # Filtros aplicados en el servidor (incluido el nivel de riesgo mínimo)
+        filtros = [('gte', 'nivel_riesgo', filtro_riesgo)]
         
         if filtro_tipo:
-            query = query.in_('tipo', filtro_tipo)
+            filtros.append(('in_', 'tipo', filtro_tipo))
         if filtro_area:
-            query = query.in_('area', filtro_area)
+            filtros.append(('in_', 'area', filtro_area))
         if filtro_estado:
-            query = query.in_('estado', filtro_estado)
-        
-        incidentes = query.order('fecha', desc=True).execute().data or []
+            filtros.append(('in_', 'estado', filtro_estado))
+        
+        # Reiniciar la paginación si cambian los filtros o el tamaño de página
+        firma = repr((filtros, tamano_pagina))
+        if st.session_state.get('hist_firma') != firma:
+            st.session_state.hist_firma = firma
+            st.session_state.hist_cursores = [None]
+        
+        cursores = st.session_state.hist_cursores
+        incidentes, siguiente = consultar_pagina(
+            'incidentes',
+            COLUMNAS_RESUMEN_HISTORIAL,
+            filtros=filtros,
+            claves=('fecha', 'id'),
+            cursor=cursores[-1],
+            tamano=tamano_pagina
+        )
         
         if not incidentes:
             st.info("No se encontraron incidentes con los filtros aplicados")
             return
         
+        pagina = len(cursores)
+        st.info(f"📊 Página {pagina} - Mostrando {len(incidentes)} incidentes")
+        
+        # Vista compacta: una fila por incidente, detalle solo del seleccionado
         df = pd.DataFrame(incidentes)
-        df['nivel_riesgo'] = pd.to_numeric(df['nivel_riesgo'], errors='coerce')
-        df = df[df['nivel_riesgo'] >= filtro_riesgo]
+        df['fecha'] = df['fecha'].astype(str).str[:10]
+        
+        seleccion = st.dataframe(
+            df[['codigo', 'fecha', 'tipo', 'area', 'nivel_riesgo', 'estado']],
+            use_container_width=True,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key=f"hist_tabla_{pagina}"
+        )
         
-        st.info(f"📊 Mostrando {len(df)} incidentes")
+        col_nav1, col_nav2, col_nav3 = st.columns([1, 1, 4])
         
-        # Tabla interactiva
-        for _, inc in df.iterrows():
-            with st.expander(
-                f"🚨 {inc['codigo']} - {inc['area']} - Riesgo: {inc['nivel_riesgo']} - {inc['fecha'][:10]}"
-            ):
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    st.markdown(f"**Tipo:** {inc['tipo']}")
-                    st.markdown(f"**Descripción:** {inc['descripcion']}")
-                    st.markdown(f"**Trabajador:** {inc.get('trabajador_nombre', 'N/A')}")
-                    st.markdown(f"**Causa Raíz:** {inc.get('causa_raiz', 'Sin identificar')}")
-                
-                with col2:
-                    # Badge de estado
-                    estado_color = {
-                        'Pendiente': '#fbbf24',
-                        'En proceso': '#3b82f6',
-                        'Resuelto': '#10b981'
-                    }.get(inc['estado'], '#6b7280')
-                    
-                    st.markdown(f"""
-                        <div style='background: {estado_color}20; padding: 0.5rem; 
-                                    border-radius: 8px; border-left: 4px solid {estado_color};'>
-                            <b>Estado:</b> {inc['estado']}
-                        </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown(f"**Nivel Riesgo:** {inc['nivel_riesgo']}")
-                    
-                    # Botón de cambiar estado
-                    if inc['estado'] != 'Resuelto':
-                        if st.button("✅ Marcar Resuelto", key=f"resolver_{inc['id']}"):
-                            supabase.table('incidentes').update({
-                                'estado': 'Resuelto'
-                            }).eq('id', inc['id']).execute()
-                            st.success("Actualizado")
-                            st.rerun()
-                
-                # Evidencias
-                if inc.get('evidencia'):
-                    st.markdown("**📸 Evidencias:**")
-                    evidencias = json.loads(inc['evidencia'])
-                    cols = st.columns(len(evidencias))
-                    for idx, url in enumerate(evidencias):
-                        with cols[idx]:
-                            st.image(url, use_container_width=True)
+        with col_nav1:
+            if st.button("⬅️ Anterior", disabled=pagina == 1, use_container_width=True):
+                cursores.pop()
+                st.rerun()
+        
+        with col_nav2:
+            if st.button("Siguiente ➡️", disabled=siguiente is None, use_container_width=True):
+                cursores.append(siguiente)
+                st.rerun()
+        
+        filas_seleccionadas = seleccion.selection.rows if seleccion else []
+        
+        if filas_seleccionadas:
+            inc_id = df.iloc[filas_seleccionadas[0]]['id']
+            detalle = consultar('incidentes', filtros=[('eq', 'id', inc_id)])
+            if detalle:
+                mostrar_detalle_incidente(detalle[0])
+        else:
+            st.caption("👆 Selecciona una fila para ver el detalle y las evidencias")
         
         # Exportar
         st.markdown("---")
         csv = df.to_csv(index=False).encode('utf-8')
         st.download_button(
-            "📥 Exportar CSV",
+            "📥 Exportar página CSV",
             csv,
-            f"incidentes_{datetime.now().strftime('%Y%m%d')}.csv",
+            f"incidentes_{datetime.now().strftime('%Y%m%d')}_p{pagina}.csv",
             "text/csv"
         )
         
@@ -698,6 +708,65 @@ def historial_incidentes(usuario):
         st.error(f"Error: {e}")
 
 
+def mostrar_detalle_incidente(inc):
+    """Detalle de un incidente del historial, con evidencias"""
+    
+    st.markdown(
+        f"#### 🚨 {inc['codigo']} - {inc['area']} - Riesgo: {inc['nivel_riesgo']} - {str(inc['fecha'])[:10]}"
+    )
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        st.markdown(f"**Tipo:** {inc['tipo']}")
+        st.markdown(f"**Descripción:** {inc['descripcion']}")
+        st.markdown(f"**Trabajador:** {inc.get('trabajador_nombre', 'N/A')}")
+        st.markdown(f"**Causa Raíz:** {inc.get('causa_raiz', 'Sin identificar')}")
+    
+    with col2:
+        # Badge de estado
+        estado_color = {
+            'Pendiente': '#fbbf24',
+            'En proceso': '#3b82f6',
+            'Resuelto': '#10b981'
+        }.get(inc['estado'], '#6b7280')
+        
+        st.markdown(f"""
+            <div style='background: {estado_color}20; padding: 0.5rem; 
+                        border-radius: 8px; border-left: 4px solid {estado_color};'>
+                <b>Estado:</b> {inc['estado']}
+            </div>
+        """, unsafe_allow_html=True)
+        
+        st.markdown(f"**Nivel Riesgo:** {inc['nivel_riesgo']}")
+        
+        # Botón de cambiar estado
+        if inc['estado'] != 'Resuelto':
+            if st.button("✅ Marcar Resuelto", key=f"resolver_{inc['id']}"):
+                result = supabase.table('incidentes').update({
+                    'estado': 'Resuelto'
+                }).eq('id', inc['id']).execute()
+                invalidar('incidentes')
+                if result.data:
+                    notificar_local('incidentes', 'UPDATE', result.data[0])
+                st.success("Actualizado")
+                st.rerun()
+    
+    # Evidencias: miniaturas; la imagen completa solo a pedido
+    evidencias = leer_evidencias(inc.get('evidencia'))
+    if evidencias:
+        st.markdown("**📸 Evidencias:**")
+        cols = st.columns(len(evidencias))
+        for idx, ev in enumerate(evidencias):
+            with cols[idx]:
+                if ev['miniatura']:
+                    st.image(ev['miniatura'], use_container_width=True)
+                    if st.toggle("🔍 Ver original", key=f"ev_{inc['id']}_{idx}"):
+                        st.image(ev['url'], use_container_width=True)
+                else:
+                    st.markdown(f"[📎 Ver evidencia {idx + 1}]({ev['url']})")
+
+
 def investigacion_incidentes(usuario):
     """Módulo de investigación de incidentes"""
     
@@ -705,10 +774,11 @@ def investigacion_incidentes(usuario):
     
     try:
         # Cargar incidentes no resueltos
-        incidentes = supabase.table('incidentes').select('*') \
-            .neq('estado', 'Resuelto') \
-            .order('nivel_riesgo', desc=True) \
-            .execute().data or []
+        incidentes = consultar(
+            'incidentes',
+            filtros=[('neq', 'estado', 'Resuelto')],
+            orden=('nivel_riesgo', True)
+        )
         
         if not incidentes:
             st.success("✅ No hay incidentes pendientes de investigación")
@@ -807,11 +877,14 @@ def investigacion_incidentes(usuario):
                 if submitted:
                     try:
                         # Actualizar incidente
-                        supabase.table('incidentes').update({
+                        result = supabase.table('incidentes').update({
                             'causa_raiz': causas_basicas,
                             'estado': 'En proceso',
                             'acciones_correctivas': acciones_propuestas
                         }).eq('id', inc_id).execute()
+                        invalidar('incidentes')
+                        if result.data:
+                            notificar_local('incidentes', 'UPDATE', result.data[0])
                         
                         # Crear acción correctiva
                         supabase.table('acciones_correctivas').insert({
@@ -822,6 +895,7 @@ def investigacion_incidentes(usuario):
                             'fecha_limite': fecha_limite.isoformat(),
                             'estado': 'En progreso'
                         }).execute()
+                        invalidar('acciones_correctivas')
                         
                         st.success("✅ Investigación guardada exitosamente")
                         st.balloons()
@@ -847,18 +921,16 @@ def analisis_estadistico(usuario):
         fecha_hasta = st.date_input("Hasta", value=datetime.now(), key="analisis_hasta")
     
     try:
-        incidentes = supabase.table('incidentes').select('*') \
-            .gte('fecha', fecha_desde.isoformat()) \
-            .lte('fecha', fecha_hasta.isoformat()) \
-            .execute().data or []
+        incidentes = consultar('incidentes', filtros=[
+            ('gte', 'fecha', fecha_desde.isoformat()),
+            ('lte', 'fecha', fecha_hasta.isoformat())
+        ])
         
         if not incidentes:
             st.info("No hay datos para analizar")
             return
         
-        df = pd.DataFrame(incidentes)
-        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-        df['nivel_riesgo'] = pd.to_numeric(df['nivel_riesgo'], errors='coerce')
+        df = normalizar(pd.DataFrame(incidentes), 'incidentes')
         
         # Análisis de tendencias
         st.markdown("### 📊 Tendencias y Patrones")
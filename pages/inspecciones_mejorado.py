@@ -7,6 +7,11 @@ import json
 import os
 from dotenv import load_dotenv
 from app.auth import AuthManager
+from utils.data_access import consultar, invalidar
+from utils.esquemas import normalizar
+from utils.uploads import barra_progreso, subidas_con_rollback
+from utils.evidencias import preparar_evidencias
+from utils.tiempo_real import notificar_local
 
 load_dotenv()
 
@@ -44,7 +49,7 @@ def gestionar_checklists(usuario):
     
     # Cargar plantillas existentes
     try:
-        plantillas = supabase.table('checklists_plantillas').select('*').execute().data or []
+        plantillas = consultar('checklists_plantillas')
     except:
         plantillas = []
     
@@ -136,6 +141,7 @@ def gestionar_checklists(usuario):
                         'items': json.dumps(st.session_state.checklist_items),
                         'creado_por': usuario['id']
                     }).execute()
+                    invalidar('checklists_plantillas')
                     
                     st.success("✅ Plantilla creada exitosamente")
                     st.session_state.checklist_items = []
@@ -172,6 +178,7 @@ def gestionar_checklists(usuario):
                         if st.button("🗑️ Eliminar", key=f"elim_{plantilla['id']}"):
                             try:
                                 supabase.table('checklists_plantillas').delete().eq('id', plantilla['id']).execute()
+                                invalidar('checklists_plantillas')
                                 st.success("Plantilla eliminada")
                                 st.rerun()
                             except Exception as e:
@@ -185,7 +192,7 @@ def realizar_inspeccion(usuario):
     
     # Cargar plantillas
     try:
-        plantillas = supabase.table('checklists_plantillas').select('*').execute().data or []
+        plantillas = consultar('checklists_plantillas')
     except:
         plantillas = []
     
@@ -317,35 +324,33 @@ def realizar_inspeccion(usuario):
         
         if submitted:
             try:
-                # Subir evidencias
-                urls_evidencias = []
-                if evidencias:
-                    for evidencia in evidencias[:5]:
-                        ruta = f"inspecciones/{fecha_insp.isoformat()}/{evidencia.name}"
-                        supabase.storage.from_(os.getenv("BUCKET_NAME")).upload(ruta, evidencia.getvalue())
-                        url = supabase.storage.from_(os.getenv("BUCKET_NAME")).get_public_url(ruta)
-                        urls_evidencias.append(url)
+                # Reducir/recomprimir fotos y subirlas en paralelo; se eliminan si falla la inserción
+                archivos, datos_evidencias = preparar_evidencias((evidencias or [])[:5])
+                progreso = barra_progreso() if archivos else None
                 
                 # Calcular score
                 total_items = len(respuestas)
                 items_conformes = sum(1 for r in respuestas if r['respuesta'] in ['Sí', '5', '4'])
                 score = (items_conformes / total_items * 100) if total_items > 0 else 0
                 
-                # Guardar inspección
-                insp = supabase.table('inspecciones').insert({
-                    'plantilla_id': plantilla_id,
-                    'area': area_insp,
-                    'inspector': inspector,
-                    'fecha': fecha_insp.isoformat(),
-                    'turno': turno,
-                    'respuestas': json.dumps(respuestas),
-                    'hallazgos': json.dumps(hallazgos),
-                    'score': score,
-                    'evidencia': json.dumps(urls_evidencias) if urls_evidencias else None,
-                    'observaciones': observaciones_generales,
-                    'estado': 'Resuelto' if len(hallazgos) == 0 else 'Pendiente',
-                    'usuario_id': usuario['id']
-                }).execute()
+                with subidas_con_rollback(archivos, progreso=progreso):
+                    # Guardar inspección
+                    insp = supabase.table('inspecciones').insert({
+                        'plantilla_id': plantilla_id,
+                        'area': area_insp,
+                        'inspector': inspector,
+                        'fecha': fecha_insp.isoformat(),
+                        'turno': turno,
+                        'respuestas': json.dumps(respuestas),
+                        'hallazgos': json.dumps(hallazgos),
+                        'score': score,
+                        'evidencia': json.dumps(datos_evidencias) if datos_evidencias else None,
+                        'observaciones': observaciones_generales,
+                        'estado': 'Resuelto' if len(hallazgos) == 0 else 'Pendiente',
+                        'usuario_id': usuario['id']
+                    }).execute()
+                invalidar('inspecciones')
+                notificar_local('inspecciones', 'INSERT', insp.data[0])
                 
                 st.success(f"✅ Inspección completada. Score: {score:.1f}%")
                 
@@ -377,14 +382,15 @@ def historial_inspecciones(usuario):
         estado_filtro = st.selectbox("Estado", ["Todos", "Pendiente", "Resuelto"])
     
     try:
-        query = supabase.table('inspecciones').select('*') \
-            .gte('fecha', fecha_desde.isoformat()) \
-            .lte('fecha', fecha_hasta.isoformat())
+        filtros = [
+            ('gte', 'fecha', fecha_desde.isoformat()),
+            ('lte', 'fecha', fecha_hasta.isoformat())
+        ]
         
         if estado_filtro != "Todos":
-            query = query.eq('estado', estado_filtro)
+            filtros.append(('eq', 'estado', estado_filtro))
         
-        inspecciones = query.order('fecha', desc=True).execute().data or []
+        inspecciones = consultar('inspecciones', filtros=filtros, orden=('fecha', True))
         
         if not inspecciones:
             st.info("No hay inspecciones en este período")
@@ -423,6 +429,8 @@ def historial_inspecciones(usuario):
                     if insp['estado'] == 'Pendiente':
                         if st.button("✅ Marcar como Resuelto", key=f"resolver_{insp['id']}"):
                             supabase.table('inspecciones').update({'estado': 'Resuelto'}).eq('id', insp['id']).execute()
+                            invalidar('inspecciones')
+                            notificar_local('inspecciones', 'UPDATE', {**insp, 'estado': 'Resuelto'})
                             st.success("Actualizado")
                             st.rerun()
                 
@@ -456,14 +464,13 @@ def analisis_inspecciones(usuario):
     st.subheader("📈 Análisis de Inspecciones")
     
     try:
-        inspecciones = supabase.table('inspecciones').select('*').execute().data or []
+        inspecciones = consultar('inspecciones')
         
         if not inspecciones:
             st.info("No hay datos para analizar")
             return
         
-        df = pd.DataFrame(inspecciones)
-        df['fecha'] = pd.to_datetime(df['fecha'])
+        df = normalizar(pd.DataFrame(inspecciones), 'inspecciones')
         
         # Gráfico de evolución del score
         import plotly.graph_objects as go
@@ -4,17 +4,40 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
-from supabase_client import supabase
 from app.auth import AuthManager
+from utils.data_access import consultar, columnas_requeridas
+from utils.esquemas import normalizar
+from utils.graficos import grafico_pdf
+from utils.kpis import kpis_incidentes
+from utils import trabajos_reportes
+
+# Columnas que necesita cada reporte; las tablas ausentes se cargan completas.
+# Una lista vacía descarga solo `id` (el reporte únicamente cuenta filas).
+COLUMNAS_REPORTE_EJECUTIVO = {
+    'ejecutivo': {
+        'incidentes': ['fecha'],
+        'capacitaciones': [],
+        'epp': [],
+        'inspecciones': [],
+    }
+}
+
+COLUMNAS_ANALISIS = {
+    'tendencia': {'incidentes': ['fecha']},
+    'area': {'incidentes': ['area']},
+    'capacitaciones': {'capacitaciones': []},
+    'otros': {'epp': [], 'inspecciones': []},
+}
+
+COLUMNAS_PERSONALIZADO_PDF = {
+    'resumen': {
+        'incidentes': [],
+        'capacitaciones': [],
+        'epp': [],
+        'inspecciones': [],
+    }
+}
 import io
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-import tempfile
-import os
 
 def mostrar(usuario):
     """Módulo de Reportes Profesionales"""
@@ -33,11 +56,12 @@ def mostrar(usuario):
         </div>
     """, unsafe_allow_html=True)
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "📄 Reporte Ejecutivo",
         "📋 Reporte Legal SUNAFIL",
         "📈 Análisis Estadístico",
-        "🎯 Reportes Personalizados"
+        "🎯 Reportes Personalizados",
+        "🗂️ Mis Reportes"
     ])
     
     with tab1:
@@ -51,6 +75,9 @@ def mostrar(usuario):
     
     with tab4:
         reportes_personalizados(usuario)
+    
+    with tab5:
+        mis_reportes(usuario)
 
 
 def reporte_ejecutivo(usuario):
@@ -72,25 +99,14 @@ def reporte_ejecutivo(usuario):
         fecha_fin = date(anio, mes + 1, 1) - timedelta(days=1)
     
     if st.button("📥 Generar Reporte Ejecutivo PDF", type="primary"):
-        with st.spinner("Generando reporte profesional..."):
-            try:
-                # Cargar datos
-                data = cargar_datos_reporte(fecha_inicio, fecha_fin)
-                
-                # Generar PDF
-                pdf_buffer = generar_pdf_ejecutivo(data, fecha_inicio, fecha_fin, usuario)
-                
-                st.success("✅ Reporte generado exitosamente")
-                
-                st.download_button(
-                    label="📥 Descargar PDF",
-                    data=pdf_buffer,
-                    file_name=f"Reporte_Ejecutivo_SST_{anio}_{mes:02d}.pdf",
-                    mime="application/pdf"
-                )
-                
-            except Exception as e:
-                st.error(f"Error generando reporte: {e}")
+        try:
+            encolar_reporte('ejecutivo', {
+                'desde': fecha_inicio.isoformat(),
+                'hasta': fecha_fin.isoformat(),
+                'generado_por': usuario['nombre_completo']
+            }, usuario, f"Reporte_Ejecutivo_SST_{anio}_{mes:02d}.pdf")
+        except Exception as e:
+            st.error(f"Error generando reporte: {e}")
 
 
 def reporte_legal_sunafil(usuario):
@@ -137,17 +153,19 @@ def reporte_legal_sunafil(usuario):
         )
     
     if st.button("📥 Generar Reporte Legal PDF", type="primary"):
-        with st.spinner("Generando reporte legal..."):
+        with st.spinner("Calculando indicadores..."):
             try:
-                data = cargar_datos_reporte(fecha_inicio, fecha_fin)
-                
-                # Calcular indicadores legales
-                indicadores = calcular_indicadores_legales(data, horas_hombre, num_trabajadores)
+                # Calcular indicadores legales (conteos agregados en el servidor)
+                kpis = kpis_incidentes(fecha_inicio, fecha_fin)
+                indicadores = calcular_indicadores_legales(kpis, horas_hombre, num_trabajadores)
                 
-                # Generar PDF legal
-                pdf_buffer = generar_pdf_legal(data, indicadores, fecha_inicio, fecha_fin)
-                
-                st.success("✅ Reporte legal generado")
+                # El PDF se genera en segundo plano (trimestres completos incluidos)
+                encolar_reporte('legal', {
+                    'desde': fecha_inicio.isoformat(),
+                    'hasta': fecha_fin.isoformat(),
+                    'horas_hombre': horas_hombre,
+                    'num_trabajadores': num_trabajadores
+                }, usuario, f"Reporte_Legal_SUNAFIL_{fecha_inicio}_{fecha_fin}.pdf")
                 
                 # Mostrar preview de indicadores
                 st.markdown("### 📊 Preview de Indicadores")
@@ -178,13 +196,6 @@ def reporte_legal_sunafil(usuario):
                         delta_color="inverse" if indicadores['indice_incidencia'] > 1 else "normal"
                     )
                 
-                st.download_button(
-                    label="📥 Descargar Reporte Legal PDF",
-                    data=pdf_buffer,
-                    file_name=f"Reporte_Legal_SUNAFIL_{fecha_inicio}_{fecha_fin}.pdf",
-                    mime="application/pdf"
-                )
-                
             except Exception as e:
                 st.error(f"Error: {e}")
 
@@ -202,16 +213,14 @@ def analisis_estadistico(usuario):
         fecha_fin = st.date_input("Hasta", value=datetime.now(), key="est_fin")
     
     if st.button("📊 Generar Análisis", type="primary"):
-        data = cargar_datos_reporte(fecha_inicio, fecha_fin)
+        data = cargar_datos_reporte(fecha_inicio, fecha_fin, COLUMNAS_ANALISIS)
         
         # Gráficos estadísticos
         st.markdown("### 📊 Visualizaciones")
         
         # Evolución temporal de incidentes
         if not data['incidentes'].empty:
-            df_inc = data['incidentes'].copy()
-            df_inc['fecha'] = pd.to_datetime(df_inc['fecha'], errors='coerce')
-            df_inc = df_inc.dropna(subset=['fecha'])
+            df_inc = data['incidentes'].dropna(subset=['fecha'])
             
             # Serie temporal
             df_grouped = df_inc.groupby(df_inc['fecha'].dt.to_period('W')).size().reset_index(name='count')
@@ -313,57 +322,153 @@ def reportes_personalizados(usuario):
                 'areas': areas_filtro
             }
             
-            data = cargar_datos_reporte(fecha_inicio, fecha_fin)
+            params = {
+                'desde': fecha_inicio.isoformat(),
+                'hasta': fecha_fin.isoformat(),
+                'config': config
+            }
             
             if formato == "PDF":
-                pdf_buffer = generar_pdf_personalizado(data, config, fecha_inicio, fecha_fin)
-                
-                st.download_button(
-                    "📥 Descargar PDF Personalizado",
-                    pdf_buffer,
-                    f"Reporte_Personalizado_{fecha_inicio}_{fecha_fin}.pdf",
-                    "application/pdf"
-                )
+                encolar_reporte('personalizado_pdf', params, usuario,
+                                f"Reporte_Personalizado_{fecha_inicio}_{fecha_fin}.pdf")
             else:
-                excel_buffer = generar_excel_personalizado(data, config, fecha_inicio, fecha_fin)
+                encolar_reporte('personalizado_excel', params, usuario,
+                                f"Reporte_Personalizado_{fecha_inicio}_{fecha_fin}.xlsx")
+
+
+ESTADOS_TRABAJO = {
+    'en_cola': '⏳ En cola',
+    'en_proceso': '⚙️ Generando',
+    'listo': '✅ Listo',
+    'error': '❌ Error',
+}
+
+TITULOS_TRABAJO = {
+    'ejecutivo': 'Reporte Ejecutivo',
+    'legal': 'Reporte Legal SUNAFIL',
+    'personalizado_pdf': 'Personalizado (PDF)',
+    'personalizado_excel': 'Personalizado (Excel)',
+}
+
+
+def encolar_reporte(tipo, params, usuario, nombre_archivo):
+    """Encola el reporte y avisa si ya estaba generado con los mismos parámetros."""
+    id_trabajo = trabajos_reportes.encolar(tipo, params, usuario['id'], nombre_archivo)
+    trabajo = trabajos_reportes.trabajo(id_trabajo)
+    if trabajo['estado'] == 'listo':
+        st.success("✅ Reporte disponible (ya generado con los mismos parámetros) en 🗂️ Mis Reportes")
+    else:
+        st.info("⏳ Reporte en cola. Puedes seguir trabajando; estará en 🗂️ Mis Reportes")
+
+
+def mis_reportes(usuario):
+    """Estado e historial de los reportes del usuario"""
+    
+    st.subheader("🗂️ Mis Reportes")
+    
+    # Mientras haya trabajos pendientes el panel se refresca solo
+    intervalo = 2 if trabajos_reportes.hay_pendientes(usuario['id']) else None
+    fragmento = getattr(st, 'fragment', None) or st.experimental_fragment
+    
+    @fragmento(run_every=intervalo)
+    def panel():
+        trabajos = trabajos_reportes.trabajos_de(usuario['id'])
+        if not trabajos:
+            st.info("Aún no has generado reportes")
+            return
+        
+        for trabajo in trabajos:
+            col1, col2, col3 = st.columns([3, 2, 2])
+            
+            with col1:
+                st.markdown(f"**{TITULOS_TRABAJO.get(trabajo['tipo'], trabajo['tipo'])}**")
+                st.caption(f"{trabajo['nombre_archivo']} | "
+                           f"{trabajos_reportes.formatear_instante(trabajo['creado_en'])}")
+            
+            with col2:
+                estado = ESTADOS_TRABAJO.get(trabajo['estado'], trabajo['estado'])
+                if trabajo.get('desde_cache'):
+                    estado += " (caché)"
+                st.write(estado)
+                if trabajo['estado'] == 'error':
+                    st.caption(trabajo.get('error', ''))
+            
+            with col3:
+                if trabajo['estado'] in ('listo', 'error'):
+                    if st.button("🔄 Regenerar", key=f"regenerar_{trabajo['id']}", use_container_width=True):
+                        trabajos_reportes.encolar(trabajo['tipo'], trabajo['params'], usuario['id'],
+                                                  trabajo['nombre_archivo'], forzar=True)
+                        # Rerun completo para activar el refresco automático
+                        st.rerun()
                 
-                st.download_button(
-                    "📥 Descargar Excel Personalizado",
-                    excel_buffer,
-                    f"Reporte_Personalizado_{fecha_inicio}_{fecha_fin}.xlsx",
-                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                if trabajo['estado'] == 'listo':
+                    # El archivo solo se lee para el trabajo que el usuario elige
+                    preparado = st.session_state.get('reporte_preparado')
+                    if (preparado is None or preparado[0] != trabajo['id']) and st.button(
+                            "📦 Preparar descarga", key=f"preparar_{trabajo['id']}", use_container_width=True):
+                        try:
+                            preparado = (trabajo['id'], trabajos_reportes.leer_resultado(trabajo))
+                            st.session_state['reporte_preparado'] = preparado
+                        except Exception:
+                            st.caption("Archivo no disponible (vencido)")
+                    
+                    if preparado is not None and preparado[0] == trabajo['id']:
+                        st.download_button(
+                            "📥 Descargar",
+                            preparado[1],
+                            trabajo['nombre_archivo'],
+                            trabajo['mime'],
+                            key=f"descargar_{trabajo['id']}",
+                            use_container_width=True
+                        )
+        
+        if intervalo and not trabajos_reportes.hay_pendientes(usuario['id']):
+            # Todo terminó: rerun completo para detener el refresco automático
+            st.rerun()
+    
+    panel()
 
 
 # ==================== FUNCIONES AUXILIARES ====================
 
-def cargar_datos_reporte(fecha_inicio, fecha_fin):
-    """Carga todos los datos para reportes"""
+def leer_datos_reporte(fecha_inicio, fecha_fin, especificacion=None):
+    """Carga los datos para reportes (los errores se propagan).
+    
+    `especificacion` es un dict `{seccion: {tabla: [columnas]}}`; solo se piden
+    las columnas declaradas. Sin especificación se cargan las tablas completas.
+    """
     
+    def columnas(tabla):
+        if especificacion is None or not any(tabla in t for t in especificacion.values()):
+            return '*'
+        return columnas_requeridas(especificacion, tabla)
+    
+    rango_fechas = [
+        ('gte', 'fecha', fecha_inicio.isoformat()),
+        ('lte', 'fecha', fecha_fin.isoformat())
+    ]
+    
+    incidentes = consultar('incidentes', columnas('incidentes'), filtros=rango_fechas)
+    
+    capacitaciones = consultar('capacitaciones', columnas('capacitaciones'), filtros=rango_fechas)
+    
+    epp = consultar('epp', columnas('epp'))
+    
+    inspecciones = consultar('inspecciones', columnas('inspecciones'), filtros=rango_fechas)
+    
+    # Tipos declarados en utils.esquemas: se convierten una vez para PDF, Excel y gráficos
+    return {
+        'incidentes': normalizar(pd.DataFrame(incidentes), 'incidentes'),
+        'capacitaciones': normalizar(pd.DataFrame(capacitaciones), 'capacitaciones'),
+        'epp': normalizar(pd.DataFrame(epp), 'epp'),
+        'inspecciones': normalizar(pd.DataFrame(inspecciones), 'inspecciones')
+    }
+
+
+def cargar_datos_reporte(fecha_inicio, fecha_fin, especificacion=None):
+    """Como `leer_datos_reporte`, mostrando el error en la página."""
     try:
-        incidentes = supabase.table('incidentes').select('*') \
-            .gte('fecha', fecha_inicio.isoformat()) \
-            .lte('fecha', fecha_fin.isoformat()) \
-            .execute().data or []
-        
-        capacitaciones = supabase.table('capacitaciones').select('*') \
-            .gte('fecha', fecha_inicio.isoformat()) \
-            .lte('fecha', fecha_fin.isoformat()) \
-            .execute().data or []
-        
-        epp = supabase.table('epp').select('*').execute().data or []
-        
-        inspecciones = supabase.table('inspecciones').select('*') \
-            .gte('fecha', fecha_inicio.isoformat()) \
-            .lte('fecha', fecha_fin.isoformat()) \
-            .execute().data or []
-        
-        return {
-            'incidentes': pd.DataFrame(incidentes),
-            'capacitaciones': pd.DataFrame(capacitaciones),
-            'epp': pd.DataFrame(epp),
-            'inspecciones': pd.DataFrame(inspecciones)
-        }
+        return leer_datos_reporte(fecha_inicio, fecha_fin, especificacion)
     
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
@@ -375,14 +480,11 @@ def cargar_datos_reporte(fecha_inicio, fecha_fin):
         }
 
 
-def calcular_indicadores_legales(data, horas_hombre, num_trabajadores):
-    """Calcula indicadores según Ley 29783"""
+def calcular_indicadores_legales(kpis, horas_hombre, num_trabajadores):
+    """Calcula indicadores según Ley 29783 a partir de `kpis_incidentes`"""
     
-    # Filtrar accidentes (nivel_riesgo >= 10)
-    if not data['incidentes'].empty and 'nivel_riesgo' in data['incidentes'].columns:
-        accidentes = len(data['incidentes'][pd.to_numeric(data['incidentes']['nivel_riesgo'], errors='coerce') >= 10])
-    else:
-        accidentes = 0
+    # Accidentes (nivel_riesgo >= 10), contados por la RPC o su respaldo
+    accidentes = int(kpis.get('accidentes', 0))
     
     # Simular días perdidos (en producción vendría de campo en BD)
     dias_perdidos = accidentes * 15
@@ -407,6 +509,12 @@ def calcular_indicadores_legales(data, horas_hombre, num_trabajadores):
 
 def generar_pdf_ejecutivo(data, fecha_inicio, fecha_fin, usuario):
     """Genera PDF ejecutivo con gráficos"""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
     
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -452,21 +560,16 @@ def generar_pdf_ejecutivo(data, fecha_inicio, fecha_fin, usuario):
     elements.append(kpi_table)
     elements.append(Spacer(1, 30))
     
-    # Generar gráfico y guardarlo temporalmente
+    # Gráfico renderizado en memoria
     if not data['incidentes'].empty:
-        df = data['incidentes'].copy()
-        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-        df = df.dropna(subset=['fecha'])
+        df = data['incidentes'].dropna(subset=['fecha'])
         
         df_grouped = df.groupby(df['fecha'].dt.to_period('D')).size().reset_index(name='count')
+        df_grouped['fecha'] = df_grouped['fecha'].dt.to_timestamp()
         
         fig = px.line(df_grouped, x='fecha', y='count', title='Tendencia de Incidentes')
         
-        # Guardar imagen temporal
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-            fig.write_image(tmp.name)
-            elements.append(Image(tmp.name, width=5*inch, height=3*inch))
-            os.unlink(tmp.name)
+        elements.append(grafico_pdf(fig, 5*inch, 3*inch))
     
     elements.append(Spacer(1, 20))
     elements.append(Paragraph(f"Generado por: {usuario['nombre_completo']}", styles['Normal']))
@@ -478,8 +581,12 @@ def generar_pdf_ejecutivo(data, fecha_inicio, fecha_fin, usuario):
     return buffer
 
 
-def generar_pdf_legal(data, indicadores, fecha_inicio, fecha_fin):
+def generar_pdf_legal(indicadores, fecha_inicio, fecha_fin):
     """Genera PDF legal para SUNAFIL"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
     
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -547,6 +654,9 @@ def generar_pdf_legal(data, indicadores, fecha_inicio, fecha_fin):
 
 def generar_pdf_personalizado(data, config, fecha_inicio, fecha_fin):
     """Genera PDF personalizado según configuración"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
     
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -575,22 +685,64 @@ def generar_pdf_personalizado(data, config, fecha_inicio, fecha_fin):
 
 
 def generar_excel_personalizado(data, config, fecha_inicio, fecha_fin):
-    """Genera Excel personalizado"""
-    
-    buffer = io.BytesIO()
-    
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        if config['incluir_incidentes'] and not data['incidentes'].empty:
-            data['incidentes'].to_excel(writer, sheet_name='Incidentes', index=False)
-        
-        if config['incluir_capacitaciones'] and not data['capacitaciones'].empty:
-            data['capacitaciones'].to_excel(writer, sheet_name='Capacitaciones', index=False)
-        
-        if config['incluir_epp'] and not data['epp'].empty:
-            data['epp'].to_excel(writer, sheet_name='EPP', index=False)
-        
-        if config['incluir_inspecciones'] and not data['inspecciones'].empty:
-            data['inspecciones'].to_excel(writer, sheet_name='Inspecciones', index=False)
-    
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    """Genera Excel personalizado en un archivo temporal (escritura en streaming)"""
+    from utils.report_excel import excel_temporal
+    
+    secciones = [
+        ('incluir_incidentes', 'incidentes', 'Incidentes'),
+        ('incluir_capacitaciones', 'capacitaciones', 'Capacitaciones'),
+        ('incluir_epp', 'epp', 'EPP'),
+        ('incluir_inspecciones', 'inspecciones', 'Inspecciones'),
+    ]
+    hojas = {
+        titulo: data[clave]
+        for opcion, clave, titulo in secciones
+        if config[opcion] and not data[clave].empty
+    }
+    return excel_temporal(hojas)
+
+
+# ==================== TRABAJOS EN SEGUNDO PLANO ====================
+# Se ejecutan en el pool de utils.trabajos_reportes: sin llamadas a st.*
+
+def _fechas(params):
+    return date.fromisoformat(params['desde']), date.fromisoformat(params['hasta'])
+
+
+def _trabajo_ejecutivo(params):
+    fecha_inicio, fecha_fin = _fechas(params)
+    data = leer_datos_reporte(fecha_inicio, fecha_fin, COLUMNAS_REPORTE_EJECUTIVO)
+    autor = {'nombre_completo': params['generado_por']}
+    return generar_pdf_ejecutivo(data, fecha_inicio, fecha_fin, autor).getvalue()
+
+
+def _trabajo_legal(params):
+    fecha_inicio, fecha_fin = _fechas(params)
+    # Los indicadores salen de los KPIs de incidentes: no hace falta cargar las tablas
+    kpis = kpis_incidentes(fecha_inicio, fecha_fin)
+    indicadores = calcular_indicadores_legales(kpis, params['horas_hombre'], params['num_trabajadores'])
+    return generar_pdf_legal(indicadores, fecha_inicio, fecha_fin).getvalue()
+
+
+def _trabajo_personalizado_pdf(params):
+    fecha_inicio, fecha_fin = _fechas(params)
+    # El PDF solo cuenta filas
+    data = leer_datos_reporte(fecha_inicio, fecha_fin, COLUMNAS_PERSONALIZADO_PDF)
+    return generar_pdf_personalizado(data, params['config'], fecha_inicio, fecha_fin).getvalue()
+
+
+def _trabajo_personalizado_excel(params):
+    fecha_inicio, fecha_fin = _fechas(params)
+    # El Excel exporta las tablas completas
+    data = leer_datos_reporte(fecha_inicio, fecha_fin)
+    return generar_excel_personalizado(data, params['config'], fecha_inicio, fecha_fin)
+
+
+# Tablas que leen los reportes: sus cambios invalidan los resultados guardados
+TABLAS_REPORTE = ('incidentes', 'capacitaciones', 'epp', 'inspecciones')
+
+trabajos_reportes.registrar_tipo('ejecutivo', _trabajo_ejecutivo, tablas=TABLAS_REPORTE)
+trabajos_reportes.registrar_tipo('legal', _trabajo_legal, tablas=('incidentes',))
+trabajos_reportes.registrar_tipo('personalizado_pdf', _trabajo_personalizado_pdf, tablas=TABLAS_REPORTE)
+trabajos_reportes.registrar_tipo('personalizado_excel', _trabajo_personalizado_excel, extension='xlsx',
+                                 tablas=TABLAS_REPORTE)
@@ -0,0 +1,106 @@
+-- supabase/migrations/20261017000100_kpi_rpc.sql
+-- Funciones RPC que devuelven los KPIs ya agregados (tamaño O(n° de KPIs)).
+-- Consumidas por utils/kpis.py vía supabase.rpc(...); si no existen, la app
+-- calcula los mismos valores en pandas.
+
+-- ------------------------------------------------------------
+-- KPIs del módulo de incidentes
+-- ------------------------------------------------------------
+create or replace function public.kpis_incidentes(p_desde timestamp, p_hasta timestamp)
+returns jsonb
+language sql
+stable
+as $$
+    with base as (
+        select
+            i.fecha,
+            i.tipo,
+            i.area,
+            i.estado,
+            i.nivel_riesgo::numeric as nivel_riesgo
+        from public.incidentes i
+        where i.fecha >= p_desde
+          and i.fecha <= p_hasta
+    )
+    select jsonb_build_object(
+        'total',           (select count(*) from base),
+        'criticos',        (select count(*) from base where nivel_riesgo >= 15),
+        'accidentes',      (select count(*) from base where nivel_riesgo >= 10),
+        'pendientes',      (select count(*) from base where estado = 'Pendiente'),
+        'riesgo_promedio', (select avg(nivel_riesgo) from base),
+        'ultimos_7_dias',  (select count(*) from base where fecha >= now() - interval '7 days'),
+        'por_estado',      coalesce((select jsonb_object_agg(k, n) from (
+                               select coalesce(estado, 'N/A') as k, count(*) as n
+                               from base group by 1) t), '{}'::jsonb),
+        'por_tipo',        coalesce((select jsonb_object_agg(k, n) from (
+                               select coalesce(tipo, 'N/A') as k, count(*) as n
+                               from base group by 1) t), '{}'::jsonb),
+        'por_area',        coalesce((select jsonb_object_agg(k, n) from (
+                               select coalesce(area, 'N/A') as k, count(*) as n
+                               from base group by 1) t), '{}'::jsonb),
+        'por_categoria',   coalesce((select jsonb_object_agg(k, n) from (
+                               select case
+                                          when nivel_riesgo <= 5  then 'Bajo'
+                                          when nivel_riesgo <= 12 then 'Medio'
+                                          when nivel_riesgo <= 16 then 'Alto'
+                                          else 'Crítico'
+                                      end as k,
+                                      count(*) as n
+                               from base
+                               where nivel_riesgo > 0 and nivel_riesgo <= 25
+                               group by 1) t), '{}'::jsonb),
+        'por_dia',         coalesce((select jsonb_object_agg(k, n) from (
+                               select to_char(fecha::date, 'YYYY-MM-DD') as k, count(*) as n
+                               from base where fecha is not null group by 1) t), '{}'::jsonb)
+    );
+$$;
+
+-- ------------------------------------------------------------
+-- KPIs del dashboard ejecutivo
+-- ------------------------------------------------------------
+create or replace function public.kpis_dashboard(p_desde timestamp, p_hasta timestamp, p_dias_epp integer default 30)
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'incidentes', (
+            select jsonb_build_object(
+                'total',    count(*),
+                'criticos', count(*) filter (where nivel_riesgo::numeric >= 15)
+            )
+            from public.incidentes
+            where fecha >= p_desde and fecha <= p_hasta
+        ),
+        'capacitaciones', (
+            select jsonb_build_object(
+                'total',         count(*),
+                'participantes', coalesce(sum(participantes), 0)
+            )
+            from public.capacitaciones
+            where fecha >= p_desde and fecha <= p_hasta
+        ),
+        'inspecciones', (
+            select jsonb_build_object(
+                'total',      count(*),
+                'pendientes', count(*) filter (where estado = 'Pendiente'),
+                'resueltas',  count(*) filter (where estado = 'Resuelto')
+            )
+            from public.inspecciones
+            where fecha >= p_desde and fecha <= p_hasta
+        ),
+        'epp', (
+            select jsonb_build_object(
+                'total',      count(*),
+                'por_vencer', count(*) filter (
+                    where fecha_vencimiento >= current_date
+                      and fecha_vencimiento <= current_date + p_dias_epp
+                )
+            )
+            from public.epp
+        )
+    );
+$$;
+
+grant execute on function public.kpis_incidentes(timestamp, timestamp) to anon, authenticated;
+grant execute on function public.kpis_dashboard(timestamp, timestamp, integer) to anon, authenticated;
@@ -0,0 +1,73 @@
+-- supabase/migrations/20261017000200_asistencia_bulk.sql
+-- Registro masivo de asistencia a capacitaciones.
+-- Consumido por utils/asistencias.py: la RPC registra todos los asistentes y
+-- actualiza la capacitación en una sola transacción; si no existe, la app
+-- hace upsert por lotes sobre el índice único (capacitacion_id, trabajador_id).
+
+-- ------------------------------------------------------------
+-- Un asistente por capacitación (necesario para el upsert idempotente)
+-- ------------------------------------------------------------
+delete from public.asistentes_capacitacion a
+using public.asistentes_capacitacion b
+where a.capacitacion_id = b.capacitacion_id
+  and a.trabajador_id = b.trabajador_id
+  and a.id > b.id;
+
+create unique index if not exists asistentes_capacitacion_cap_trab_uidx
+    on public.asistentes_capacitacion (capacitacion_id, trabajador_id);
+
+-- ------------------------------------------------------------
+-- Asistentes + actualización de la capacitación, todo o nada
+-- p_asistentes:   [{"trabajador_id": "...", "asistio": true, "calificacion": 4}, ...]
+-- p_actualizacion: columnas de capacitaciones a actualizar (estado,
+--                  calificacion_promedio, evidencia, participantes_externos)
+-- Devuelve el total de participantes (internos registrados + externos).
+-- ------------------------------------------------------------
+create or replace function public.registrar_asistencia(
+    p_capacitacion_id integer,
+    p_asistentes jsonb,
+    p_actualizacion jsonb default '{}'::jsonb
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_internos integer;
+    v_externos integer;
+    v_total integer;
+begin
+    insert into public.asistentes_capacitacion (capacitacion_id, trabajador_id, asistio, calificacion)
+    select p_capacitacion_id,
+           (a->>'trabajador_id')::uuid,
+           coalesce((a->>'asistio')::boolean, true),
+           (a->>'calificacion')::integer
+    from jsonb_array_elements(p_asistentes) a
+    on conflict (capacitacion_id, trabajador_id)
+    do update set asistio = excluded.asistio,
+                  calificacion = excluded.calificacion;
+
+    select count(*) into v_internos
+    from public.asistentes_capacitacion
+    where capacitacion_id = p_capacitacion_id;
+
+    -- Solo líneas con texto, igual que el respaldo en utils/asistencias.py
+    select count(*) into v_externos
+    from regexp_split_to_table(coalesce(p_actualizacion->>'participantes_externos', ''), E'\n') linea
+    where linea ~ '\S';
+    v_total := v_internos + v_externos;
+
+    update public.capacitaciones c
+    set estado = coalesce(p_actualizacion->>'estado', c.estado),
+        participantes = v_total,
+        calificacion_promedio = coalesce((p_actualizacion->>'calificacion_promedio')::numeric,
+                                         c.calificacion_promedio),
+        evidencia = coalesce(p_actualizacion->>'evidencia', c.evidencia),
+        participantes_externos = coalesce(p_actualizacion->>'participantes_externos',
+                                          c.participantes_externos)
+    where c.id = p_capacitacion_id;
+
+    return v_total;
+end;
+$$;
+
+grant execute on function public.registrar_asistencia(integer, jsonb, jsonb) to authenticated, anon;
@@ -0,0 +1,72 @@
+-- supabase/migrations/20261017000300_documentos_busqueda.sql
+-- Búsqueda de texto completo en documentos_sst.
+-- Consumida por utils/busqueda.py vía supabase.rpc('buscar_documentos', ...);
+-- si no existe, la app usa un índice invertido en memoria.
+
+create extension if not exists unaccent;
+
+-- ------------------------------------------------------------
+-- Configuración en español que ignora tildes ("inducción" = "induccion")
+-- ------------------------------------------------------------
+do $$
+begin
+    if not exists (select 1 from pg_ts_config where cfgname = 'es_sin_acentos') then
+        create text search configuration public.es_sin_acentos (copy = pg_catalog.spanish);
+        alter text search configuration public.es_sin_acentos
+            alter mapping for hword, hword_part, word with unaccent, spanish_stem;
+    end if;
+end
+$$;
+
+-- ------------------------------------------------------------
+-- Vector de búsqueda: título y código pesan más que las palabras clave
+-- ------------------------------------------------------------
+alter table public.documentos_sst
+    add column if not exists busqueda tsvector
+    generated always as (
+        setweight(to_tsvector('public.es_sin_acentos'::regconfig, coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('public.es_sin_acentos'::regconfig, coalesce(codigo, '')), 'A') ||
+        setweight(to_tsvector('public.es_sin_acentos'::regconfig, coalesce(keywords, '')), 'B')
+    ) stored;
+
+create index if not exists documentos_sst_busqueda_idx
+    on public.documentos_sst using gin (busqueda);
+
+-- ------------------------------------------------------------
+-- Resultados ordenados por relevancia y paginados.
+-- `total` es el número de coincidencias (igual en todas las filas).
+-- ------------------------------------------------------------
+create or replace function public.buscar_documentos(
+    p_termino text,
+    p_limite integer default 20,
+    p_offset integer default 0
+)
+returns table (
+    id bigint,
+    titulo text,
+    codigo text,
+    tipo text,
+    version text,
+    estado text,
+    archivo_url text,
+    rank real,
+    total bigint
+)
+language sql
+stable
+as $$
+    with q as (
+        select websearch_to_tsquery('public.es_sin_acentos'::regconfig, p_termino) as consulta
+    )
+    select d.id::bigint, d.titulo::text, d.codigo::text, d.tipo::text, d.version::text,
+           d.estado::text, d.archivo_url::text,
+           ts_rank_cd(d.busqueda, q.consulta) as rank,
+           count(*) over () as total
+    from public.documentos_sst d, q
+    where d.busqueda @@ q.consulta
+    order by rank desc, d.id desc
+    limit p_limite
+    offset p_offset;
+$$;
+
+grant execute on function public.buscar_documentos(text, integer, integer) to anon, authenticated;
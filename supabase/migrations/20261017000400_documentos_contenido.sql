@@ -0,0 +1,78 @@
+-- supabase/migrations/20261017000400_documentos_contenido.sql
+-- Texto extraído de los PDF/DOCX subidos (utils/extraccion_texto.py) e
+-- incorporado a la búsqueda de texto completo con fragmentos resaltados.
+
+alter table public.documentos_sst
+    add column if not exists contenido_texto text,
+    add column if not exists texto_extraido_en timestamptz;
+
+-- ------------------------------------------------------------
+-- El vector de búsqueda incluye el contenido con el menor peso
+-- ------------------------------------------------------------
+drop index if exists public.documentos_sst_busqueda_idx;
+alter table public.documentos_sst drop column if exists busqueda;
+
+alter table public.documentos_sst
+    add column busqueda tsvector
+    generated always as (
+        setweight(to_tsvector('public.es_sin_acentos'::regconfig, coalesce(titulo, '')), 'A') ||
+        setweight(to_tsvector('public.es_sin_acentos'::regconfig, coalesce(codigo, '')), 'A') ||
+        setweight(to_tsvector('public.es_sin_acentos'::regconfig, coalesce(keywords, '')), 'B') ||
+        setweight(to_tsvector('public.es_sin_acentos'::regconfig, coalesce(contenido_texto, '')), 'C')
+    ) stored;
+
+create index documentos_sst_busqueda_idx
+    on public.documentos_sst using gin (busqueda);
+
+-- ------------------------------------------------------------
+-- Igual que antes, más `fragmento`: extracto del contenido con los términos
+-- entre << y >> (la app los convierte en <mark>). ts_headline solo se
+-- calcula para las filas de la página.
+-- ------------------------------------------------------------
+drop function if exists public.buscar_documentos(text, integer, integer);
+
+create or replace function public.buscar_documentos(
+    p_termino text,
+    p_limite integer default 20,
+    p_offset integer default 0
+)
+returns table (
+    id bigint,
+    titulo text,
+    codigo text,
+    tipo text,
+    version text,
+    estado text,
+    archivo_url text,
+    rank real,
+    total bigint,
+    fragmento text
+)
+language sql
+stable
+as $$
+    with q as (
+        select websearch_to_tsquery('public.es_sin_acentos'::regconfig, p_termino) as consulta
+    ),
+    pagina as (
+        select d.id, d.titulo, d.codigo, d.tipo, d.version, d.estado, d.archivo_url,
+               d.contenido_texto,
+               ts_rank_cd(d.busqueda, q.consulta) as rank,
+               count(*) over () as total
+        from public.documentos_sst d, q
+        where d.busqueda @@ q.consulta
+        order by rank desc, d.id desc
+        limit p_limite
+        offset p_offset
+    )
+    select p.id::bigint, p.titulo::text, p.codigo::text, p.tipo::text, p.version::text,
+           p.estado::text, p.archivo_url::text, p.rank, p.total,
+           case when p.contenido_texto is null then null
+                else ts_headline('public.es_sin_acentos'::regconfig, p.contenido_texto, q.consulta,
+                                 'StartSel=<<, StopSel=>>, MaxWords=35, MinWords=15, MaxFragments=2')
+           end as fragmento
+    from pagina p, q
+    order by p.rank desc, p.id desc;
+$$;
+
+grant execute on function public.buscar_documentos(text, integer, integer) to anon, authenticated;
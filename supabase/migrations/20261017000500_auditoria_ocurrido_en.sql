@@ -0,0 +1,10 @@
+-- supabase/migrations/20261017000500_auditoria_ocurrido_en.sql
+-- La auditoría de accesos se inserta por lotes y, si Supabase no responde,
+-- se reenvía más tarde desde el spool (app/auditoria.py): el instante real
+-- del evento viaja en `ocurrido_en`.
+
+alter table public.auditoria_accesos
+    add column if not exists ocurrido_en timestamptz not null default now();
+
+create index if not exists auditoria_accesos_usuario_ocurrido_idx
+    on public.auditoria_accesos (usuario_id, ocurrido_en desc);
@@ -0,0 +1,24 @@
+-- supabase/migrations/20261017000600_sesiones_revocadas.sql
+-- Lista de revocación de tokens de sesión (app/sesiones.py). Solo hace falta
+-- conservar cada jti hasta que el token expira.
+
+create table if not exists public.sesiones_revocadas (
+    jti text primary key,
+    usuario_id text,
+    expira_en timestamptz not null,
+    revocado_en timestamptz not null default now()
+);
+
+create index if not exists sesiones_revocadas_expira_idx
+    on public.sesiones_revocadas (expira_en);
+
+-- Limpieza de revocaciones vencidas (p.ej. desde pg_cron)
+create or replace function public.limpiar_sesiones_revocadas()
+returns integer
+language sql
+as $$
+    with borrados as (
+        delete from public.sesiones_revocadas where expira_en < now() returning 1
+    )
+    select count(*)::integer from borrados;
+$$;
@@ -0,0 +1,23 @@
+-- supabase/migrations/20261017000700_intentos_login.sql
+-- Ventanas del limitador de login compartidas entre réplicas
+-- (app/limitador.py con LIMITADOR_ALMACEN=postgres).
+
+create table if not exists public.intentos_login (
+    id bigint generated always as identity primary key,
+    clave text not null,
+    ocurrido_en timestamptz not null default now()
+);
+
+create index if not exists intentos_login_clave_idx
+    on public.intentos_login (clave, ocurrido_en);
+
+-- Las ventanas más largas son de minutos: basta con conservar un día
+create or replace function public.limpiar_intentos_login()
+returns integer
+language sql
+as $$
+    with borrados as (
+        delete from public.intentos_login where ocurrido_en < now() - interval '1 day' returning 1
+    )
+    select count(*)::integer from borrados;
+$$;
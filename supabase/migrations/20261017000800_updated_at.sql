@@ -0,0 +1,63 @@
+-- supabase/migrations/20261017000800_updated_at.sql
+-- Marcas de agua para la sincronización incremental (utils/sincronizacion.py):
+-- `updated_at` mantenido por trigger en cada tabla sincronizada y lápidas
+-- de las filas borradas en `registros_eliminados`.
+
+create or replace function public.tocar_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+create table if not exists public.registros_eliminados (
+    id bigint generated always as identity primary key,
+    tabla text not null,
+    registro_id text not null,
+    eliminado_en timestamptz not null default now()
+);
+
+create index if not exists registros_eliminados_tabla_idx
+    on public.registros_eliminados (tabla, eliminado_en);
+
+create or replace function public.registrar_eliminado()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into public.registros_eliminados (tabla, registro_id)
+    values (tg_table_name, old.id::text);
+    return old;
+end;
+$$;
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['incidentes', 'capacitaciones', 'inspecciones', 'epp'] loop
+        execute format('alter table public.%I add column if not exists updated_at timestamptz not null default now()', t);
+        execute format('create index if not exists %I on public.%I (updated_at, id)', t || '_updated_at_idx', t);
+        execute format('drop trigger if exists %I on public.%I', t || '_tocar_updated_at', t);
+        execute format('create trigger %I before update on public.%I for each row execute function public.tocar_updated_at()',
+                       t || '_tocar_updated_at', t);
+        execute format('drop trigger if exists %I on public.%I', t || '_registrar_eliminado', t);
+        execute format('create trigger %I after delete on public.%I for each row execute function public.registrar_eliminado()',
+                       t || '_registrar_eliminado', t);
+    end loop;
+end
+$$;
+
+-- Las copias se reconcilian al menos cada 15 minutos: basta con conservar un día
+create or replace function public.limpiar_registros_eliminados()
+returns integer
+language sql
+as $$
+    with borrados as (
+        delete from public.registros_eliminados where eliminado_en < now() - interval '1 day' returning 1
+    )
+    select count(*)::integer from borrados;
+$$;
@@ -0,0 +1,24 @@
+-- supabase/migrations/20261017000900_tiempo_real.sql
+-- Publica los cambios que escucha utils/tiempo_real.py por Supabase Realtime.
+
+do $$
+declare
+    t text;
+begin
+    if not exists (select 1 from pg_publication where pubname = 'supabase_realtime') then
+        create publication supabase_realtime;
+    end if;
+    foreach t in array array['incidentes', 'inspecciones', 'notificaciones'] loop
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = t
+        ) then
+            execute format('alter publication supabase_realtime add table public.%I', t);
+        end if;
+    end loop;
+end
+$$;
+
+-- Los DELETE envían la fila completa en old_record
+alter table public.incidentes replica identity full;
+alter table public.inspecciones replica identity full;
@@ -0,0 +1,25 @@
+# tests/test_paginas.py
+"""
+Tiempo de importación en frío de cada página del menú.
+
+El límite se ajusta con `PAGINAS_LIMITE_MS` (por defecto 1500 ms, el mismo
+que sugiere `python -m app.paginas --limite-ms`).
+"""
+import os
+
+import pytest
+
+from app.paginas import PAGINAS, perfil_importacion
+
+LIMITE_MS = float(os.getenv("PAGINAS_LIMITE_MS", "1500"))
+
+
+@pytest.mark.parametrize("nombre", list(PAGINAS))
+def test_importacion_en_frio_dentro_del_limite(nombre):
+    modulo = PAGINAS[nombre][0]
+    total, por_paquete = perfil_importacion(modulo)
+    principales = sorted(por_paquete.items(), key=lambda p: p[1], reverse=True)[:5]
+    assert total <= LIMITE_MS, (
+        f"{modulo} tarda {total:.0f} ms en importarse (límite {LIMITE_MS:.0f} ms); "
+        "más lentos: " + ", ".join(f"{p} {ms:.0f} ms" for p, ms in principales)
+    )
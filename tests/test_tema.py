@@ -0,0 +1,63 @@
+# tests/test_tema.py
+"""
+Bytes de estilos y tarjetas que una página envía por el websocket en cada render.
+
+Las páginas se ejecutan con `streamlit.testing.v1.AppTest` y se mide el
+markdown que emiten, con y sin `server.enableStaticServing`.
+"""
+import pytest
+from streamlit import config
+from streamlit.testing.v1 import AppTest
+
+from utils import tema
+
+# Presupuesto por render de una página con el tema y 4 tarjetas KPI (bytes)
+LIMITE_STATIC_SERVING = 1200
+LIMITE_INLINE = 4000
+
+
+def _pagina_kpis():
+    import streamlit as st
+    from utils.tema import aplicar_tema, tarjeta_kpi
+
+    aplicar_tema()
+    for columna, (titulo, valor, detalle, icono, tono) in zip(st.columns(4), [
+        ("INCIDENTES TOTALES", 128, "🔴 4 críticos", "🚨", "peligro"),
+        ("INSPECCIONES", 42, "✅ 90% conformes", "📋", "exito"),
+        ("EPP POR VENCER", 7, "⏰ próximos 30 días", "🦺", "aviso"),
+        ("CAPACITACIONES", 15, "👥 320 participantes", "🎓", "info"),
+    ]):
+        with columna:
+            st.markdown(tarjeta_kpi(titulo, valor, detalle, icono, tono), unsafe_allow_html=True)
+
+
+def _bytes_emitidos(static_serving):
+    config.set_option("server.enableStaticServing", static_serving)
+    try:
+        at = AppTest.from_function(_pagina_kpis).run()
+    finally:
+        config.set_option("server.enableStaticServing", False)
+    assert not at.exception
+    marcado = [md.value for md in at.markdown]
+    return marcado, sum(len(m.encode("utf-8")) for m in marcado)
+
+
+@pytest.fixture(autouse=True)
+def _estatico_temporal(tmp_path, monkeypatch):
+    monkeypatch.setattr(tema, "DIRECTORIO_ESTATICO", tmp_path)
+
+
+def test_static_serving_solo_envia_el_enlace():
+    marcado, total = _bytes_emitidos(static_serving=True)
+    assert marcado[0].startswith('<link rel="stylesheet"')
+    assert not any("<style>" in m for m in marcado)
+    assert total <= LIMITE_STATIC_SERVING, f"{total} B por render (límite {LIMITE_STATIC_SERVING} B)"
+
+
+def test_inline_envia_el_css_minificado():
+    marcado, total = _bytes_emitidos(static_serving=False)
+    fuentes = sum(len((tema.DIRECTORIO_ESTILOS / hoja).read_bytes()) for hoja in tema.HOJAS_TEMA)
+    estilos = [m for m in marcado if m.startswith("<style>")]
+    assert len(estilos) == 1
+    assert len(estilos[0].encode("utf-8")) < fuentes
+    assert total <= LIMITE_INLINE, f"{total} B por render (límite {LIMITE_INLINE} B)"
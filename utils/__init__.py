@@ -1,7 +1,24 @@
 """Utilities package exports."""
 from .validations import *
-from .report_excel import *
-from .report_pdf import *
 #from .helpers import *
 
+# Los exportadores cargan openpyxl/ReportLab: se importan al primer uso
+# (`from utils import exportar_pdf`) y no con cualquier `utils.*`.
+_EXPORTACIONES_DIFERIDAS = {
+    'generar_reporte_mensual_excel': 'report_excel',
+    'exportar_excel': 'report_excel',
+    'exportar_pdf': 'report_pdf',
+    'generar_reporte_mensual_pdf': 'report_pdf',
+}
+
+
+def __getattr__(nombre):
+    modulo = _EXPORTACIONES_DIFERIDAS.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    from importlib import import_module
+    valor = getattr(import_module(f".{modulo}", __name__), nombre)
+    globals()[nombre] = valor
+    return valor
+
 # package exports are provided by individual modules; no explicit __all__ required here
@@ -0,0 +1,122 @@
+# utils/asistencias.py
+"""
+Registro masivo de asistencia a capacitaciones.
+
+`registrar_asistencia` guarda todos los asistentes y actualiza la fila de
+`capacitaciones` en una sola operación: primero intenta la RPC transaccional
+`registrar_asistencia` (supabase/migrations) y, si no está instalada, hace
+upsert por lotes sobre (capacitacion_id, trabajador_id) y luego el update.
+Repetir el registro con las mismas personas no duplica filas.
+"""
+import io
+import logging
+
+import pandas as pd
+
+from supabase_client import supabase
+from utils.data_access import contar, invalidar
+
+logger = logging.getLogger(__name__)
+
+# Filas por request de upsert en el modo de respaldo
+TAMANO_LOTE = 500
+
+# Columnas de la nómina (CSV/Excel) que identifican al trabajador
+COLUMNAS_IDENTIFICACION = ('dni', 'email')
+
+
+def _rpc_no_instalada(error):
+    """PostgREST responde PGRST202 cuando la función no existe."""
+    return 'PGRST202' in str(error) or 'Could not find the function' in str(error)
+
+
+def registrar_asistencia(capacitacion_id, trabajador_ids, calificacion=None,
+                         actualizacion=None):
+    """Registra los asistentes internos y actualiza la capacitación.
+
+    `actualizacion` son las columnas de `capacitaciones` a modificar
+    (estado, calificacion_promedio, evidencia, participantes_externos).
+    Devuelve el total de participantes (internos registrados + externos).
+    """
+    asistentes = [
+        {
+            "capacitacion_id": int(capacitacion_id),
+            "trabajador_id": str(trabajador_id),
+            "asistio": True,
+            "calificacion": int(calificacion) if calificacion is not None else None
+        }
+        for trabajador_id in dict.fromkeys(trabajador_ids)
+    ]
+    actualizacion = dict(actualizacion or {})
+
+    try:
+        total = supabase.rpc('registrar_asistencia', {
+            'p_capacitacion_id': int(capacitacion_id),
+            'p_asistentes': asistentes,
+            'p_actualizacion': actualizacion
+        }).execute().data
+    except Exception as e:
+        if not _rpc_no_instalada(e):
+            raise
+        logger.warning("RPC registrar_asistencia no disponible, usando upsert por lotes: %s", e)
+        total = _registrar_por_lotes(capacitacion_id, asistentes, actualizacion)
+
+    invalidar("asistentes_capacitacion", "capacitaciones")
+    return int(total or 0)
+
+
+def _registrar_por_lotes(capacitacion_id, asistentes, actualizacion):
+    for inicio in range(0, len(asistentes), TAMANO_LOTE):
+        supabase.table("asistentes_capacitacion").upsert(
+            asistentes[inicio:inicio + TAMANO_LOTE],
+            on_conflict="capacitacion_id,trabajador_id"
+        ).execute()
+
+    internos = contar("asistentes_capacitacion",
+                      filtros=[("eq", "capacitacion_id", int(capacitacion_id))], ttl=0)
+    externos = [x for x in (actualizacion.get("participantes_externos") or "").split("\n") if x.strip()]
+
+    actualizacion["participantes"] = int(internos + len(externos))
+    supabase.table("capacitaciones").update(actualizacion).eq("id", capacitacion_id).execute()
+    return actualizacion["participantes"]
+
+
+def leer_nomina(archivo):
+    """DataFrame de una nómina subida (CSV o Excel) con columnas en minúsculas."""
+    contenido = archivo.getvalue()
+    if archivo.name.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(io.BytesIO(contenido), dtype=str)
+    else:
+        df = pd.read_csv(io.BytesIO(contenido), dtype=str, sep=None, engine='python',
+                         encoding_errors='replace')
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    return df
+
+
+def emparejar_nomina(df, usuarios):
+    """Cruza la nómina con `usuarios` por DNI o email.
+
+    Devuelve `(ids, no_encontrados)`: ids de usuarios encontrados y las filas
+    de la nómina sin coincidencia (como lista de dicts).
+    """
+    columnas = [c for c in COLUMNAS_IDENTIFICACION if c in df.columns]
+    if not columnas:
+        raise ValueError("La nómina debe tener una columna 'dni' o 'email'")
+
+    indices = {
+        c: {str(u.get(c) or '').strip().lower(): u['id'] for u in usuarios if u.get(c)}
+        for c in columnas
+    }
+
+    ids, no_encontrados = [], []
+    for fila in df[columnas].fillna('').to_dict('records'):
+        encontrado = next(
+            (indices[c][str(fila[c]).strip().lower()] for c in columnas
+             if str(fila[c]).strip().lower() in indices[c]),
+            None
+        )
+        if encontrado:
+            ids.append(encontrado)
+        else:
+            no_encontrados.append(fila)
+    return list(dict.fromkeys(ids)), no_encontrados
@@ -0,0 +1,238 @@
+# utils/busqueda.py
+"""
+Búsqueda de documentos SST.
+
+Primero se usa la RPC `buscar_documentos` (tsvector + índice GIN en español,
+sin tildes; ver supabase/migrations). Si no está disponible se usa un índice
+invertido en memoria, compartido por todas las sesiones: se construye una
+vez, se actualiza con `indexar_documento` al subir un documento y se
+reconstruye cada `REFRESCO_INDICE` segundos para recoger cambios de otros
+procesos. Ambos caminos devuelven resultados ordenados por relevancia y
+paginados, con un `fragmento` del contenido extraído (utils/extraccion_texto)
+donde los términos encontrados van entre << y >> (ver `resaltar`).
+"""
+import bisect
+import html
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from utils.data_access import consultar, consultar_pagina, intentar_rpc
+
+logger = logging.getLogger(__name__)
+
+# Columnas devueltas en los resultados
+COLUMNAS_RESULTADO = 'id,titulo,codigo,tipo,version,estado,archivo_url'
+
+# Peso de cada campo en la relevancia del índice local
+PESOS_CAMPOS = {'titulo': 3.0, 'codigo': 3.0, 'keywords': 2.0, 'contenido_texto': 1.0}
+
+REFRESCO_INDICE = 600
+# Documentos por página al construir el índice (contenido_texto puede ser largo)
+TAMANO_PAGINA = 100
+
+_PALABRAS_VACIAS = {
+    'de', 'del', 'la', 'las', 'el', 'los', 'en', 'y', 'o', 'a', 'al', 'por',
+    'para', 'con', 'sin', 'un', 'una', 'unos', 'unas', 'se', 'su', 'sus', 'que',
+}
+
+_lock = threading.RLock()
+_postings = defaultdict(dict)   # termino -> {doc_id: peso}
+_terminos_doc = {}              # doc_id -> set(terminos), para reindexar
+_documentos = {}                # doc_id -> fila con COLUMNAS_RESULTADO
+_vocabulario = []               # términos ordenados (búsqueda por prefijo)
+_vocabulario_sucio = False
+_construido_en = None
+
+
+def tokenizar(texto):
+    """Minúsculas, sin tildes, sin palabras vacías."""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in re.findall(r'\w+', texto) if len(t) > 1 and t not in _PALABRAS_VACIAS]
+
+
+def _quitar(doc_id):
+    for termino in _terminos_doc.pop(doc_id, ()):
+        docs = _postings.get(termino)
+        if docs is not None:
+            docs.pop(doc_id, None)
+            if not docs:
+                del _postings[termino]
+
+
+def _agregar(doc):
+    """Indexa `doc` (dict con los campos de PESOS_CAMPOS)."""
+    global _vocabulario_sucio
+    doc_id = doc['id']
+    _quitar(doc_id)
+    pesos = defaultdict(float)
+    for campo, peso in PESOS_CAMPOS.items():
+        for termino in tokenizar(doc.get(campo)):
+            pesos[termino] += peso
+    for termino, peso in pesos.items():
+        _postings[termino][doc_id] = peso
+    _terminos_doc[doc_id] = set(pesos)
+    _documentos[doc_id] = {c: doc.get(c) for c in COLUMNAS_RESULTADO.split(',')}
+    _vocabulario_sucio = True
+
+
+def _columnas_indice():
+    return ','.join(dict.fromkeys(COLUMNAS_RESULTADO.split(',') + list(PESOS_CAMPOS)))
+
+
+def _pagina_indice(columnas, cursor):
+    return consultar_pagina('documentos_sst', columnas, claves=('id',), cursor=cursor,
+                            tamano=TAMANO_PAGINA, desc=False, ttl=0)
+
+
+def _asegurar_indice():
+    """Reconstruye el índice por páginas keyset (PostgREST corta en max-rows)."""
+    global _construido_en
+    with _lock:
+        if _construido_en is not None and time.monotonic() - _construido_en < REFRESCO_INDICE:
+            return
+        columnas = _columnas_indice()
+        try:
+            pagina, cursor = _pagina_indice(columnas, None)
+        except Exception as e:
+            # Sin la migración de contenido_texto se indexan solo los metadatos
+            logger.warning("Índice local sin contenido de documentos: %s", e)
+            columnas = columnas.replace(',contenido_texto', '')
+            pagina, cursor = _pagina_indice(columnas, None)
+        _postings.clear()
+        _terminos_doc.clear()
+        _documentos.clear()
+        _construido_en = None
+        while True:
+            for doc in pagina:
+                _agregar(doc)
+            if cursor is None:
+                break
+            pagina, cursor = _pagina_indice(columnas, cursor)
+        _construido_en = time.monotonic()
+
+
+def indexar_documento(doc):
+    """Agrega o actualiza un documento en el índice local (tras subirlo)."""
+    with _lock:
+        if _construido_en is not None:
+            _agregar(doc)
+
+
+def _expandir(termino):
+    """Términos del vocabulario que empiezan por `termino`."""
+    global _vocabulario, _vocabulario_sucio
+    if _vocabulario_sucio:
+        _vocabulario = sorted(_postings)
+        _vocabulario_sucio = False
+    inicio = bisect.bisect_left(_vocabulario, termino)
+    fin = bisect.bisect_left(_vocabulario, termino + '\uffff')
+    return _vocabulario[inicio:fin]
+
+
+def _buscar_local(termino, limite, offset):
+    """Todas las palabras deben aparecer (por prefijo); relevancia tipo tf-idf."""
+    _asegurar_indice()
+    consulta = tokenizar(termino)
+    if not consulta:
+        return [], 0
+
+    with _lock:
+        total_docs = max(len(_documentos), 1)
+        puntajes = None
+        for palabra in consulta:
+            coincidencias = defaultdict(float)
+            for t in _expandir(palabra):
+                docs = _postings[t]
+                idf = math.log(1 + total_docs / len(docs))
+                for doc_id, peso in docs.items():
+                    coincidencias[doc_id] = max(coincidencias[doc_id], peso * idf)
+            if puntajes is None:
+                puntajes = coincidencias
+            else:
+                puntajes = {d: p + coincidencias[d] for d, p in puntajes.items() if d in coincidencias}
+            if not puntajes:
+                return [], 0
+
+        orden = sorted(puntajes.items(), key=lambda x: (-x[1], -_clave_id(x[0])))
+        pagina = [dict(_documentos[d], rank=round(p, 3)) for d, p in orden[offset:offset + limite]]
+
+    # El contenido completo no se guarda en memoria: se pide solo para la página
+    contenidos = {}
+    if pagina:
+        try:
+            contenidos = {
+                f['id']: f.get('contenido_texto')
+                for f in consultar('documentos_sst', 'id,contenido_texto',
+                                   filtros=[('in_', 'id', [d['id'] for d in pagina])])
+            }
+        except Exception:
+            pass
+    for doc in pagina:
+        doc['fragmento'] = fragmento(contenidos.get(doc['id']), consulta)
+    return pagina, len(orden)
+
+
+def fragmento(texto, terminos, ancho=220):
+    """Extracto de `texto` alrededor del primer término, con << >> en cada coincidencia."""
+    if not texto:
+        return None
+    # Texto normalizado (sin tildes) con la posición original de cada carácter
+    normalizado, posiciones = [], []
+    for i, c in enumerate(texto):
+        for n in unicodedata.normalize('NFKD', c.lower()):
+            if not unicodedata.combining(n):
+                normalizado.append(n)
+                posiciones.append(i)
+    normalizado = ''.join(normalizado)
+
+    patron = re.compile(r'\b(' + '|'.join(re.escape(t) for t in terminos) + r')\w*')
+    coincidencias = [(posiciones[m.start()], posiciones[m.end() - 1] + 1)
+                     for m in patron.finditer(normalizado)]
+    if not coincidencias:
+        return None
+
+    inicio = max(0, coincidencias[0][0] - ancho // 3)
+    fin = min(len(texto), inicio + ancho)
+    partes, cursor = [], inicio
+    for a, b in coincidencias:
+        if a < inicio or b > fin:
+            continue
+        partes.extend([texto[cursor:a], '<<', texto[a:b], '>>'])
+        cursor = b
+    partes.append(texto[cursor:fin])
+    extracto = ' '.join(''.join(partes).split())
+    return ('… ' if inicio > 0 else '') + extracto + (' …' if fin < len(texto) else '')
+
+
+def resaltar(fragmento_texto):
+    """HTML seguro del fragmento, con las coincidencias en <mark>."""
+    seguro = html.escape(fragmento_texto or '')
+    return seguro.replace('&lt;&lt;', '<mark>').replace('&gt;&gt;', '</mark>')
+
+
+def _clave_id(doc_id):
+    return doc_id if isinstance(doc_id, (int, float)) else 0
+
+
+def buscar_documentos(termino, pagina=1, tamano=20):
+    """Devuelve `(resultados, total, motor)` para la página pedida (1-based).
+
+    `motor` es 'postgres' o 'local' según el camino usado.
+    """
+    offset = (pagina - 1) * tamano
+    filas = intentar_rpc(
+        'buscar_documentos',
+        {'p_termino': termino, 'p_limite': tamano, 'p_offset': offset},
+        ('documentos_sst',)
+    )
+    if filas is not None:
+        total = filas[0]['total'] if filas else 0
+        return filas, total, 'postgres'
+    resultados, total = _buscar_local(termino, tamano, offset)
+    return resultados, total, 'local'
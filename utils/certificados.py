@@ -0,0 +1,145 @@
+# utils/certificados.py
+"""
+Motor de certificados de capacitación.
+
+- La hoja de estilos se construye una sola vez por proceso.
+- Los PDFs se renderizan en un `ProcessPoolExecutor` de larga vida (arranque
+  `spawn`, seguro con los hilos de Streamlit) y escalan con los núcleos.
+- Los PDFs se escriben en un único ZIP a medida que se completan.
+
+Este módulo no importa Streamlit: los procesos hijos solo cargan ReportLab.
+"""
+import atexit
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+# Por debajo de esta cantidad no compensa repartir el trabajo entre procesos
+MIN_CERTIFICADOS_EN_PARALELO = 20
+
+_estilos = None
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hoja_estilos():
+    """Estilos precalculados, compartidos por todos los certificados del proceso."""
+    global _estilos
+    if _estilos is None:
+        estilos = getSampleStyleSheet()
+        estilos.add(ParagraphStyle(
+            name="Center", alignment=TA_CENTER, fontSize=16, leading=20
+        ))
+        _estilos = estilos
+    return _estilos
+
+
+def nombre_archivo(datos):
+    """Nombre del PDF dentro del ZIP: Cert_<Nombre>_<DNI>.pdf"""
+    base = re.sub(r'[^\w.-]+', '_', datos['nombre'].strip()).strip('_') or 'trabajador'
+    if datos.get('dni'):
+        base = f"{base}_{datos['dni']}"
+    return f"Cert_{base}.pdf"
+
+
+def renderizar_certificado(datos):
+    """PDF (bytes) de un certificado.
+
+    `datos`: nombre, dni, tema, fecha, duracion_horas, firmante_nombre,
+    firmante_cargo, empresa.
+    """
+    estilos = _hoja_estilos()
+    d = {k: escape(str(v)) if v is not None else '' for k, v in datos.items()}
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    doc.build([
+        Spacer(1, 2 * inch),
+        Paragraph("🎓 Certificado de Capacitación", estilos["Title"]),
+        Spacer(1, 0.5 * inch),
+        Paragraph(
+            f"Se certifica que <b>{d['nombre']}</b> ha completado la capacitación "
+            f"<b>{d['tema']}</b> realizada el <b>{d['fecha']}</b>.",
+            estilos["BodyText"]
+        ),
+        Spacer(1, 0.5 * inch),
+        Paragraph(f"Duración: <b>{d['duracion_horas']} horas</b>", estilos["BodyText"]),
+        Spacer(1, 1 * inch),
+        Paragraph(
+            f"_____________________________<br/>{d['firmante_nombre']}<br/>"
+            f"{d['firmante_cargo']}<br/>{d['empresa']}",
+            estilos["Center"]
+        )
+    ])
+    return buffer.getvalue()
+
+
+def _pool_procesos():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def generar_zip(certificados, progreso=None):
+    """ZIP (bytes) con un PDF por elemento de `certificados`.
+
+    `progreso(completados, total)` se llama tras cada PDF escrito.
+    """
+    certificados = list(certificados)
+    total = len(certificados)
+    usar_procesos = total >= MIN_CERTIFICADOS_EN_PARALELO and (os.cpu_count() or 1) > 1
+
+    if usar_procesos:
+        chunksize = max(1, total // ((os.cpu_count() or 1) * 4))
+        pdfs = _pool_procesos().map(renderizar_certificado, certificados, chunksize=chunksize)
+    else:
+        pdfs = map(renderizar_certificado, certificados)
+
+    salida = io.BytesIO()
+    nombres = set()
+    # Los PDFs ya vienen comprimidos: ZIP_STORED evita recomprimirlos
+    with zipfile.ZipFile(salida, "w", zipfile.ZIP_STORED) as zf:
+        for idx, (datos, pdf) in enumerate(zip(certificados, pdfs), start=1):
+            nombre = nombre_archivo(datos)
+            if nombre in nombres:
+                nombre = nombre.replace(".pdf", f"_{idx}.pdf")
+            nombres.add(nombre)
+            zf.writestr(nombre, pdf)
+            if progreso:
+                progreso(idx, total)
+    return salida.getvalue()
+
+
+if __name__ == "__main__":
+    # Medición rápida: python -m utils.certificados [cantidad]
+    import sys
+    import time
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    muestra = [{
+        'nombre': f"Trabajador {i}", 'dni': f"{40000000 + i}", 'tema': "Inducción SST",
+        'fecha': "2026-10-17", 'duracion_horas': 4, 'firmante_nombre': "Jefe SST",
+        'firmante_cargo': "Jefe SST", 'empresa': "MI EMPRESA S.A."
+    } for i in range(cantidad)]
+
+    inicio = time.perf_counter()
+    zip_bytes = generar_zip(muestra)
+    print(f"{cantidad} certificados en {time.perf_counter() - inicio:.2f}s "
+          f"({len(zip_bytes) / 1024:.0f} KB, {os.cpu_count()} núcleos)")
@@ -0,0 +1,292 @@
+# utils/data_access.py
+"""
+Capa central de acceso a datos sobre `supabase_client.supabase`.
+
+Todas las lecturas (SELECT) de las páginas pasan por `consultar`, que mantiene
+una caché de proceso compartida por todas las sesiones de Streamlit:
+- clave: (tabla, columnas, filtros, orden, rango)
+- TTL por tabla (`TTL_POR_TABLA`)
+- tamaño acotado con expulsión LRU (`MAX_ENTRADAS`)
+- invalidación explícita con `invalidar(tabla)` desde los puntos de escritura
+- contadores de aciertos/fallos por tabla (`estadisticas_cache`)
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from supabase_client import supabase
+
+# TTL (segundos) por tabla; las tablas no listadas usan TTL_POR_DEFECTO
+TTL_POR_DEFECTO = 60
+TTL_POR_TABLA = {
+    'incidentes': 30,
+    'inspecciones': 60,
+    'capacitaciones': 120,
+    'asistentes_capacitacion': 120,
+    'epp': 120,
+    'documentos_sst': 300,
+    'checklists_plantillas': 600,
+    'usuarios': 300,
+}
+
+MAX_ENTRADAS = 256
+
+# Tras un fallo, `intentar_rpc` no vuelve a llamar a la función hasta pasado este tiempo (segundos)
+REINTENTO_RPC = 300
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_cache = OrderedDict()   # clave -> (expira_en, datos)
+_stats = {}              # tabla -> {'hits', 'misses', 'invalidaciones'}
+_rpc_no_disponible = {}  # funcion -> instante del último fallo
+
+
+def _normalizar(valor):
+    """Convierte listas/sets/dicts en tuplas para poder usarlos como clave."""
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _normalizar(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(_normalizar(v) for v in valor)
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+
+def _stats_tabla(tabla):
+    return _stats.setdefault(tabla, {'hits': 0, 'misses': 0, 'invalidaciones': 0})
+
+
+def _aplicar_filtros(query, filtros):
+    """Aplica filtros `(operador, columna, valor)` al query builder de PostgREST."""
+    for operador, columna, valor in filtros or []:
+        if operador == 'or_':
+            query = query.or_(valor)
+        else:
+            if hasattr(valor, 'isoformat'):
+                valor = valor.isoformat()
+            query = getattr(query, operador)(columna, valor)
+    return query
+
+
+def _aplicar_orden(query, orden):
+    """`orden` es ('columna', desc) o una lista de esas tuplas."""
+    if not orden:
+        return query
+    if isinstance(orden[0], str):
+        orden = [orden]
+    for columna, desc in orden:
+        query = query.order(columna, desc=desc)
+    return query
+
+
+def _depende_de(origen, tablas):
+    """`origen` es el nombre de la tabla o, para RPC, el conjunto de tablas que lee."""
+    if isinstance(origen, frozenset):
+        return bool(origen & tablas)
+    return origen in tablas
+
+
+def _leer_cache(clave, tabla):
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada is not None:
+            expira_en, datos = entrada
+            if expira_en > time.monotonic():
+                _cache.move_to_end(clave)
+                _stats_tabla(tabla)['hits'] += 1
+                return datos
+            del _cache[clave]
+        _stats_tabla(tabla)['misses'] += 1
+        return None
+
+
+def _guardar_cache(clave, datos, ttl):
+    with _lock:
+        _cache[clave] = (time.monotonic() + ttl, datos)
+        _cache.move_to_end(clave)
+        while len(_cache) > MAX_ENTRADAS:
+            _cache.popitem(last=False)
+
+
+def consultar(tabla, columnas='*', filtros=None, orden=None, rango=None, limite=None, ttl=None):
+    """SELECT cacheado sobre `tabla`. Devuelve la lista de filas (dicts).
+
+    - `filtros`: lista de tuplas `(operador, columna, valor)`, p.ej. `('gte', 'fecha', '2025-01-01')`.
+      Los operadores son los del query builder (`eq`, `neq`, `gte`, `lte`, `in_`, `ilike`...);
+      `('or_', None, 'expresion')` pasa una expresión `or` de PostgREST.
+    - `orden`: `('columna', desc)` o lista de tuplas.
+    - `rango`: `(inicio, fin)` inclusivo, como `.range()` de PostgREST.
+    - `ttl`: sobrescribe el TTL de la tabla; `0` omite la caché.
+    """
+    ttl = TTL_POR_TABLA.get(tabla, TTL_POR_DEFECTO) if ttl is None else ttl
+    clave = (tabla, _normalizar(columnas), _normalizar(filtros or []),
+             _normalizar(orden), _normalizar(rango), limite)
+
+    if ttl > 0:
+        datos = _leer_cache(clave, tabla)
+        if datos is not None:
+            return list(datos)
+
+    query = supabase.table(tabla).select(columnas)
+    query = _aplicar_filtros(query, filtros)
+    query = _aplicar_orden(query, orden)
+    if rango is not None:
+        query = query.range(rango[0], rango[1])
+    if limite is not None:
+        query = query.limit(limite)
+
+    datos = query.execute().data or []
+
+    if ttl > 0:
+        _guardar_cache(clave, datos, ttl)
+    return list(datos)
+
+
+def _literal_postgrest(valor):
+    """Valor entre comillas para usarlo dentro de una expresión `or` de PostgREST."""
+    if hasattr(valor, 'isoformat'):
+        valor = valor.isoformat()
+    return '"' + str(valor).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def consultar_pagina(tabla, columnas='*', filtros=None, claves=('fecha', 'id'),
+                     cursor=None, tamano=25, desc=True, ttl=None):
+    """Paginación keyset sobre `claves` (p.ej. fecha, id).
+
+    `claves` puede ser una sola columna única, p.ej. `('id',)`.
+    `cursor` son los valores de `claves` de la última fila de la página
+    anterior (None para la primera). Devuelve `(filas, siguiente_cursor)`;
+    `siguiente_cursor` es None cuando no hay más páginas.
+    """
+    filtros = list(filtros or [])
+    op = 'lt' if desc else 'gt'
+    if cursor is not None and len(claves) == 1:
+        filtros.append((op, claves[0], cursor[0]))
+    elif cursor is not None:
+        col_orden, col_desempate = claves
+        valor_orden = _literal_postgrest(cursor[0])
+        valor_desempate = _literal_postgrest(cursor[1])
+        filtros.append(('or_', None,
+                        f"{col_orden}.{op}.{valor_orden},"
+                        f"and({col_orden}.eq.{valor_orden},{col_desempate}.{op}.{valor_desempate})"))
+
+    # Se pide una fila extra para saber si existe la página siguiente
+    filas = consultar(tabla, columnas, filtros=filtros,
+                      orden=[(col, desc) for col in claves],
+                      limite=tamano + 1, ttl=ttl)
+
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        siguiente = tuple(filas[-1][col] for col in claves)
+    return filas, siguiente
+
+
+def contar(tabla, filtros=None, ttl=None):
+    """COUNT(*) en el servidor (`count=exact`) sin descargar las filas."""
+    ttl = TTL_POR_TABLA.get(tabla, TTL_POR_DEFECTO) if ttl is None else ttl
+    clave = (tabla, 'count', _normalizar(filtros or []), None, None, None)
+
+    if ttl > 0:
+        total = _leer_cache(clave, tabla)
+        if total is not None:
+            return total
+
+    query = supabase.table(tabla).select('id', count='exact')
+    query = _aplicar_filtros(query, filtros)
+    total = query.limit(1).execute().count or 0
+
+    if ttl > 0:
+        _guardar_cache(clave, total, ttl)
+    return total
+
+
+def rpc(funcion, params=None, tablas=(), ttl=None):
+    """Llama a una función RPC de Postgres y cachea su resultado.
+
+    `tablas` son las tablas que lee la función: `invalidar()` sobre cualquiera
+    de ellas descarta el resultado cacheado. Las excepciones se propagan para
+    que el llamador pueda usar su cálculo de respaldo.
+    """
+    etiqueta = f"rpc:{funcion}"
+    if ttl is None:
+        ttl = min((TTL_POR_TABLA.get(t, TTL_POR_DEFECTO) for t in tablas), default=TTL_POR_DEFECTO)
+    clave = (frozenset(tablas) | {etiqueta}, 'rpc', _normalizar(params or {}), None, None, None)
+
+    if ttl > 0:
+        datos = _leer_cache(clave, etiqueta)
+        if datos is not None:
+            return datos
+
+    datos = supabase.rpc(funcion, params or {}).execute().data
+
+    if ttl > 0 and datos is not None:
+        _guardar_cache(clave, datos, ttl)
+    return datos
+
+
+def intentar_rpc(funcion, params=None, tablas=(), ttl=None):
+    """Como `rpc`, pero devuelve None si la función falla (p.ej. migración no aplicada).
+
+    Tras un fallo la función no se vuelve a intentar durante `REINTENTO_RPC`
+    segundos, para que el llamador use su cálculo de respaldo sin esperar
+    un error de red en cada rerun.
+    """
+    fallo = _rpc_no_disponible.get(funcion)
+    if fallo is not None and time.monotonic() - fallo < REINTENTO_RPC:
+        return None
+    try:
+        datos = rpc(funcion, params, tablas, ttl)
+    except Exception as e:
+        logger.warning("RPC %s no disponible, usando cálculo local: %s", funcion, e)
+        _rpc_no_disponible[funcion] = time.monotonic()
+        return None
+    _rpc_no_disponible.pop(funcion, None)
+    return datos
+
+
+def columnas_requeridas(especificacion, tabla, widgets=None):
+    """Une las columnas que declaran los widgets de `especificacion` para `tabla`.
+
+    `especificacion` es un dict `{widget: {tabla: [columnas]}}`. Devuelve la
+    lista de columnas para `select()` (siempre incluye `id`).
+    """
+    columnas = {'id'}
+    for widget, tablas in especificacion.items():
+        if widgets is None or widget in widgets:
+            columnas.update(tablas.get(tabla, []))
+    return ','.join(sorted(columnas))
+
+
+def invalidar(*tablas):
+    """Elimina de la caché todas las consultas de las tablas indicadas.
+
+    Se llama desde los flujos de inserción/actualización para que la siguiente
+    lectura refleje el cambio. Sin argumentos vacía la caché completa.
+    """
+    with _lock:
+        if not tablas:
+            _cache.clear()
+            return
+        tablas_set = set(tablas)
+        for clave in [k for k in _cache if _depende_de(k[0], tablas_set)]:
+            del _cache[clave]
+        for tabla in tablas:
+            _stats_tabla(tabla)['invalidaciones'] += 1
+
+
+def estadisticas_cache():
+    """Contadores de aciertos/fallos por tabla y totales de la caché."""
+    with _lock:
+        por_tabla = {t: dict(s) for t, s in _stats.items()}
+        hits = sum(s['hits'] for s in por_tabla.values())
+        misses = sum(s['misses'] for s in por_tabla.values())
+        return {
+            'entradas': len(_cache),
+            'hits': hits,
+            'misses': misses,
+            'tasa_aciertos': (hits / (hits + misses) * 100) if (hits + misses) else 0.0,
+            'por_tabla': por_tabla,
+        }
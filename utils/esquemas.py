@@ -0,0 +1,205 @@
+# utils/esquemas.py
+"""
+Tipos declarados de las columnas de cada tabla.
+
+`normalizar(df, tabla)` convierte en una sola pasada las columnas declaradas
+en `ESQUEMAS` (fechas a `datetime64` sin zona en UTC, números con
+`to_numeric`, JSON de texto a objetos). El resto de columnas no se toca: una
+descripción que contiene una fecha sigue siendo texto.
+
+El resultado se marca en `df.attrs['esquema']` y se guarda mientras viva el
+DataFrame de entrada, así el PDF y el Excel de un mismo reporte no vuelven a
+convertir los mismos datos. El resultado es compartido: para modificarlo,
+trabajar sobre una `.copy()`.
+
+Sin `tabla` (DataFrames armados a mano) solo se convierten las columnas de
+texto cuya muestra son todas fechas ISO. Las columnas con zona horaria
+(`DatetimeTZDtype`) pasan a UTC sin zona en ambos casos: Excel no acepta
+fechas con zona.
+"""
+import json
+import math
+import re
+import threading
+import weakref
+from datetime import date, datetime
+
+import pandas as pd
+
+# Tipos: fecha (solo día), fecha_hora, numero, booleano, json
+COMUNES = {
+    'created_at': 'fecha_hora',
+    'updated_at': 'fecha_hora',
+}
+
+ESQUEMAS = {
+    'incidentes': {
+        'fecha': 'fecha_hora',
+        'nivel_riesgo': 'numero',
+        'evidencia': 'json',
+    },
+    'acciones_correctivas': {
+        'fecha_limite': 'fecha',
+    },
+    'capacitaciones': {
+        'fecha': 'fecha_hora',
+        'duracion_horas': 'numero',
+        'participantes': 'numero',
+    },
+    'epp': {
+        'fecha_entrega': 'fecha',
+        'fecha_vencimiento': 'fecha',
+        'fecha_adquisicion': 'fecha',
+        'cantidad': 'numero',
+        'cantidad_minima': 'numero',
+        'cantidad_entregada': 'numero',
+        'costo_unitario': 'numero',
+        'vida_util_meses': 'numero',
+        'evidencia_entrega': 'json',
+    },
+    'inspecciones': {
+        'fecha': 'fecha',
+        'score': 'numero',
+        'respuestas': 'json',
+        'hallazgos': 'json',
+        'evidencia': 'json',
+    },
+    'documentos_sst': {
+        'fecha_emision': 'fecha',
+        'fecha_vigencia': 'fecha',
+        'aprobado': 'booleano',
+    },
+    'notificaciones': {
+        'leida': 'booleano',
+    },
+    'usuarios': {
+        'ultimo_acceso': 'fecha_hora',
+    },
+}
+
+MUESTRA = 1000
+_FECHA_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+
+_lock = threading.Lock()
+_normalizados = {}   # (id(df de entrada), tabla) -> df normalizado
+
+
+def tipos_columnas(tabla):
+    """{columna: tipo} declarados para `tabla` (incluye created_at/updated_at)."""
+    return {**COMUNES, **ESQUEMAS.get(tabla, {})}
+
+
+# ------------------------------------------------------------
+# Conversión por tipo
+# ------------------------------------------------------------
+def _a_fecha_hora(ser):
+    if pd.api.types.is_datetime64_any_dtype(ser.dtype):
+        fechas = ser
+    else:
+        fechas = pd.to_datetime(ser, errors='coerce', utc=True, format='ISO8601')
+    if isinstance(fechas.dtype, pd.DatetimeTZDtype):
+        fechas = fechas.dt.tz_convert('UTC').dt.tz_localize(None)
+    return fechas
+
+
+def _a_fecha(ser):
+    return _a_fecha_hora(ser).dt.normalize()
+
+
+def _desde_json(valor):
+    if isinstance(valor, str):
+        try:
+            return json.loads(valor)
+        except ValueError:
+            return valor
+    return valor
+
+
+def _a_booleano(ser):
+    if pd.api.types.is_bool_dtype(ser.dtype):
+        return ser
+    return ser.map({True: True, False: False, 'true': True, 'false': False}).astype('boolean')
+
+
+CONVERSORES = {
+    'fecha': _a_fecha,
+    'fecha_hora': _a_fecha_hora,
+    'numero': lambda ser: pd.to_numeric(ser, errors='coerce'),
+    'booleano': _a_booleano,
+    'json': lambda ser: ser.map(_desde_json),
+}
+
+
+def _parece_fecha(ser):
+    """True si una muestra de valores no nulos de `ser` son todos fechas ISO."""
+    muestra = ser.dropna().head(MUESTRA)
+    if muestra.empty:
+        return False
+    return all(isinstance(v, str) and _FECHA_ISO.match(v) for v in muestra)
+
+
+def _tipos_inferidos(df):
+    tipos = {}
+    for columna in df.columns:
+        ser = df[columna]
+        if isinstance(ser.dtype, pd.DatetimeTZDtype) or (ser.dtype == object and _parece_fecha(ser)):
+            tipos[columna] = 'fecha_hora'
+    return tipos
+
+
+# ------------------------------------------------------------
+# API
+# ------------------------------------------------------------
+def normalizar(df, tabla=None):
+    """DataFrame con las columnas de `tabla` convertidas a sus tipos (memoizado)."""
+    if df is None:
+        return df
+    esquema = df.attrs.get('esquema')
+    if esquema is not None and (tabla is None or esquema == tabla):
+        return df
+    clave = (id(df), tabla)
+    with _lock:
+        previo = _normalizados.get(clave)
+    if previo is not None:
+        return previo
+
+    if tabla:
+        tipos = tipos_columnas(tabla)
+        tipos.update({columna: 'fecha_hora' for columna in df.columns
+                      if columna not in tipos and isinstance(df[columna].dtype, pd.DatetimeTZDtype)})
+    else:
+        tipos = _tipos_inferidos(df)
+    convertidas = {
+        columna: CONVERSORES[tipo](df[columna])
+        for columna, tipo in tipos.items()
+        if columna in df.columns
+    }
+    resultado = df.assign(**convertidas) if convertidas else df.copy()
+    resultado.attrs['esquema'] = tabla or '*'
+
+    with _lock:
+        _normalizados[clave] = resultado
+    weakref.finalize(df, _olvidar, clave)
+    return resultado
+
+
+def _olvidar(clave):
+    with _lock:
+        _normalizados.pop(clave, None)
+
+
+def formatear_valor(valor):
+    """Texto de una celda para PDF: fechas dd/mm/aaaa, sin 'nan'/'None'."""
+    if valor is None or valor is pd.NaT or valor is pd.NA:
+        return ''
+    if isinstance(valor, float) and math.isnan(valor):
+        return ''
+    if isinstance(valor, datetime):
+        if (valor.hour, valor.minute, valor.second) == (0, 0, 0):
+            return valor.strftime('%d/%m/%Y')
+        return valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, (list, dict)):
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
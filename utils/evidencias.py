@@ -0,0 +1,146 @@
+# utils/evidencias.py
+"""
+Procesamiento de evidencias fotográficas antes de subirlas al bucket.
+
+Cada foto se orienta según su EXIF, se le quitan los metadatos (GPS, modelo
+del teléfono...), se limita su resolución y se recodifica en WebP o JPEG.
+Además se genera una miniatura. Ambas se guardan en el almacén direccionado
+por contenido (`cas/ab/<sha256>.webp` y `cas/ab/<sha256>.min.webp`, con el
+hash de la foto original), así una foto repetida no se procesa ni se sube dos
+veces.
+
+En la base de datos las columnas `evidencia` (incidentes, inspecciones) y
+`evidencia_entrega` (epp) guardan una lista JSON de
+`{"url": ..., "miniatura": ...}`; `leer_evidencias` también acepta los
+formatos anteriores (lista de URLs, o una sola URL, sin miniatura).
+"""
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from utils.uploads import existe_objeto, extension_de, hash_contenido, ruta_por_contenido, url_publica
+
+# Configurables por .env
+FORMATO_EVIDENCIA = os.getenv("EVIDENCIA_FORMATO", "WEBP").upper()   # WEBP o JPEG
+CALIDAD_EVIDENCIA = int(os.getenv("EVIDENCIA_CALIDAD", "80"))
+LADO_MAXIMO = int(os.getenv("EVIDENCIA_LADO_MAXIMO", "1920"))
+LADO_MINIATURA = 320
+CALIDAD_MINIATURA = 70
+
+_FORMATOS = {
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+
+def _a_modo_compatible(img, formato):
+    """JPEG no admite transparencia (se aplana sobre blanco); WebP conserva RGBA."""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        if formato == 'WEBP':
+            return img
+        fondo = Image.new('RGB', img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.split()[-1])
+        return fondo
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+
+def _codificar(img, formato, calidad):
+    salida = io.BytesIO()
+    if formato == 'WEBP':
+        img.save(salida, 'WEBP', quality=calidad, method=4)
+    else:
+        img.save(salida, 'JPEG', quality=calidad, optimize=True, progressive=True)
+    return salida.getvalue()
+
+
+def procesar_imagen(contenido, formato=None, calidad=None, lado_maximo=None):
+    """Devuelve `(imagen, miniatura)` recodificadas y sin EXIF.
+
+    Lanza `UnidentifiedImageError` si `contenido` no es una imagen.
+    """
+    formato = (formato or FORMATO_EVIDENCIA).upper()
+    calidad = calidad or CALIDAD_EVIDENCIA
+    lado_maximo = lado_maximo or LADO_MAXIMO
+
+    with Image.open(io.BytesIO(contenido)) as original:
+        # exif_transpose aplica la orientación; al no pasar exif= al guardar
+        # los metadatos no se copian al archivo nuevo
+        img = ImageOps.exif_transpose(original)
+        img = _a_modo_compatible(img, formato)
+        img.thumbnail((lado_maximo, lado_maximo), Image.LANCZOS)
+        imagen = _codificar(img, formato, calidad)
+
+        img.thumbnail((LADO_MINIATURA, LADO_MINIATURA), Image.LANCZOS)
+        miniatura = _codificar(img, formato, CALIDAD_MINIATURA)
+
+    return imagen, miniatura
+
+
+def _preparar(nombre, contenido, tipo, formato):
+    """Archivos a subir y entrada JSON de una evidencia.
+
+    Las rutas se derivan del SHA-256 de la foto original: si ya se procesó
+    y subió antes, se reutilizan sin volver a recodificarla.
+    """
+    extension, content_type = _FORMATOS[formato]
+    huella = hash_contenido(contenido)
+    ruta = ruta_por_contenido(extension=extension, huella=huella)
+    ruta_miniatura = ruta_por_contenido(extension=f"min.{extension}", huella=huella)
+    entrada = {'url': url_publica(ruta), 'miniatura': url_publica(ruta_miniatura)}
+
+    if existe_objeto(ruta) and existe_objeto(ruta_miniatura):
+        return [], entrada
+
+    try:
+        imagen, miniatura = procesar_imagen(contenido, formato)
+    except (UnidentifiedImageError, OSError):
+        # PDF u otro formato: se sube tal cual y sin miniatura
+        ruta = ruta_por_contenido(extension=extension_de(nombre), huella=huella)
+        return [(ruta, contenido, tipo)], {'url': url_publica(ruta), 'miniatura': None}
+
+    archivos = [(ruta, imagen, content_type), (ruta_miniatura, miniatura, content_type)]
+    return archivos, entrada
+
+
+def preparar_evidencias(subidos, formato=None):
+    """Procesa los archivos de `st.file_uploader` en paralelo.
+
+    Devuelve `(archivos, evidencias)`: `archivos` para `utils.uploads`
+    (tuplas `(ruta, contenido, content_type)`) y `evidencias`, la lista de
+    `{"url", "miniatura"}` que se guarda en la base de datos.
+    """
+    formato = (formato or FORMATO_EVIDENCIA).upper()
+    subidos = list(subidos or [])
+    if not subidos:
+        return [], []
+
+    # Pillow libera el GIL al decodificar/codificar, así que los hilos rinden
+    with ThreadPoolExecutor(max_workers=min(4, len(subidos))) as executor:
+        resultados = list(executor.map(
+            lambda s: _preparar(s.name, s.getvalue(), s.type, formato),
+            subidos
+        ))
+
+    # La misma foto adjuntada dos veces produce la misma ruta: se sube una vez
+    archivos = list({a[0]: a for archivos_ev, _ in resultados for a in archivos_ev}.values())
+    evidencias = [entrada for _, entrada in resultados]
+    return archivos, evidencias
+
+
+def leer_evidencias(valor):
+    """Lista de `{"url", "miniatura"}` desde la columna `evidencia` (JSON)."""
+    if not isinstance(valor, (str, list)) or not valor:
+        return []
+    if isinstance(valor, str):
+        # Formato anterior de evidencia_entrega: la URL sin JSON
+        datos = json.loads(valor) if valor.lstrip().startswith('[') else [valor]
+    else:
+        datos = valor
+    return [
+        e if isinstance(e, dict) else {'url': e, 'miniatura': None}
+        for e in datos
+    ]
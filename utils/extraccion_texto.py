@@ -0,0 +1,150 @@
+# utils/extraccion_texto.py
+"""
+Extracción del texto de los documentos SST (PDF y DOCX) para la búsqueda.
+
+La extracción corre fuera del request: `encolar_extraccion` deja el trabajo
+en una cola que procesa un hilo de fondo, que guarda el texto en
+`documentos_sst.contenido_texto` y actualiza el índice local de
+`utils.busqueda`. `reindexar_biblioteca` encola los documentos existentes.
+
+PDF se lee con `pypdf`; DOCX con la librería estándar.
+"""
+import io
+import logging
+import queue
+import re
+import threading
+import zipfile
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from xml.etree import ElementTree
+
+import requests
+from pypdf import PdfReader
+
+from supabase_client import supabase
+from utils.busqueda import indexar_documento
+from utils.data_access import consultar_pagina, invalidar
+from utils.uploads import extension_de
+
+logger = logging.getLogger(__name__)
+
+# Límite de texto guardado por documento (caracteres)
+MAX_CARACTERES = 200_000
+TAMANO_PAGINA = 500
+
+_NS_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_cola = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_estado = {'pendientes': 0, 'procesados': 0, 'sin_texto': 0, 'errores': 0}
+_estado_lock = threading.Lock()
+
+
+def _texto_pdf(contenido):
+    lector = PdfReader(io.BytesIO(contenido))
+    return "\n".join((pagina.extract_text() or '') for pagina in lector.pages)
+
+
+def _texto_docx(contenido):
+    with zipfile.ZipFile(io.BytesIO(contenido)) as docx:
+        raiz = ElementTree.fromstring(docx.read('word/document.xml'))
+    parrafos = []
+    for parrafo in raiz.iter(f'{_NS_WORD}p'):
+        parrafos.append(''.join(t.text or '' for t in parrafo.iter(f'{_NS_WORD}t')))
+    return "\n".join(parrafos)
+
+
+def extraer_texto(contenido, nombre):
+    """Texto plano de un PDF o DOCX; cadena vacía para otros formatos."""
+    extension = extension_de(nombre)
+    if extension == '.pdf':
+        texto = _texto_pdf(contenido)
+    elif extension == '.docx':
+        texto = _texto_docx(contenido)
+    else:
+        return ''
+    # Postgres no admite NUL en text; se compactan los espacios
+    texto = texto.replace('\x00', ' ')
+    texto = re.sub(r'[ \t]+', ' ', texto)
+    texto = re.sub(r'\n\s*\n+', '\n', texto)
+    return texto.strip()[:MAX_CARACTERES]
+
+
+def _procesar(trabajo):
+    doc = trabajo['documento']
+    contenido = trabajo.get('contenido')
+    if contenido is None:
+        respuesta = requests.get(doc['archivo_url'], timeout=60)
+        respuesta.raise_for_status()
+        contenido = respuesta.content
+
+    texto = extraer_texto(contenido, trabajo.get('nombre') or urlparse(doc['archivo_url']).path)
+    supabase.table('documentos_sst').update({
+        'contenido_texto': texto or None,
+        'texto_extraido_en': datetime.now(timezone.utc).isoformat()
+    }).eq('id', doc['id']).execute()
+    invalidar('documentos_sst')
+    indexar_documento(dict(doc, contenido_texto=texto))
+    return bool(texto)
+
+
+def _contar(clave, n=1):
+    with _estado_lock:
+        _estado[clave] += n
+
+
+def _trabajar():
+    while True:
+        trabajo = _cola.get()
+        try:
+            _contar('procesados' if _procesar(trabajo) else 'sin_texto')
+        except Exception as e:
+            _contar('errores')
+            logger.warning("No se pudo extraer texto del documento %s: %s",
+                           trabajo['documento'].get('id'), e)
+        finally:
+            _contar('pendientes', -1)
+            _cola.task_done()
+
+
+def _asegurar_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_trabajar, name="extraccion-texto", daemon=True)
+            _worker.start()
+
+
+def encolar_extraccion(documento, contenido=None, nombre=None):
+    """Encola la extracción de texto de `documento` (fila de documentos_sst).
+
+    Si se pasa `contenido` (bytes recién subidos) no se descarga el archivo.
+    """
+    _asegurar_worker()
+    _contar('pendientes')
+    _cola.put({'documento': documento, 'contenido': contenido, 'nombre': nombre})
+
+
+def reindexar_biblioteca(solo_pendientes=True):
+    """Encola todos los documentos (o solo los aún sin extraer). Devuelve cuántos."""
+    filtros = [('is_', 'texto_extraido_en', 'null')] if solo_pendientes else []
+    encolados, cursor = 0, None
+    # Por páginas keyset: PostgREST corta cada respuesta en max-rows
+    while True:
+        documentos, cursor = consultar_pagina(
+            'documentos_sst', 'id,titulo,codigo,tipo,version,estado,archivo_url,keywords',
+            filtros=filtros, claves=('id',), cursor=cursor, tamano=TAMANO_PAGINA, desc=False, ttl=0)
+        for doc in documentos:
+            if doc.get('archivo_url'):
+                encolar_extraccion(doc)
+                encolados += 1
+        if cursor is None:
+            return encolados
+
+
+def estado_extraccion():
+    """Contadores de la cola de extracción de este proceso."""
+    with _estado_lock:
+        return dict(_estado)
@@ -0,0 +1,366 @@
+# utils/graficos.py
+"""
+Gráficos Plotly para los reportes PDF, renderizados en memoria.
+
+- `renderizar(fig)` devuelve los bytes PNG/SVG de la figura; nada pasa por
+  el directorio temporal, así los reportes de usuarios distintos no se
+  mezclan ni dejan archivos huérfanos.
+- El resultado se guarda en una caché LRU por huella de la figura (su JSON
+  más formato, tamaño y backend): el mismo gráfico en dos reportes iguales
+  se renderiza una sola vez.
+- `renderizar_varios(figuras)` reparte las figuras en un pool de
+  `GRAFICOS_WORKERS` hilos.
+- `grafico_pdf(fig, ancho, alto)` devuelve el flowable listo para el PDF.
+
+Backends (`GRAFICOS_BACKEND=auto|kaleido|nativo`):
+- `kaleido`: un único proceso de kaleido por proceso de la app, arrancado en
+  segundo plano con `precalentar()` (app.py, tras el login) y reutilizado en
+  cada gráfico. Hasta que termina de arrancar se usa el nativo.
+- `nativo`: dibuja líneas, barras y tortas con `reportlab.graphics` a partir
+  de los datos de la figura. No necesita kaleido ni Chrome y en el PDF queda
+  como gráfico vectorial.
+`auto` usa kaleido si está instalado y cae al nativo si falla.
+
+Latencia por gráfico de cada backend:
+
+    python -m utils.graficos [--graficos 20]
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.getenv("GRAFICOS_BACKEND", "auto")
+MAX_WORKERS = int(os.getenv("GRAFICOS_WORKERS", "2"))
+MAX_CACHE = 64
+ANCHO = 900
+ALTO = 500
+# Píxeles por punto al rasterizar para el PDF
+RESOLUCION = 2
+
+PALETA = ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+          '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52']
+
+_lock = threading.Lock()
+_cache = OrderedDict()     # huella -> bytes
+_en_curso = {}             # huella -> Future de quien la está renderizando
+_stats = {'aciertos': 0, 'renderizados': 0, 'kaleido': 0, 'nativo': 0}
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="graficos")
+_kaleido = {'estado': None, 'arrancando': False}   # estado None: sin probar, 'listo', 'no_disponible'
+_kaleido_lock = threading.Lock()
+
+
+class GraficoNoSoportado(ValueError):
+    """El backend nativo no sabe dibujar este tipo de traza."""
+
+
+# ------------------------------------------------------------
+# Backend kaleido (proceso reutilizado)
+# ------------------------------------------------------------
+def _iniciar_kaleido():
+    """Arranca kaleido una vez por proceso; False si no está disponible."""
+    with _kaleido_lock:
+        if _kaleido['estado'] is None:
+            try:
+                import kaleido
+                import plotly.io as pio
+
+                # kaleido >= 1.0: servidor persistente; 0.2.x ya mantiene su proceso en `scope`
+                iniciar_servidor = getattr(kaleido, 'start_sync_server', None)
+                if iniciar_servidor is not None:
+                    iniciar_servidor(silence_warnings=True)
+                else:
+                    pio.kaleido.scope.default_format = 'png'
+                # El primer render es el que paga el arranque del navegador
+                import plotly.graph_objects as go
+                pio.to_image(go.Figure(), format='png', width=10, height=10)
+                _kaleido['estado'] = 'listo'
+            except Exception as e:
+                logger.info("kaleido no disponible, se usa el backend nativo: %s", e)
+                _kaleido['estado'] = 'no_disponible'
+        return _kaleido['estado'] == 'listo'
+
+
+def precalentar():
+    """Arranca kaleido en un hilo de fondo para que el primer reporte no espere."""
+    with _kaleido_lock:
+        if BACKEND not in ('auto', 'kaleido') or _kaleido['estado'] is not None or _kaleido['arrancando']:
+            return
+        _kaleido['arrancando'] = True
+    _pool.submit(_iniciar_kaleido)
+
+
+def _renderizar_kaleido(fig, formato, ancho, alto, escala):
+    import plotly.io as pio
+    return pio.to_image(fig, format=formato, width=ancho, height=alto, scale=escala)
+
+
+def backend_activo():
+    """'kaleido' solo si ya arrancó; mientras se precalienta se dibuja con el nativo."""
+    if BACKEND == 'nativo':
+        return 'nativo'
+    if _kaleido['estado'] is None:
+        precalentar()
+    return 'kaleido' if _kaleido['estado'] == 'listo' else 'nativo'
+
+
+# ------------------------------------------------------------
+# Backend nativo (reportlab.graphics)
+# ------------------------------------------------------------
+def _eje_x(valores):
+    """(números, formateador o None, categorías o None) para el eje X."""
+    import pandas as pd
+
+    ser = pd.Series(list(valores))
+    if isinstance(ser.dtype, pd.PeriodDtype):
+        ser = ser.dt.to_timestamp()
+    if pd.api.types.is_numeric_dtype(ser.dtype) and not pd.api.types.is_bool_dtype(ser.dtype):
+        return ser.astype(float).tolist(), None, None
+    try:
+        fechas = pd.to_datetime(ser, format='ISO8601') if ser.dtype == object else pd.to_datetime(ser)
+    except (ValueError, TypeError):
+        etiquetas = ser.astype(str).tolist()
+        return list(range(len(etiquetas))), None, etiquetas
+    if getattr(fechas.dt, 'tz', None) is not None:
+        fechas = fechas.dt.tz_localize(None)
+    dias = ((fechas - pd.Timestamp(0)) / pd.Timedelta(days=1)).tolist()
+    return dias, lambda d: (pd.Timestamp(0) + pd.Timedelta(days=d)).strftime('%d/%m'), None
+
+
+def _color(indice):
+    from reportlab.lib import colors
+    return colors.HexColor(PALETA[indice % len(PALETA)])
+
+
+def _lineas(trazas, x0, y0, ancho, alto):
+    from reportlab.graphics.charts.lineplots import LinePlot
+
+    grafico = LinePlot()
+    grafico.x, grafico.y, grafico.width, grafico.height = x0, y0, ancho, alto
+    datos, formato, categorias = [], None, None
+    for traza in trazas:
+        xs, formato, categorias = _eje_x(traza.x if traza.x is not None else range(len(traza.y)))
+        datos.append([(x, float(y)) for x, y in zip(xs, traza.y) if y is not None and y == y])
+    grafico.data = [serie or [(0, 0)] for serie in datos]
+    for i in range(len(datos)):
+        grafico.lines[i].strokeColor = _color(i)
+        grafico.lines[i].strokeWidth = 1.5
+    grafico.xValueAxis.labels.fontSize = grafico.yValueAxis.labels.fontSize = 7
+    if formato:
+        grafico.xValueAxis.labelTextFormat = formato
+    elif categorias:
+        grafico.xValueAxis.valueSteps = list(range(len(categorias)))
+        grafico.xValueAxis.labelTextFormat = lambda v: categorias[int(v)] if 0 <= int(v) < len(categorias) else ''
+    return grafico
+
+
+def _barras(trazas, x0, y0, ancho, alto):
+    from reportlab.graphics.charts.barcharts import HorizontalBarChart, VerticalBarChart
+
+    horizontal = getattr(trazas[0], 'orientation', None) == 'h'
+    grafico = HorizontalBarChart() if horizontal else VerticalBarChart()
+    grafico.x, grafico.y, grafico.width, grafico.height = x0, y0, ancho, alto
+    categorias = trazas[0].y if horizontal else trazas[0].x
+    grafico.data = [[float(v or 0) for v in (t.x if horizontal else t.y)] for t in trazas]
+    grafico.categoryAxis.categoryNames = [str(c) for c in categorias]
+    grafico.categoryAxis.labels.fontSize = grafico.valueAxis.labels.fontSize = 7
+    if not horizontal and len(categorias) > 6:
+        grafico.categoryAxis.labels.angle = 30
+        grafico.categoryAxis.labels.boxAnchor = 'ne'
+    grafico.valueAxis.valueMin = 0
+    for i in range(len(trazas)):
+        grafico.bars[i].fillColor = _color(i)
+        grafico.bars[i].strokeColor = None
+    return grafico
+
+
+def _torta(traza, x0, y0, ancho, alto):
+    from reportlab.graphics.charts.piecharts import Pie
+
+    valores = [float(v or 0) for v in traza.values]
+    total = sum(valores) or 1
+    grafico = Pie()
+    lado = min(ancho, alto)
+    grafico.x, grafico.y = x0 + (ancho - lado) / 2, y0 + (alto - lado) / 2
+    grafico.width = grafico.height = lado
+    grafico.data = valores
+    grafico.labels = [f"{etiqueta} ({100 * v / total:.0f}%)" for etiqueta, v in zip(traza.labels, valores)]
+    grafico.slices.fontSize = 7
+    grafico.slices.strokeColor = None
+    for i in range(len(valores)):
+        grafico.slices[i].fillColor = _color(i)
+    return grafico
+
+
+def dibujo_nativo(fig, ancho, alto):
+    """`Drawing` de ReportLab (en puntos) con las trazas de línea, barra o torta de `fig`."""
+    from reportlab.graphics.shapes import Drawing, String
+
+    trazas = list(fig.data)
+    if not trazas:
+        raise GraficoNoSoportado("figura sin trazas")
+    tipo = trazas[0].type
+    dibujo = Drawing(ancho, alto)
+    titulo = fig.layout.title.text
+    margen_superior = 22 if titulo else 8
+    x0, y0 = 40, 30
+    area = (x0, y0, ancho - x0 - 12, alto - y0 - margen_superior)
+
+    if tipo in ('scatter', 'scattergl'):
+        dibujo.add(_lineas(trazas, *area))
+    elif tipo == 'bar':
+        dibujo.add(_barras(trazas, *area))
+    elif tipo == 'pie':
+        dibujo.add(_torta(trazas[0], 10, 10, ancho - 20, alto - margen_superior - 20))
+    else:
+        raise GraficoNoSoportado(f"traza '{tipo}' no soportada por el backend nativo")
+
+    if titulo:
+        dibujo.add(String(ancho / 2, alto - 14, titulo, fontName='Helvetica-Bold',
+                          fontSize=10, textAnchor='middle'))
+    return dibujo
+
+
+def _renderizar_nativo(fig, formato, ancho, alto, escala):
+    dibujo = dibujo_nativo(fig, ancho, alto)
+    if formato == 'svg':
+        from reportlab.graphics import renderSVG
+        return renderSVG.drawToString(dibujo).encode('utf-8')
+    from reportlab.graphics import renderPM
+    return renderPM.drawToString(dibujo, fmt=formato.upper(), dpi=72 * escala)
+
+
+# ------------------------------------------------------------
+# API
+# ------------------------------------------------------------
+def huella_figura(fig, formato='png', ancho=ANCHO, alto=ALTO, escala=1, backend=''):
+    clave = f"{backend}|{formato}|{ancho}|{alto}|{escala}|{fig.to_json()}"
+    return hashlib.sha256(clave.encode('utf-8')).hexdigest()
+
+
+def _renderizar_con(backend, fig, formato, ancho, alto, escala):
+    if backend == 'kaleido':
+        try:
+            return _renderizar_kaleido(fig, formato, ancho, alto, escala), 'kaleido'
+        except Exception as e:
+            if BACKEND == 'kaleido':
+                raise
+            logger.warning("kaleido falló (%s); se usa el backend nativo", e)
+            _kaleido['estado'] = 'no_disponible'
+    return _renderizar_nativo(fig, formato, ancho, alto, escala), 'nativo'
+
+
+def renderizar(fig, formato='png', ancho=ANCHO, alto=ALTO, escala=1):
+    """Bytes de la figura en `formato` ('png' o 'svg'), desde la caché si ya se hizo."""
+    backend = backend_activo()
+    clave = huella_figura(fig, formato, ancho, alto, escala, backend)
+    with _lock:
+        if clave in _cache:
+            _cache.move_to_end(clave)
+            _stats['aciertos'] += 1
+            return _cache[clave]
+        pendiente = _en_curso.get(clave)
+        if pendiente is None:
+            propio = _en_curso[clave] = Future()
+    if pendiente is not None:
+        # La misma figura se está renderizando en otro hilo
+        return pendiente.result()
+
+    try:
+        contenido, usado = _renderizar_con(backend, fig, formato, ancho, alto, escala)
+    except Exception as e:
+        with _lock:
+            _en_curso.pop(clave, None)
+        propio.set_exception(e)
+        raise
+
+    with _lock:
+        _cache[clave] = contenido
+        _en_curso.pop(clave, None)
+        _stats['renderizados'] += 1
+        _stats[usado] += 1
+        while len(_cache) > MAX_CACHE:
+            _cache.popitem(last=False)
+    propio.set_result(contenido)
+    return contenido
+
+
+def renderizar_varios(figuras, formato='png', ancho=ANCHO, alto=ALTO, escala=1):
+    """Lista de bytes en el mismo orden que `figuras`, renderizadas en paralelo."""
+    futuros = [_pool.submit(renderizar, fig, formato, ancho, alto, escala) for fig in figuras]
+    return [futuro.result() for futuro in futuros]
+
+
+def imagen_pdf(png, ancho):
+    """Flowable `Image` de ReportLab con `ancho` (pt) y la proporción de la imagen."""
+    from reportlab.lib.utils import ImageReader
+    from reportlab.platypus import Image
+
+    px_ancho, px_alto = ImageReader(io.BytesIO(png)).getSize()
+    return Image(io.BytesIO(png), width=ancho, height=ancho * px_alto / px_ancho)
+
+
+def grafico_pdf(fig, ancho, alto):
+    """Flowable de `fig` para el PDF: PNG de kaleido o dibujo vectorial nativo."""
+    if backend_activo() == 'kaleido':
+        try:
+            png = renderizar(fig, 'png', int(ancho * RESOLUCION), int(alto * RESOLUCION))
+            return imagen_pdf(png, ancho)
+        except GraficoNoSoportado:
+            raise
+        except Exception as e:
+            logger.warning("No se pudo rasterizar el gráfico (%s); se dibuja nativo", e)
+    with _lock:
+        _stats['nativo'] += 1
+    return dibujo_nativo(fig, ancho, alto)
+
+
+def estadisticas_graficos():
+    with _lock:
+        return dict(_stats, en_cache=len(_cache), backend=BACKEND, estado_kaleido=_kaleido['estado'])
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import pandas as pd
+    import plotly.express as px
+
+    parser = argparse.ArgumentParser(description="Latencia por gráfico de cada backend")
+    parser.add_argument("--graficos", type=int, default=20)
+    args = parser.parse_args()
+
+    fechas = pd.date_range("2026-01-01", periods=90, freq="D")
+    figuras = []
+    for i in range(args.graficos):
+        serie = pd.DataFrame({'fecha': fechas, 'count': [(d * (i + 3)) % 11 for d in range(90)]})
+        figuras.append([
+            px.line(serie, x='fecha', y='count', title=f'Tendencia {i}'),
+            px.bar(x=['Planta', 'Almacén', 'Oficinas', 'Taller'], y=[i, 4, 2, 7], title=f'Áreas {i}'),
+            px.pie(values=[i + 1, 3, 5], names=['Bajo', 'Medio', 'Alto'], title=f'Riesgo {i}'),
+        ][i % 3])
+
+    def medir(nombre, renderizar_uno):
+        inicio = time.perf_counter()
+        try:
+            renderizar_uno(figuras[0])
+        except Exception as e:
+            print(f"{nombre:<16} no disponible: {str(e).strip().splitlines()[0]}")
+            return
+        frio = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for fig in figuras[1:]:
+            renderizar_uno(fig)
+        caliente = (time.perf_counter() - inicio) / max(len(figuras) - 1, 1)
+        print(f"{nombre:<16} primer gráfico {1000 * frio:8.1f} ms   siguientes {1000 * caliente:8.1f} ms/gráfico")
+
+    from reportlab.graphics.renderPDF import drawToString
+    medir("nativo (PDF)", lambda fig: drawToString(dibujo_nativo(fig, 360, 216)))
+    medir("nativo (SVG)", lambda fig: _renderizar_nativo(fig, 'svg', 360, 216, 1))
+    medir("kaleido (PNG)", lambda fig: _renderizar_kaleido(fig, 'png', 720, 432, 1))
@@ -0,0 +1,131 @@
+# utils/kpis.py
+"""
+KPIs agregados en Postgres (funciones RPC de supabase/migrations) con
+cálculo de respaldo en pandas cuando la función no está disponible
+(p.ej. un PostgREST local sin las migraciones aplicadas). El respaldo lee
+las filas con `sincronizar`, que solo descarga los cambios tras la primera vez.
+
+`refrescar=True` (botón "Actualizar") omite la caché de la RPC y fuerza la
+sincronización de las copias locales.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from utils.data_access import contar, intentar_rpc
+from utils.esquemas import normalizar
+from utils.sincronizacion import sincronizar
+
+
+def _rango(fecha_inicio, fecha_fin):
+    return [
+        ('gte', 'fecha', fecha_inicio.isoformat()),
+        ('lte', 'fecha', fecha_fin.isoformat())
+    ]
+
+
+def _conteos(serie):
+    """value_counts() como dict plano {valor: n}."""
+    return {str(k): int(v) for k, v in serie.fillna('N/A').value_counts().items()}
+
+
+# ------------------------------------------------------------
+# Incidentes
+# ------------------------------------------------------------
+def kpis_incidentes(fecha_desde, fecha_hasta, refrescar=False):
+    """Totales, críticos, pendientes y distribuciones de incidentes del período."""
+    datos = intentar_rpc(
+        'kpis_incidentes',
+        {'p_desde': fecha_desde.isoformat(), 'p_hasta': fecha_hasta.isoformat()},
+        ('incidentes',),
+        ttl=0 if refrescar else None
+    )
+    if datos is not None:
+        return datos
+    return _kpis_incidentes_local(fecha_desde, fecha_hasta, refrescar)
+
+
+def _kpis_incidentes_local(fecha_desde, fecha_hasta, refrescar=False):
+    filas = sincronizar('incidentes', 'id,fecha,tipo,area,estado,nivel_riesgo',
+                        filtros=_rango(fecha_desde, fecha_hasta), refrescar=refrescar)
+    df = pd.DataFrame(filas, columns=['id', 'fecha', 'tipo', 'area', 'estado', 'nivel_riesgo'])
+    df = normalizar(df, 'incidentes')
+
+    categorias = pd.cut(
+        df['nivel_riesgo'],
+        bins=[0, 5, 12, 16, 25],
+        labels=['Bajo', 'Medio', 'Alto', 'Crítico']
+    )
+    fechas = df['fecha']
+    riesgo_promedio = df['nivel_riesgo'].mean()
+
+    return {
+        'total': len(df),
+        'criticos': int((df['nivel_riesgo'] >= 15).sum()),
+        'accidentes': int((df['nivel_riesgo'] >= 10).sum()),
+        'pendientes': int((df['estado'] == 'Pendiente').sum()),
+        'riesgo_promedio': None if pd.isna(riesgo_promedio) else float(riesgo_promedio),
+        'ultimos_7_dias': int((fechas >= datetime.now() - timedelta(days=7)).sum()),
+        'por_estado': _conteos(df['estado']),
+        'por_tipo': _conteos(df['tipo']),
+        'por_area': _conteos(df['area']),
+        'por_categoria': {str(k): int(v) for k, v in categorias.value_counts().items() if v},
+        'por_dia': _conteos(fechas.dropna().dt.strftime('%Y-%m-%d')),
+    }
+
+
+# ------------------------------------------------------------
+# Dashboard ejecutivo
+# ------------------------------------------------------------
+def kpis_dashboard(fecha_inicio, fecha_fin, dias_epp=30, refrescar=False):
+    """KPIs de las tarjetas del dashboard: incidentes, capacitaciones, inspecciones y EPP."""
+    datos = intentar_rpc(
+        'kpis_dashboard',
+        {'p_desde': fecha_inicio.isoformat(), 'p_hasta': fecha_fin.isoformat(), 'p_dias_epp': dias_epp},
+        ('incidentes', 'capacitaciones', 'inspecciones', 'epp'),
+        ttl=0 if refrescar else None
+    )
+    if datos is not None:
+        return datos
+    return _kpis_dashboard_local(fecha_inicio, fecha_fin, dias_epp, refrescar)
+
+
+def _kpis_dashboard_local(fecha_inicio, fecha_fin, dias_epp, refrescar=False):
+    rango_fechas = _rango(fecha_inicio, fecha_fin)
+    ttl_conteo = 0 if refrescar else None
+
+    inc = pd.DataFrame(sincronizar('incidentes', 'id,nivel_riesgo', filtros=rango_fechas,
+                                   refrescar=refrescar),
+                       columns=['id', 'nivel_riesgo'])
+    cap = pd.DataFrame(sincronizar('capacitaciones', 'id,participantes', filtros=rango_fechas,
+                                   refrescar=refrescar),
+                       columns=['id', 'participantes'])
+    insp = pd.DataFrame(sincronizar('inspecciones', 'id,estado', filtros=rango_fechas,
+                                    refrescar=refrescar),
+                        columns=['id', 'estado'])
+
+    hoy = datetime.now().date()
+    epp_por_vencer = contar('epp', filtros=[
+        ('gte', 'fecha_vencimiento', hoy.isoformat()),
+        ('lte', 'fecha_vencimiento', (hoy + timedelta(days=dias_epp)).isoformat())
+    ], ttl=ttl_conteo)
+
+    return {
+        'incidentes': {
+            'total': len(inc),
+            'criticos': int((pd.to_numeric(inc['nivel_riesgo'], errors='coerce') >= 15).sum()),
+        },
+        'capacitaciones': {
+            'total': len(cap),
+            'participantes': int(pd.to_numeric(cap['participantes'], errors='coerce').fillna(0).sum()),
+        },
+        'inspecciones': {
+            'total': len(insp),
+            'pendientes': int((insp['estado'] == 'Pendiente').sum()),
+            'resueltas': int((insp['estado'] == 'Resuelto').sum()),
+        },
+        'epp': {
+            'total': contar('epp', ttl=ttl_conteo),
+            'por_vencer': epp_por_vencer,
+        },
+    }
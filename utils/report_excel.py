@@ -1,48 +1,142 @@
+# utils/report_excel.py
+"""
+Exportación a Excel en modo streaming.
+
+Las hojas se escriben con `Workbook(write_only=True)`: las filas se envían
+por bloques de `FILAS_POR_BLOQUE` directamente desde los arrays de columnas
+y openpyxl las vuelca al archivo sin mantener las celdas en memoria.
+- Fechas y números conservan su tipo (Excel puede ordenar y filtrar). Los
+  tipos salen de `utils.esquemas`: los DataFrames ya normalizados con su
+  tabla no se vuelven a convertir; el resto pasa por la detección de
+  fechas ISO de `normalizar(df)`. Las columnas JSON se escriben como texto JSON.
+- El ancho de cada columna se estima con una muestra de `MUESTRA_ANCHOS` filas.
+- `destino` puede ser una ruta o un archivo; `excel_temporal` escribe en un
+  archivo temporal en lugar de un `BytesIO`.
+
+Benchmark (10k / 100k / 1M filas):
+
+    python -m utils.report_excel [--filas 10000 100000 1000000] [--comparar]
+"""
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.utils import get_column_letter
-import pandas as pd
-from pandas.api.types import is_datetime64tz_dtype, is_datetime64_dtype
-
 
-# --------------------------------------------------------
-# Normaliza fechas: convierte columnas datetime con tz a sin tz
-# --------------------------------------------------------
-def _ensure_naive_datetimes(df: pd.DataFrame) -> pd.DataFrame:
-    if df is None or df.empty:
-        return df
+from utils.esquemas import normalizar
 
-    for col in df.columns:
-        ser = df[col]
-
-        try:
-            # Caso 1: dtype datetime con zona horaria
-            if is_datetime64tz_dtype(ser):
-                df[col] = ser.dt.tz_convert("UTC").dt.tz_localize(None)
-                continue
-
-            # Caso 2: dtype datetime sin zona
-            if is_datetime64_dtype(ser):
-                df[col] = pd.to_datetime(ser, errors="coerce")
-                continue
+FILAS_POR_BLOQUE = 5000
+MUESTRA_ANCHOS = 1000
+ANCHO_MINIMO = 8
+ANCHO_MAXIMO = 60
+ANCHO_FECHA = 20
 
-            # Caso 3: columna object con strings que parecen fechas
-            if ser.dtype == object:
-                parsed = pd.to_datetime(ser, errors="coerce")
+_RELLENO_ENCABEZADO = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
+_FUENTE_ENCABEZADO = Font(bold=True)
+_ALINEACION_ENCABEZADO = Alignment(horizontal="center", vertical="center")
 
-                # Si el parseo funcionó, reemplazar
-                if parsed.notna().sum() > 0:
-                    # Si trae TZ → normalizar
-                    if is_datetime64tz_dtype(parsed):
-                        parsed = parsed.dt.tz_convert("UTC").dt.tz_localize(None)
 
-                    df[col] = parsed
+# --------------------------------------------------------
+# Valores de celda
+# --------------------------------------------------------
+def _celda(valor):
+    if valor is None or isinstance(valor, (str, int, float)):
+        return valor
+    if isinstance(valor, (list, dict)):
+        return json.dumps(valor, ensure_ascii=False)
+    # Objetos que Excel no acepta van como texto
+    return str(valor)
+
+
+def _valores(ser):
+    """Valores Python de un bloque de columna (None en lugar de NaN/NaT)."""
+    if pd.api.types.is_datetime64_dtype(ser.dtype):
+        return [None if v is pd.NaT else v.to_pydatetime() for v in ser.to_numpy(dtype=object)]
+    if pd.api.types.is_bool_dtype(ser.dtype) or pd.api.types.is_integer_dtype(ser.dtype):
+        if ser.hasnans:
+            return ser.astype(object).where(ser.notna(), None).tolist()
+        return ser.tolist()
+    if pd.api.types.is_float_dtype(ser.dtype):
+        valores = ser.to_numpy(dtype=object)
+        valores[~np.isfinite(ser.to_numpy(dtype=float))] = None
+        return valores.tolist()
+    return [_celda(v) for v in ser.astype(object).where(ser.notna(), None)]
+
+
+def _ancho(titulo, ser):
+    if pd.api.types.is_datetime64_dtype(ser.dtype):
+        largo = ANCHO_FECHA
+    else:
+        muestra = ser.head(MUESTRA_ANCHOS).dropna()
+        largo = int(muestra.astype(str).str.len().max()) if not muestra.empty else 0
+    return min(max(largo, len(str(titulo)), ANCHO_MINIMO) + 2, ANCHO_MAXIMO)
 
-        except Exception:
-            # Ignorar errores sin romper el proceso (seguro)
-            pass
 
-    return df
+# --------------------------------------------------------
+# Escritura
+# --------------------------------------------------------
+def escribir_hoja(wb, titulo, df, mensaje_vacio=None):
+    """Añade a `wb` (modo write-only) una hoja con `df` escrito por bloques."""
+    ws = wb.create_sheet(title=titulo[:31])
+    if df is None or df.empty:
+        df = pd.DataFrame([{"mensaje": mensaje_vacio or "Sin datos"}])
+
+    df = normalizar(df)
+    columnas = {col: df[col] for col in df.columns}
+    for indice, (col, ser) in enumerate(columnas.items(), start=1):
+        ws.column_dimensions[get_column_letter(indice)].width = _ancho(col, ser)
+    ws.freeze_panes = "A2"
+
+    encabezado = []
+    for col in columnas:
+        celda = WriteOnlyCell(ws, value=str(col))
+        celda.fill = _RELLENO_ENCABEZADO
+        celda.font = _FUENTE_ENCABEZADO
+        celda.alignment = _ALINEACION_ENCABEZADO
+        encabezado.append(celda)
+    ws.append(encabezado)
+
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        bloque = [_valores(ser.iloc[inicio:inicio + FILAS_POR_BLOQUE]) for ser in columnas.values()]
+        for fila in zip(*bloque):
+            ws.append(fila)
+    return ws
+
+
+def exportar_hojas(destino, hojas):
+    """Escribe `{titulo: df}` en `destino` (ruta o archivo binario) y lo devuelve.
+
+    Un valor puede ser `(df, mensaje_vacio)` para rotular las hojas vacías.
+    """
+    wb = Workbook(write_only=True)
+    for titulo, contenido in hojas.items():
+        df, mensaje_vacio = contenido if isinstance(contenido, tuple) else (contenido, None)
+        escribir_hoja(wb, titulo, df, mensaje_vacio)
+    if not wb.worksheets:
+        escribir_hoja(wb, "Reporte SST", None)
+    wb.save(destino)
+    return destino
+
+
+def excel_temporal(hojas):
+    """Ruta (`Path`) de un .xlsx temporal con las hojas; el llamador lo mueve o borra.
+
+    Si la exportación falla, el temporal se borra antes de propagar el error.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as archivo:
+        ruta = Path(archivo.name)
+        try:
+            exportar_hojas(archivo, hojas)
+        except BaseException:
+            archivo.close()
+            ruta.unlink(missing_ok=True)
+            raise
+    return ruta
 
 
 # --------------------------------------------------------
@@ -53,76 +147,83 @@ def generar_reporte_mensual_excel(nombre_archivo, resumen: dict,
                                   df_epp: pd.DataFrame,
                                   df_cap: pd.DataFrame,
                                   by_area: pd.DataFrame = None):
-    with pd.ExcelWriter(nombre_archivo, engine="openpyxl") as writer:
-
-        # Resumen
-        df_res = pd.DataFrame(list(resumen.items()), columns=["Métrica", "Valor"])
-        df_res.to_excel(writer, sheet_name="Resumen", index=False)
-
-        # Incidentes
-        if df_inc is None or df_inc.empty:
-            pd.DataFrame([{"mensaje": "No hay incidentes"}]).to_excel(
-                writer, sheet_name="Incidentes", index=False)
-        else:
-            df_inc = _ensure_naive_datetimes(df_inc.copy())
-            df_inc.to_excel(writer, sheet_name="Incidentes", index=False)
-
-        # EPP
-        if df_epp is None or df_epp.empty:
-            pd.DataFrame([{"mensaje": "No hay registros EPP"}]).to_excel(
-                writer, sheet_name="EPP", index=False)
-        else:
-            df_epp = _ensure_naive_datetimes(df_epp.copy())
-            df_epp.to_excel(writer, sheet_name="EPP", index=False)
-
-        # Capacitaciones
-        if df_cap is None or df_cap.empty:
-            pd.DataFrame([{"mensaje": "No hay capacitaciones"}]).to_excel(
-                writer, sheet_name="Capacitaciones", index=False)
-        else:
-            df_cap = _ensure_naive_datetimes(df_cap.copy())
-            df_cap.to_excel(writer, sheet_name="Capacitaciones", index=False)
-
-        # Incidentes por área (agrupado)
-        if by_area is None or by_area.empty:
-            pd.DataFrame([{"mensaje": "Sin datos por área"}]).to_excel(
-                writer, sheet_name="Incidentes_por_area", index=False)
-        else:
-            by_area = _ensure_naive_datetimes(by_area.copy())
-            by_area.to_excel(writer, sheet_name="Incidentes_por_area", index=False)
-
-    return nombre_archivo
+    df_res = pd.DataFrame(list(resumen.items()), columns=["Métrica", "Valor"])
+    return exportar_hojas(nombre_archivo, {
+        "Resumen": df_res,
+        "Incidentes": (normalizar(df_inc, "incidentes"), "No hay incidentes"),
+        "EPP": (normalizar(df_epp, "epp"), "No hay registros EPP"),
+        "Capacitaciones": (normalizar(df_cap, "capacitaciones"), "No hay capacitaciones"),
+        "Incidentes_por_area": (by_area, "Sin datos por área"),
+    })
 
 
 # --------------------------------------------------------
 # Exportación simple a Excel (una sola hoja)
 # --------------------------------------------------------
 def exportar_excel(nombre_archivo, df: pd.DataFrame):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reporte SST"
-
-    # Estilos
-    header_fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
-    header_font = Font(bold=True)
-    align_center = Alignment(horizontal="center", vertical="center")
-
-    # Encabezados
-    for col, columna in enumerate(df.columns, start=1):
-        c = ws.cell(row=1, column=col, value=columna)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = align_center
-
-    # Filas
-    for row_idx, fila in df.iterrows():
-        for col_idx, valor in enumerate(fila, start=1):
-            ws.cell(row=row_idx + 2, column=col_idx, value=str(valor))
-
-    # Ajustar ancho columnas
-    for col in ws.columns:
-        max_len = max(len(str(cell.value)) for cell in col)
-        ws.column_dimensions[get_column_letter(col[0].column)].width = max_len + 4
-
-    wb.save(nombre_archivo)
-    return nombre_archivo
+    return exportar_hojas(nombre_archivo, {"Reporte SST": df})
+
+
+# --------------------------------------------------------
+# Benchmark
+# --------------------------------------------------------
+def _datos_prueba(filas):
+    """Entregas de EPP sintéticas con los tipos que devuelve Supabase."""
+    rng = np.random.default_rng(0)
+    inicio = pd.Timestamp("2025-01-01", tz="UTC")
+    creado = inicio + pd.to_timedelta(rng.integers(0, 365 * 86400, filas), unit="s")
+    costo = rng.uniform(5, 300, filas).round(2)
+    costo[rng.random(filas) < 0.05] = np.nan
+    return pd.DataFrame({
+        "id": np.arange(1, filas + 1),
+        "trabajador": rng.choice(["Ana Quispe", "Luis Mamani", "Rosa Huamán", "Jorge Flores"], filas),
+        "tipo_epp": rng.choice(["Casco", "Guantes", "Lentes", "Botas", "Arnés"], filas),
+        "cantidad": rng.integers(1, 10, filas),
+        "costo": costo,
+        "fecha_entrega": creado.strftime("%Y-%m-%d"),
+        "created_at": creado.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00"),
+    })
+
+
+def _exportar_pandas(destino, df):
+    """Ruta anterior: DataFrame completo en memoria vía pd.ExcelWriter."""
+    with pd.ExcelWriter(destino, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Reporte SST", index=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="Benchmark de exportación a Excel")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--comparar", action="store_true",
+                        help="mide también pd.ExcelWriter (hasta 100k filas)")
+    parser.add_argument("--memoria", action="store_true",
+                        help="pico de memoria con tracemalloc (más lento)")
+    args = parser.parse_args()
+
+    motores = [("streaming", exportar_excel)]
+    if args.comparar:
+        motores.append(("pandas", _exportar_pandas))
+
+    for filas in args.filas:
+        df = _datos_prueba(filas)
+        for nombre, funcion in motores:
+            if nombre == "pandas" and filas > 100_000:
+                continue
+            with tempfile.TemporaryDirectory() as carpeta:
+                destino = os.path.join(carpeta, "bench.xlsx")
+                if args.memoria:
+                    tracemalloc.start()
+                inicio = time.perf_counter()
+                funcion(destino, df)
+                segundos = time.perf_counter() - inicio
+                pico = tracemalloc.get_traced_memory()[1] / 2**20 if args.memoria else None
+                tracemalloc.stop()
+                tamano = os.path.getsize(destino) / 2**20
+            memoria = f"  pico {pico:7.1f} MB" if pico is not None else ""
+            print(f"{filas:>9,} filas  {nombre:<9} {segundos:7.2f} s  {filas / segundos:9,.0f} filas/s  "
+                  f"{tamano:6.1f} MB{memoria}")
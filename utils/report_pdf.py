@@ -1,17 +1,219 @@
 # utils/report_pdf.py
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+"""
+Exportación a PDF.
+
+`tabla_pdf(df, ancho)` es el motor de tablas: devuelve una lista de
+flowables que cubre el DataFrame completo, sin truncar.
+- Las filas se parten en bloques de `FILAS_POR_BLOQUE`; cada bloque es una
+  `Table` que se construye al maquetarse y se libera al dibujarse, así un
+  anexo de 20k filas no mantiene en memoria todas las celdas.
+- Los anchos de columna salen de medir con `stringWidth` una muestra de
+  `MUESTRA_ANCHOS` filas y repartir el ancho de la página.
+- Solo las celdas que no caben en su columna se parten en líneas
+  (`simpleSplit`); quedan como texto plano multilínea, que ReportLab maqueta
+  mucho más rápido que un `Paragraph` por celda.
+
+Con `tiempos={}` las funciones de reporte anotan los segundos de maquetación
+de cada sección.
+
+Benchmark (anexo de N filas):
+
+    python -m utils.report_pdf [--filas 20000]
+"""
+import logging
+import time
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.lib.utils import simpleSplit
+from reportlab.platypus import Flowable, SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
+from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.styles import getSampleStyleSheet
+import numpy as np
 import pandas as pd
-from reportlab.platypus import Image as RLImage
 import tempfile
 import os
 from reportlab.lib.units import mm
 
-def exportar_pdf(nombre_archivo, titulo, df: pd.DataFrame):
+from utils.esquemas import formatear_valor, normalizar
+from utils.graficos import imagen_pdf
+
+logger = logging.getLogger(__name__)
+
+# ~1 página por bloque: partir una tabla larga entre páginas vuelve a medir todo lo que queda
+FILAS_POR_BLOQUE = 40
+MUESTRA_ANCHOS = 200
+FUENTE = "Helvetica"
+FUENTE_ENCABEZADO = "Helvetica-Bold"
+TAMANO_FUENTE = 8
+# LEFTPADDING + RIGHTPADDING por defecto de Table
+RELLENO_HORIZONTAL = 12
+ANCHO_MINIMO_COLUMNA = 30
+
+_ESTILO_TABLA = TableStyle([
+    ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#003566")),
+    ("TEXTCOLOR", (0,0), (-1,0), colors.white),
+    ("FONTNAME", (0,0), (-1,0), FUENTE_ENCABEZADO),
+    ("ALIGN", (0,0), (-1,-1), "LEFT"),
+    ("VALIGN", (0,0), (-1,-1), "TOP"),
+    ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
+    ("FONTSIZE", (0,0), (-1, -1), TAMANO_FUENTE),
+    ("BOTTOMPADDING", (0,0), (-1, -1), 4),
+])
+
+
+# --------------------------------------------------------
+# Motor de tablas
+# --------------------------------------------------------
+class _TablaDiferida(Flowable):
+    """Bloque de filas cuya `Table` se arma al maquetar y se suelta al dibujar."""
+
+    def __init__(self, construir):
+        super().__init__()
+        self._construir = construir
+        self._tabla = None
+
+    def _obtener(self):
+        if self._tabla is None:
+            self._tabla = self._construir()
+        return self._tabla
+
+    def wrap(self, availWidth, availHeight):
+        self.width, self.height = self._obtener().wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        # Las partes son `Table` normales; este bloque desaparece del documento
+        partes = self._obtener().split(availWidth, availHeight)
+        if partes:
+            self._tabla = None
+        return partes
+
+    def draw(self):
+        self._obtener().drawOn(self.canv, 0, 0)
+        self._tabla = None
+
+
+class _Marca(Flowable):
+    """Flowable vacío que anota el instante en que se maqueta."""
+
+    def __init__(self, funcion):
+        super().__init__()
+        self._funcion = funcion
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        self._funcion()
+
+
+def _muestra(df):
+    if len(df) <= MUESTRA_ANCHOS:
+        return df
+    # Filas repartidas por toda la tabla, no solo las primeras
+    return df.iloc[np.linspace(0, len(df) - 1, MUESTRA_ANCHOS).astype(int)]
+
+
+def _anchos_naturales(df):
+    """Ancho (pt) que ocuparía cada columna sin envolver, medido en una muestra."""
+    columnas = [str(c) for c in df.columns]
+    naturales = [stringWidth(c, FUENTE_ENCABEZADO, TAMANO_FUENTE) for c in columnas]
+    for fila in _muestra(df).itertuples(index=False):
+        for i, valor in enumerate(fila):
+            ancho = max((stringWidth(linea, FUENTE, TAMANO_FUENTE)
+                         for linea in formatear_valor(valor).split("\n")), default=0)
+            if ancho > naturales[i]:
+                naturales[i] = ancho
+    return [max(n + RELLENO_HORIZONTAL, ANCHO_MINIMO_COLUMNA) for n in naturales]
+
+
+def anchos_columnas(df, ancho_total):
+    """Anchos (pt) según el texto medido en una muestra, ajustados a `ancho_total`."""
+    naturales = _anchos_naturales(df)
+    if sum(naturales) <= ancho_total:
+        # Sobra espacio: se reparte en proporción
+        escala = ancho_total / sum(naturales)
+        return [n * escala for n in naturales]
+
+    # Falta espacio: las columnas angostas conservan su ancho y las anchas se reparten el resto
+    anchos = [None] * len(naturales)
+    pendientes = list(range(len(naturales)))
+    disponible = ancho_total
+    while pendientes:
+        justo = disponible / len(pendientes)
+        angostas = [i for i in pendientes if naturales[i] <= justo]
+        if not angostas:
+            for i in pendientes:
+                anchos[i] = justo
+            break
+        for i in angostas:
+            anchos[i] = naturales[i]
+            disponible -= naturales[i]
+        pendientes = [i for i in pendientes if i not in angostas]
+    return anchos
+
+
+def _celdas(valores, anchos, fuente):
+    """Textos de una fila; los que no caben en su columna se parten en líneas."""
+    celdas = []
+    for texto, ancho in zip(valores, anchos):
+        util = ancho - RELLENO_HORIZONTAL
+        # Con menos caracteres que `util / tamaño` ningún texto puede desbordar
+        if len(texto) * TAMANO_FUENTE > util and stringWidth(texto, fuente, TAMANO_FUENTE) > util:
+            texto = "\n".join(simpleSplit(texto, fuente, TAMANO_FUENTE, util))
+        celdas.append(texto)
+    return celdas
+
+
+def tabla_pdf(df, ancho_total, max_filas=None):
+    """Flowables con `df` completo (o sus primeras `max_filas`) en bloques de tabla."""
+    df = normalizar(df)
+    if max_filas is not None:
+        df = df.head(max_filas)
+    anchos = anchos_columnas(df, ancho_total)
+    encabezado = _celdas([str(c) for c in df.columns], anchos, FUENTE_ENCABEZADO)
+
+    def construir(inicio):
+        filas = [encabezado]
+        for fila in df.iloc[inicio:inicio + FILAS_POR_BLOQUE].itertuples(index=False):
+            filas.append(_celdas([formatear_valor(v) for v in fila], anchos, FUENTE))
+        tabla = Table(filas, colWidths=anchos, repeatRows=1)
+        tabla.setStyle(_ESTILO_TABLA)
+        return tabla
+
+    return [_TablaDiferida(lambda inicio=inicio: construir(inicio))
+            for inicio in range(0, max(len(df), 1), FILAS_POR_BLOQUE)]
+
+
+def seccion_medida(nombre, flowables, tiempos):
+    """Rodea `flowables` de marcas que anotan en `tiempos[nombre]` su maquetación."""
+    if tiempos is None:
+        return flowables
+    inicio = {}
+
+    def abrir():
+        inicio['t'] = time.perf_counter()
+
+    def cerrar():
+        tiempos[nombre] = tiempos.get(nombre, 0) + time.perf_counter() - inicio['t']
+        logger.info("Sección PDF '%s': %.2f s", nombre, tiempos[nombre])
+
+    return [_Marca(abrir), *flowables, _Marca(cerrar)]
+
+
+# --------------------------------------------------------
+# Reportes
+# --------------------------------------------------------
+def exportar_pdf(nombre_archivo, titulo, df: pd.DataFrame, tiempos=None):
     styles = getSampleStyleSheet()
-    doc = SimpleDocTemplate(nombre_archivo, pagesize=A4)
+    # Tablas más anchas que A4 vertical se imprimen en horizontal
+    margen = 25
+    df = normalizar(df)
+    pagina = A4
+    if sum(_anchos_naturales(df)) > A4[0] - 2 * margen:
+        pagina = landscape(A4)
+    doc = SimpleDocTemplate(nombre_archivo, pagesize=pagina, leftMargin=margen, rightMargin=margen)
 
     elementos = []
 
@@ -19,21 +221,7 @@ def exportar_pdf(nombre_archivo, titulo, df: pd.DataFrame):
     elementos.append(Paragraph(f"<b>{titulo}</b>", styles["Title"]))
     elementos.append(Spacer(1, 20))
 
-    # Convertir df a tabla
-    data = [df.columns.tolist()] + df.values.tolist()
-
-    tabla = Table(data)
-    tabla.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#003566")),
-        ("TEXTCOLOR", (0,0), (-1,0), colors.white),
-        ("ALIGN", (0,0), (-1,-1), "CENTER"),
-        ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTSIZE", (0,0), (-1,0), 10),
-        ("BOTTOMPADDING", (0,0), (-1,0), 6)
-    ]))
-
-    elementos.append(tabla)
+    elementos.extend(seccion_medida(titulo, tabla_pdf(df, pagina[0] - 2 * margen), tiempos))
 
     elementos.append(Spacer(1, 30))
     elementos.append(
@@ -48,45 +236,40 @@ def exportar_pdf(nombre_archivo, titulo, df: pd.DataFrame):
     return nombre_archivo
 
 
-def generar_reporte_mensual_pdf(nombre_archivo, resumen: dict, df_inc: pd.DataFrame, df_epp: pd.DataFrame, df_cap: pd.DataFrame, by_area: pd.DataFrame = None):
+def generar_reporte_mensual_pdf(nombre_archivo, resumen: dict, df_inc: pd.DataFrame, df_epp: pd.DataFrame, df_cap: pd.DataFrame, by_area: pd.DataFrame = None,
+                                anexos: dict = None, tiempos: dict = None, graficos: list = None):
     """Genera un PDF consolidado mensual con métricas y tablas principales.
 
     - `resumen` es un dict con claves como 'total_inc', 'total_cap', 'total_epp'.
     - `df_inc`, `df_epp`, `df_cap` son DataFrame (pueden estar vacíos).
     - `by_area` es un DataFrame opcional con conteos por área.
+    - `graficos` es una lista opcional de imágenes PNG (bytes, p. ej. de
+      `utils.graficos.renderizar_varios`) o flowables (`grafico_pdf`) que se
+      insertan tras el resumen.
+    - `anexos` es un dict opcional `{titulo: df}` que se imprime completo al final.
+    - `tiempos`, si se pasa un dict, recibe los segundos de cada sección.
     """
+    # Tipos de columna declarados (mismos DataFrames que el Excel mensual)
+    df_inc = normalizar(df_inc, "incidentes")
+    df_epp = normalizar(df_epp, "epp")
+    df_cap = normalizar(df_cap, "capacitaciones")
+
     styles = getSampleStyleSheet()
     left_margin = 25
     right_margin = 25
     top_margin = 25
     bottom_margin = 25
     doc = SimpleDocTemplate(nombre_archivo, pagesize=A4, leftMargin=left_margin, rightMargin=right_margin, topMargin=top_margin, bottomMargin=bottom_margin)
+    page_width = A4[0] - left_margin - right_margin
     elementos = []
 
-    # helper: create table with reasonable column widths and left alignment
-    def make_table_from_df(df_table, max_rows=100):
-        cols = df_table.columns.tolist()
-        data = [cols]
-        for _, row in df_table.head(max_rows).iterrows():
-            data.append([str(row.get(c, "")) for c in cols])
-
-        # compute approximate column widths
-        page_width = A4[0] - left_margin - right_margin
-        col_count = max(1, len(cols))
-        col_width = page_width / col_count
-        col_widths = [col_width] * col_count
-
-        tabla = Table(data, colWidths=col_widths, repeatRows=1)
-        tabla.setStyle(TableStyle([
-            ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#003566")),
-            ("TEXTCOLOR", (0,0), (-1,0), colors.white),
-            ("ALIGN", (0,0), (-1,-1), "LEFT"),
-            ("VALIGN", (0,0), (-1,-1), "TOP"),
-            ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
-            ("FONTSIZE", (0,0), (-1, -1), 8),
-            ("BOTTOMPADDING", (0,0), (-1, -1), 4),
-        ]))
-        return tabla
+    def agregar_tabla(nombre, titulo, df_table, vacio, max_rows=None):
+        elementos.append(Paragraph(f"<b>{titulo}</b>", styles["Heading3"]))
+        if df_table is None or df_table.empty:
+            elementos.append(Paragraph(vacio, styles["Normal"]))
+        else:
+            elementos.extend(seccion_medida(nombre, tabla_pdf(df_table, page_width, max_rows), tiempos))
+        elementos.append(Spacer(1, 12))
 
     # Título
     elementos.append(Paragraph("<b>Reporte Mensual SST</b>", styles["Title"]))
@@ -98,58 +281,60 @@ def generar_reporte_mensual_pdf(nombre_archivo, resumen: dict, df_inc: pd.DataFr
         elementos.append(Paragraph(f"<b>{k}:</b> {v}", styles["Normal"]))
     elementos.append(Spacer(1, 12))
 
-    # Insertar gráficas si existen imágenes en /tmp (previamente generadas)
-    tmpdir = tempfile.gettempdir()
-    # look for files named report_chart_*.png in temp dir created by caller
-    chart_files = [os.path.join(tmpdir, f) for f in os.listdir(tmpdir) if f.startswith("report_chart_") and f.endswith(".png")]
-    for cf in sorted(chart_files):
-        try:
-            elementos.append(RLImage(cf, width=170*mm))
-            elementos.append(Spacer(1, 6))
-        except (OSError, IOError):
-            pass
+    # Gráficas recibidas en memoria (no se busca nada en el directorio temporal)
+    for grafico in graficos or []:
+        elementos.append(imagen_pdf(grafico, 170*mm) if isinstance(grafico, bytes) else grafico)
+        elementos.append(Spacer(1, 6))
 
     elementos.append(Spacer(1, 8))
 
-    # Incidentes (tabla resumida)
-    elementos.append(Paragraph("<b>Incidentes (resumen)</b>", styles["Heading3"]))
-    if df_inc is None or df_inc.empty:
-        elementos.append(Paragraph("No hay incidentes registrados.", styles["Normal"]))
-    else:
-        elementos.append(make_table_from_df(df_inc, max_rows=100))
-    elementos.append(Spacer(1, 12))
+    # Tablas resumidas
+    agregar_tabla("incidentes", "Incidentes (resumen)", df_inc, "No hay incidentes registrados.", max_rows=100)
+    agregar_tabla("epp", "EPP por vencer (resumen)", df_epp, "No hay registros de EPP.", max_rows=50)
+    agregar_tabla("capacitaciones", "Capacitaciones (resumen)", df_cap, "No hay capacitaciones registradas.", max_rows=50)
+    agregar_tabla("por_area", "Incidentes por área", by_area, "No hay datos por área.", max_rows=200)
 
-    # EPP por vencer (resumido)
-    elementos.append(Paragraph("<b>EPP por vencer (resumen)</b>", styles["Heading3"]))
-    if df_epp is None or df_epp.empty:
-        elementos.append(Paragraph("No hay registros de EPP.", styles["Normal"]))
-    else:
-        elementos.append(make_table_from_df(df_epp, max_rows=50))
-    elementos.append(Spacer(1, 12))
+    # Anexos completos, cada uno desde una página nueva
+    for titulo, df_anexo in (anexos or {}).items():
+        elementos.append(PageBreak())
+        agregar_tabla(f"anexo:{titulo}", f"Anexo: {titulo}", df_anexo, "Sin registros.")
 
-    # Capacitaciones del mes
-    elementos.append(Paragraph("<b>Capacitaciones (resumen)</b>", styles["Heading3"]))
-    if df_cap is None or df_cap.empty:
-        elementos.append(Paragraph("No hay capacitaciones registradas.", styles["Normal"]))
-    else:
-        elementos.append(make_table_from_df(df_cap, max_rows=50))
-    elementos.append(Spacer(1, 12))
+    doc.build(elementos)
+    return nombre_archivo
 
-    # Incidentes por área
-    elementos.append(Paragraph("<b>Incidentes por área</b>", styles["Heading3"]))
-    if by_area is None or by_area.empty:
-        elementos.append(Paragraph("No hay datos por área.", styles["Normal"]))
-    else:
-        elementos.append(make_table_from_df(by_area, max_rows=200))
 
-    # build and cleanup temporary chart files
-    doc.build(elementos)
+# --------------------------------------------------------
+# Benchmark
+# --------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+    import tracemalloc
 
-    # try to remove temp chart files created earlier
-    for cf in chart_files:
-        try:
-            os.remove(cf)
-        except OSError:
-            pass
+    from utils.report_excel import _datos_prueba
 
-    return nombre_archivo
+    parser = argparse.ArgumentParser(description="Benchmark del motor de tablas PDF")
+    parser.add_argument("--filas", type=int, nargs="+", default=[20_000])
+    parser.add_argument("--memoria", action="store_true",
+                        help="pico de memoria con tracemalloc (más lento)")
+    args = parser.parse_args()
+
+    for filas in args.filas:
+        df = _datos_prueba(filas)
+        df["observaciones"] = "Entrega registrada en almacén central; el trabajador firmó el cargo " \
+                              "y recibió la inducción de uso correcto del equipo."
+        tiempos = {}
+        with tempfile.TemporaryDirectory() as carpeta:
+            destino = os.path.join(carpeta, "anexo.pdf")
+            if args.memoria:
+                tracemalloc.start()
+            inicio = time.perf_counter()
+            generar_reporte_mensual_pdf(destino, {"Entregas": filas}, df.head(100), df.head(50), None,
+                                        anexos={"Entregas de EPP": df}, tiempos=tiempos)
+            segundos = time.perf_counter() - inicio
+            pico = tracemalloc.get_traced_memory()[1] / 2**20 if args.memoria else None
+            tracemalloc.stop()
+            tamano = os.path.getsize(destino) / 2**20
+        memoria = f"  pico {pico:.1f} MB" if pico is not None else ""
+        print(f"{filas:>7,} filas  {segundos:6.2f} s  {tamano:5.1f} MB{memoria}")
+        for nombre, segundos_seccion in tiempos.items():
+            print(f"    {nombre:<28} {segundos_seccion:6.2f} s")
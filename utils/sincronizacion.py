@@ -0,0 +1,301 @@
+# utils/sincronizacion.py
+"""
+Sincronización incremental de tablas por `updated_at`.
+
+`sincronizar(tabla, columnas, filtros)` mantiene en el proceso una copia
+(DataFrame) de cada porción de tabla pedida. La primera llamada la descarga
+completa; las siguientes solo piden las filas con `updated_at` posterior a la
+marca de agua (con un pequeño solape para transacciones que confirman tarde),
+sin el filtro de la porción: los filtros se evalúan aquí, así una fila que
+sale de la ventana también se retira de la copia.
+
+Borrados: la tabla `registros_eliminados` (triggers de la migración
+`20261017000800_updated_at.sql`) actúa como lápida; además cada
+`RECONCILIACION` segundos se comparan los ids de la porción con el servidor.
+
+Si la tabla aún no tiene `updated_at`, se usa `consultar` como siempre.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import pandas as pd
+
+from utils.data_access import (TTL_POR_DEFECTO, TTL_POR_TABLA, consultar,
+                               consultar_pagina, estadisticas_cache)
+
+logger = logging.getLogger(__name__)
+
+COLUMNA_MARCA = 'updated_at'
+TAMANO_PAGINA = 1000
+# Se vuelve a pedir este margen antes de la marca de agua (la fusión es idempotente)
+SOLAPE = timedelta(seconds=5)
+RECONCILIACION = 900
+MAX_COPIAS = 64
+# Tras un fallo por falta de `updated_at`, no se reintenta hasta pasado este tiempo
+REINTENTO = 300
+
+OPERADORES_LOCALES = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+}
+
+_lock = threading.Lock()
+_copias = OrderedDict()     # clave -> _Copia
+_sin_soporte = {}           # tabla -> instante del último fallo
+_stats = {'completas': 0, 'incrementales': 0, 'filas_recibidas': 0, 'eliminadas': 0}
+
+
+class _Copia:
+    """Porción de una tabla con su marca de agua."""
+
+    def __init__(self, columnas, filtros):
+        self.lock = threading.Lock()
+        self.columnas = columnas
+        self.filtros = filtros
+        self.df = None
+        self.marca = None              # mayor updated_at visto (str ISO)
+        self.marca_eliminados = None
+        self.sincronizado_en = 0.0
+        self.reconciliado_en = 0.0
+        self.invalidaciones = 0
+
+
+def _valor_comparable(valor):
+    """Fechas ISO como Timestamp (sin zona) para comparar como lo haría Postgres."""
+    if hasattr(valor, 'isoformat'):
+        valor = valor.isoformat()
+    if isinstance(valor, str) and len(valor) >= 10 and valor[4] == '-' and valor[7] == '-':
+        try:
+            marca = pd.Timestamp(valor)
+            return marca.tz_convert(None) if marca.tzinfo else marca
+        except ValueError:
+            return valor
+    return valor
+
+
+def _cumple(fila, filtros):
+    for operador, columna, valor in filtros:
+        actual = fila.get(columna)
+        if operador == 'in_':
+            if actual not in valor:
+                return False
+            continue
+        if actual is None:
+            return False
+        try:
+            if not OPERADORES_LOCALES[operador](_valor_comparable(actual), _valor_comparable(valor)):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def _soporta(filtros):
+    return all(op in OPERADORES_LOCALES or op == 'in_' for op, _, _ in filtros)
+
+
+def _columnas_sync(columnas, filtros):
+    if columnas == '*':
+        return '*'
+    pedidas = [c.strip() for c in columnas.split(',') if c.strip()]
+    extra = ['id', COLUMNA_MARCA] + [c for _, c, _ in filtros]
+    return ','.join(dict.fromkeys(pedidas + extra))
+
+
+def _descargar_paginas(tabla, columnas, filtros, claves):
+    """Todas las filas que cumplen `filtros`, por páginas keyset sobre `claves`.
+
+    PostgREST corta las respuestas en `max-rows` (1000 por defecto): una
+    consulta sin paginar devolvería solo una parte.
+    """
+    filas, cursor = [], None
+    while True:
+        pagina, cursor = consultar_pagina(tabla, columnas, filtros=filtros,
+                                          claves=claves, cursor=cursor,
+                                          tamano=TAMANO_PAGINA, desc=False, ttl=0)
+        filas.extend(pagina)
+        if cursor is None:
+            return filas
+
+
+def _descargar_desde(tabla, columnas, filtros, marca):
+    """Filas con updated_at >= marca (todas si marca es None), por páginas keyset."""
+    filtros = list(filtros)
+    if marca is not None:
+        filtros.append(('gte', COLUMNA_MARCA, marca))
+    return _descargar_paginas(tabla, columnas, filtros, (COLUMNA_MARCA, 'id'))
+
+
+def _restar_solape(marca):
+    return (pd.Timestamp(marca) - SOLAPE).isoformat()
+
+
+def _eliminados_desde(tabla, marca):
+    """Ids borrados desde `marca` según las lápidas (None si la tabla no existe)
+    y el mayor `eliminado_en` recibido (None si no llegó ninguna)."""
+    filtros = [('eq', 'tabla', tabla)]
+    if marca is not None:
+        filtros.append(('gte', 'eliminado_en', marca))
+    try:
+        filas = _descargar_paginas('registros_eliminados', 'id,registro_id,eliminado_en',
+                                   filtros, ('eliminado_en', 'id'))
+    except Exception as e:
+        logger.warning("Lápidas no disponibles para %s: %s", tabla, e)
+        return None, None
+    nueva_marca = max((f['eliminado_en'] for f in filas), default=None)
+    return {str(f['registro_id']) for f in filas}, nueva_marca
+
+
+def _quitar(df, ids):
+    if not ids or df.empty:
+        return df, 0
+    mascara = df['id'].astype(str).isin(ids)
+    return df[~mascara], int(mascara.sum())
+
+
+def _ultimo_valor(tabla, columna, filtros=None):
+    """Mayor valor de `columna` en el servidor (None si no hay filas)."""
+    filas = consultar(tabla, columna, filtros=filtros, orden=(columna, True), limite=1, ttl=0)
+    return filas[0][columna] if filas else None
+
+
+def _ultima_lapida(tabla):
+    try:
+        return _ultimo_valor('registros_eliminados', 'eliminado_en', [('eq', 'tabla', tabla)])
+    except Exception as e:
+        logger.warning("Lápidas no disponibles para %s: %s", tabla, e)
+        return None
+
+
+def _carga_completa(copia, tabla, columnas, filtros):
+    # Las marcas salen del reloj de Postgres (nunca del de la app) y se leen antes
+    # de la descarga para no perder cambios ni borrados concurrentes. Sin filas
+    # quedan en None y la pasada siguiente lee todo.
+    marca_tabla = _ultimo_valor(tabla, COLUMNA_MARCA)
+    marca_eliminados = _ultima_lapida(tabla)
+    filas = _descargar_desde(tabla, columnas, filtros, None)
+    copia.df = pd.DataFrame(filas)
+    marcas = [m for m in [marca_tabla] + [f.get(COLUMNA_MARCA) for f in filas] if m]
+    copia.marca = max(marcas, key=pd.Timestamp) if marcas else None
+    copia.marca_eliminados = marca_eliminados
+    copia.reconciliado_en = time.monotonic()
+    _contar('completas', len(filas))
+
+
+def _carga_incremental(copia, tabla, columnas, filtros):
+    desde = _restar_solape(copia.marca) if copia.marca else None
+    # Sin el filtro de la porción: las filas que salen de ella también llegan
+    cambios = _descargar_desde(tabla, columnas, [], desde)
+    marcas = [m for m in [copia.marca] + [f.get(COLUMNA_MARCA) for f in cambios] if m]
+    if marcas:
+        copia.marca = max(marcas, key=pd.Timestamp)
+    df, _ = _quitar(copia.df, {str(f['id']) for f in cambios})
+    nuevas = [f for f in cambios if _cumple(f, filtros)]
+    if nuevas:
+        df = pd.concat([df, pd.DataFrame(nuevas)], ignore_index=True)
+
+    desde_eliminados = _restar_solape(copia.marca_eliminados) if copia.marca_eliminados else None
+    eliminados, marca_eliminados = _eliminados_desde(tabla, desde_eliminados)
+    # Sin lápidas nuevas se conserva la marca (la consulta ya restó el solape)
+    if marca_eliminados is not None:
+        copia.marca_eliminados = max(filter(None, [copia.marca_eliminados, marca_eliminados]),
+                                     key=pd.Timestamp)
+    if eliminados is None or time.monotonic() - copia.reconciliado_en > RECONCILIACION:
+        # Reconciliación: solo ids de la porción
+        vigentes = {str(f['id']) for f in _descargar_paginas(tabla, 'id', filtros, ('id',))}
+        eliminados = set(df['id'].astype(str)) - vigentes if not df.empty else set()
+        copia.reconciliado_en = time.monotonic()
+    df, quitadas = _quitar(df, eliminados)
+
+    copia.df = df.reset_index(drop=True)
+    _contar('incrementales', len(cambios), quitadas)
+
+
+def _contar(tipo, filas, eliminadas=0):
+    with _lock:
+        _stats[tipo] += 1
+        _stats['filas_recibidas'] += filas
+        _stats['eliminadas'] += eliminadas
+
+
+def _invalidaciones(tabla):
+    return estadisticas_cache()['por_tabla'].get(tabla, {}).get('invalidaciones', 0)
+
+
+def sincronizar(tabla, columnas='*', filtros=None, refrescar=False):
+    """DataFrame de la porción `filtros` de `tabla`, al día con el servidor.
+
+    Sin `refrescar`, la copia se reutiliza durante el TTL de la tabla salvo que
+    se haya llamado a `invalidar(tabla)`. Los filtros admiten `eq`, `neq`,
+    `gt`, `gte`, `lt`, `lte` e `in_`; con otros se usa `consultar` directamente.
+    """
+    filtros = list(filtros or [])
+    fallo = _sin_soporte.get(tabla)
+    if not _soporta(filtros) or (fallo is not None and time.monotonic() - fallo < REINTENTO):
+        return pd.DataFrame(consultar(tabla, columnas, filtros=filtros))
+
+    columnas_sync = _columnas_sync(columnas, filtros)
+    clave = (tabla, columnas_sync, repr(filtros))
+    with _lock:
+        copia = _copias.get(clave)
+        if copia is None:
+            copia = _copias[clave] = _Copia(columnas_sync, filtros)
+        _copias.move_to_end(clave)
+        while len(_copias) > MAX_COPIAS:
+            _copias.popitem(last=False)
+
+    ttl = TTL_POR_TABLA.get(tabla, TTL_POR_DEFECTO)
+    with copia.lock:
+        invalidaciones = _invalidaciones(tabla)
+        vigente = (time.monotonic() - copia.sincronizado_en < ttl
+                   and invalidaciones == copia.invalidaciones)
+        if copia.df is None or refrescar or not vigente:
+            try:
+                if copia.df is None:
+                    _carga_completa(copia, tabla, columnas_sync, filtros)
+                else:
+                    _carga_incremental(copia, tabla, columnas_sync, filtros)
+            except Exception as e:
+                logger.warning("Sincronización incremental no disponible para %s: %s", tabla, e)
+                _sin_soporte[tabla] = time.monotonic()
+                with _lock:
+                    _copias.pop(clave, None)
+                return pd.DataFrame(consultar(tabla, columnas, filtros=filtros))
+            _sin_soporte.pop(tabla, None)
+            copia.sincronizado_en = time.monotonic()
+            copia.invalidaciones = invalidaciones
+        return copia.df.copy()
+
+
+def aplicar_cambio(tabla, registro, eliminado=False):
+    """Aplica en las copias de `tabla` un cambio recibido por tiempo real.
+
+    Se llama justo después de `invalidar(tabla)`: las copias quedan al día sin
+    volver a consultar el servidor hasta que venza su TTL.
+    """
+    with _lock:
+        copias = [copia for clave, copia in _copias.items() if clave[0] == tabla]
+    invalidaciones = _invalidaciones(tabla)
+    for copia in copias:
+        with copia.lock:
+            if copia.df is None:
+                continue
+            df, _ = _quitar(copia.df, {str(registro.get('id'))})
+            if not eliminado and _cumple(registro, copia.filtros):
+                fila = registro if copia.columnas == '*' else {c: registro.get(c) for c in copia.columnas.split(',')}
+                df = pd.concat([df, pd.DataFrame([fila])], ignore_index=True)
+            copia.df = df.reset_index(drop=True)
+            copia.invalidaciones = invalidaciones
+
+
+def estadisticas_sincronizacion():
+    """Cargas completas/incrementales, filas recibidas y eliminadas en este proceso."""
+    with _lock:
+        return dict(_stats, copias=len(_copias))
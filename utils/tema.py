@@ -0,0 +1,141 @@
+# utils/tema.py
+"""
+Hoja de estilos de la aplicación.
+
+Las hojas de `utils/estilos/` se concatenan y minifican una vez por proceso.
+Con `server.enableStaticServing` el paquete se escribe como
+`static/tema.<hash>.css` y cada rerun solo envía un `<link>` de ~80 bytes que
+el navegador guarda en caché; sin static serving se envía el CSS minificado
+inline (Streamlit descarta los elementos que un rerun no vuelve a emitir).
+
+Bytes emitidos por render (comparados con el marcado inline anterior):
+
+    python -m utils.tema
+
+`tests/test_tema.py` renderiza una página con `AppTest` y falla si el
+markdown emitido supera su presupuesto de bytes.
+"""
+import hashlib
+import html
+import re
+import threading
+from pathlib import Path
+
+DIRECTORIO_ESTILOS = Path(__file__).resolve().parent / "estilos"
+DIRECTORIO_ESTATICO = Path(__file__).resolve().parent.parent / "static"
+URL_ESTATICA = "app/static"
+
+HOJAS_TEMA = ("base.css", "login.css", "tarjetas.css")
+
+_lock = threading.Lock()
+_paquetes = {}   # hojas -> (css_minificado, huella)
+
+
+def minificar(css):
+    """Quita comentarios y espacios sobrantes."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+def construir_paquete(hojas=HOJAS_TEMA):
+    """(css, huella) de las hojas concatenadas y minificadas (memoizado)."""
+    hojas = tuple(hojas)
+    with _lock:
+        if hojas not in _paquetes:
+            css = minificar("\n".join(
+                (DIRECTORIO_ESTILOS / hoja).read_text(encoding="utf-8") for hoja in hojas
+            ))
+            huella = hashlib.sha256(css.encode("utf-8")).hexdigest()[:12]
+            _paquetes[hojas] = (css, huella)
+        return _paquetes[hojas]
+
+
+def _publicar(css, huella):
+    """Escribe `static/tema.<huella>.css` si no existe; devuelve su URL o None."""
+    destino = DIRECTORIO_ESTATICO / f"tema.{huella}.css"
+    try:
+        if not destino.exists():
+            DIRECTORIO_ESTATICO.mkdir(exist_ok=True)
+            temporal = destino.with_suffix(".tmp")
+            temporal.write_text(css, encoding="utf-8")
+            temporal.replace(destino)
+    except OSError:
+        return None
+    return f"{URL_ESTATICA}/{destino.name}"
+
+
+def _static_serving():
+    import streamlit as st
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+def marcado_tema(hojas=HOJAS_TEMA):
+    """HTML que hay que emitir en cada rerun para aplicar las hojas."""
+    css, huella = construir_paquete(hojas)
+    if _static_serving():
+        url = _publicar(css, huella)
+        if url:
+            return f'<link rel="stylesheet" href="{url}">'
+    return f"<style>{css}</style>"
+
+
+def aplicar_tema(hojas=HOJAS_TEMA):
+    """Inyecta las hojas en la página actual."""
+    import streamlit as st
+    st.markdown(marcado_tema(hojas), unsafe_allow_html=True)
+
+
+def tarjeta_kpi(titulo, valor, detalle, icono, tono="info"):
+    """Tarjeta KPI con clases del tema (tono: peligro, exito, aviso, info)."""
+    return (
+        '<div class="metric-card"><div class="kpi-contenido"><div>'
+        f'<p class="kpi-titulo">{html.escape(str(titulo))}</p>'
+        f'<h2 class="kpi-valor">{html.escape(str(valor))}</h2>'
+        f'<p class="kpi-detalle kpi-{tono}">{html.escape(str(detalle))}</p>'
+        f'</div><div class="kpi-icono">{icono}</div></div></div>'
+    )
+
+
+if __name__ == "__main__":
+    # Bytes de estilos que viajan por el websocket en cada render
+    fuente = len((DIRECTORIO_ESTILOS / "base.css").read_bytes())
+    css, huella = construir_paquete()
+    enlace = f'<link rel="stylesheet" href="{URL_ESTATICA}/tema.{huella}.css">'
+    tarjeta_inline = """
+            <div class="metric-card">
+                <div style="display: flex; justify-content: space-between; align-items: center;">
+                    <div>
+                        <p style="color: #6b7280; margin: 0; font-size: 0.875rem; font-weight: 600;">
+                            INCIDENTES TOTALES
+                        </p>
+                        <h2 style="margin: 0.5rem 0; color: #1f2937; font-size: 2.5rem; font-weight: 800;">
+                            128
+                        </h2>
+                        <p style="color: #ef4444; margin: 0; font-size: 0.75rem;">
+                            🔴 4 críticos
+                        </p>
+                    </div>
+                    <div style="font-size: 3rem;">🚨</div>
+                </div>
+            </div>
+        """
+    tarjeta = tarjeta_kpi("INCIDENTES TOTALES", 128, "🔴 4 críticos", "🚨", "peligro")
+
+    def medir(texto):
+        return len(texto.encode("utf-8"))
+
+    print(f"Estilos inline de app.py (antes): {fuente:>7} B")
+    print(f"Estilos minificados inline:       {medir(f'<style>{css}</style>'):>7} B")
+    print(f"Estilos por static serving:       {medir(enlace):>7} B")
+    print(f"4 tarjetas KPI inline (antes):    {4 * medir(tarjeta_inline):>7} B")
+    print(f"4 tarjetas KPI con clases:        {4 * medir(tarjeta):>7} B")
+    antes = fuente + 4 * medir(tarjeta_inline)
+    despues = medir(enlace) + 4 * medir(tarjeta)
+    print(f"Dashboard por rerun: {antes} B -> {despues} B ({100 * (1 - despues / antes):.0f}% menos)")
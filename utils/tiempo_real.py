@@ -0,0 +1,256 @@
+# utils/tiempo_real.py
+"""
+Eventos en tiempo real de `incidentes`, `inspecciones` y `notificaciones`.
+
+Un hilo por proceso mantiene un websocket con Supabase Realtime
+(`postgres_changes`) y, por cada cambio:
+- invalida la caché de la tabla y actualiza en el sitio las copias de
+  `utils.sincronizacion` (el dashboard no vuelve a consultar),
+- reparte el evento a la cola de cada sesión abierta.
+
+En cada sesión, `mostrar_alertas` es un fragmento que revisa su cola cada
+`TIEMPO_REAL_INTERVALO` segundos sin tocar la base de datos: muestra un toast
+y un contador para los eventos de riesgo alto, un toast para las
+notificaciones dirigidas al usuario de la sesión, y solo relanza la página si
+el evento afecta a lo que se está viendo.
+
+`TIEMPO_REAL=local` sustituye el websocket por una cola en memoria que
+alimentan `notificar_local` (flujos de escritura) y `publicar` (pruebas);
+`off` lo desactiva.
+"""
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from utils.data_access import invalidar
+from utils.sincronizacion import aplicar_cambio
+
+logger = logging.getLogger(__name__)
+
+MODO = os.getenv("TIEMPO_REAL", "supabase")
+INTERVALO = float(os.getenv("TIEMPO_REAL_INTERVALO", "3"))
+TABLAS = ('incidentes', 'inspecciones', 'notificaciones')
+UMBRAL_RIESGO_ALTO = 15
+LATIDO = 25
+MAX_EVENTOS_SESION = 100
+# Las colas de sesiones que no se consultan en este tiempo se descartan
+SESION_INACTIVA = 600
+
+_lock = threading.Lock()
+_sesiones = {}        # id -> [cola, último uso]
+_hilo = None
+_stats = {'recibidos': 0, 'conectado': False, 'reconexiones': 0}
+
+
+# ------------------------------------------------------------
+# Bus de eventos del proceso
+# ------------------------------------------------------------
+def publicar(tabla, tipo, registro, registro_anterior=None):
+    """Entrega un cambio (INSERT/UPDATE/DELETE) al proceso y a todas las sesiones."""
+    if tabla not in TABLAS:
+        return
+    eliminado = tipo == 'DELETE'
+    registro = (registro_anterior if eliminado else registro) or {}
+    invalidar(tabla)
+    if registro.get('id') is not None:
+        try:
+            aplicar_cambio(tabla, registro, eliminado=eliminado)
+        except Exception as e:
+            logger.warning("No se pudo aplicar el cambio de %s en las copias: %s", tabla, e)
+
+    evento = {'tabla': tabla, 'tipo': tipo, 'registro': registro}
+    ahora = time.monotonic()
+    with _lock:
+        _stats['recibidos'] += 1
+        for id_sesion in [s for s, (_, uso) in _sesiones.items() if ahora - uso > SESION_INACTIVA]:
+            del _sesiones[id_sesion]
+        for cola, _ in _sesiones.values():
+            if len(cola) == cola.maxlen:
+                cola.popleft()
+            cola.append(evento)
+
+
+def notificar_local(tabla, tipo, registro):
+    """Publica un cambio hecho por este proceso cuando no hay websocket.
+
+    Con Supabase Realtime el cambio vuelve por el websocket: aquí no se hace nada.
+    """
+    if MODO == 'local':
+        publicar(tabla, tipo, registro)
+
+
+def _cola_sesion(id_sesion):
+    with _lock:
+        entrada = _sesiones.get(id_sesion)
+        if entrada is None:
+            entrada = _sesiones[id_sesion] = [deque(maxlen=MAX_EVENTOS_SESION), 0.0]
+        entrada[1] = time.monotonic()
+        return entrada[0]
+
+
+def eventos_pendientes(id_sesion):
+    """Vacía y devuelve los eventos de la sesión."""
+    cola = _cola_sesion(id_sesion)
+    with _lock:
+        eventos = list(cola)
+        cola.clear()
+    return eventos
+
+
+def es_riesgo_alto(evento):
+    registro = evento['registro']
+    if evento['tabla'] == 'incidentes' and evento['tipo'] == 'INSERT':
+        try:
+            return float(registro.get('nivel_riesgo') or 0) >= UMBRAL_RIESGO_ALTO
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# ------------------------------------------------------------
+# Cliente de Supabase Realtime (protocolo Phoenix)
+# ------------------------------------------------------------
+def _url_websocket():
+    base = os.getenv("SUPABASE_URL", "").rstrip('/')
+    base = base.replace('https://', 'wss://').replace('http://', 'ws://')
+    return f"{base}/realtime/v1/websocket?apikey={os.getenv('SUPABASE_KEY')}&vsn=1.0.0"
+
+
+async def _sesion_websocket():
+    import websockets
+
+    async with websockets.connect(_url_websocket()) as ws:
+        await ws.send(json.dumps({
+            'topic': 'realtime:sst',
+            'event': 'phx_join',
+            'ref': '1',
+            'payload': {
+                'config': {'postgres_changes': [
+                    {'event': '*', 'schema': 'public', 'table': t} for t in TABLAS
+                ]},
+                'access_token': os.getenv('SUPABASE_KEY'),
+            },
+        }))
+        _stats['conectado'] = True
+
+        async def latidos():
+            while True:
+                await asyncio.sleep(LATIDO)
+                await ws.send(json.dumps({'topic': 'phoenix', 'event': 'heartbeat',
+                                          'payload': {}, 'ref': uuid.uuid4().hex}))
+
+        tarea_latidos = asyncio.create_task(latidos())
+        try:
+            async for mensaje in ws:
+                mensaje = json.loads(mensaje)
+                if mensaje.get('event') != 'postgres_changes':
+                    continue
+                datos = mensaje.get('payload', {}).get('data', {})
+                publicar(datos.get('table'), datos.get('type'),
+                         datos.get('record'), datos.get('old_record'))
+        finally:
+            tarea_latidos.cancel()
+            _stats['conectado'] = False
+
+
+def _escuchar():
+    espera = 1
+    while True:
+        try:
+            asyncio.run(_sesion_websocket())
+            espera = 1
+        except Exception as e:
+            logger.warning("Tiempo real desconectado (%s); reintento en %ss", e, espera)
+        _stats['reconexiones'] += 1
+        time.sleep(espera)
+        espera = min(espera * 2, 60)
+
+
+def iniciar():
+    """Arranca el hilo de escucha una vez por proceso (no-op en modo local/off)."""
+    global _hilo, MODO
+    if MODO != 'supabase':
+        return
+    with _lock:
+        if _hilo is not None:
+            return
+        if importlib.util.find_spec('websockets') is None:
+            # Sin websockets el hilo reintentaría para siempre sin conectarse
+            logger.error("Tiempo real desactivado: falta el paquete websockets (requirements.txt)")
+            MODO = 'off'
+            return
+        _hilo = threading.Thread(target=_escuchar, name="tiempo-real", daemon=True)
+        _hilo.start()
+
+
+def estadisticas_tiempo_real():
+    with _lock:
+        return dict(_stats, modo=MODO, sesiones=len(_sesiones))
+
+
+# ------------------------------------------------------------
+# Integración con Streamlit
+# ------------------------------------------------------------
+def _fragmento(funcion):
+    import streamlit as st
+    decorador = getattr(st, 'fragment', None) or st.experimental_fragment
+    return decorador(run_every=INTERVALO)(funcion)
+
+
+def mostrar_alertas(usuario, tablas_en_vivo=()):
+    """Contador de alertas y toasts; relanza la página si cambian `tablas_en_vivo`.
+
+    Las notificaciones solo se muestran a su destinatario (`usuario_id`).
+    """
+    import streamlit as st
+
+    if MODO == 'off':
+        return
+    if 'tiempo_real_id' not in st.session_state:
+        st.session_state.tiempo_real_id = uuid.uuid4().hex
+        st.session_state.alertas_riesgo = []
+    _monitor(st.session_state.tiempo_real_id, str(usuario['id']), tuple(tablas_en_vivo))
+
+
+def _monitor_cuerpo(id_sesion, usuario_id, tablas_en_vivo):
+    import streamlit as st
+
+    eventos = eventos_pendientes(id_sesion)
+    for evento in eventos:
+        registro = evento['registro']
+        if es_riesgo_alto(evento):
+            st.session_state.alertas_riesgo.append(registro)
+            st.toast(f"🔴 Incidente de riesgo {registro.get('nivel_riesgo')} en "
+                     f"{registro.get('area', 'N/A')}", icon="🚨")
+        elif evento['tabla'] == 'notificaciones' and evento['tipo'] == 'INSERT' \
+                and registro.get('tipo') != 'riesgo_alto' \
+                and str(registro.get('usuario_id')) == usuario_id:
+            st.toast(registro.get('titulo') or "Nueva notificación", icon="🔔")
+
+    alertas = st.session_state.alertas_riesgo
+    if alertas:
+        with st.expander(f"🔔 {len(alertas)} alerta(s) de riesgo alto", expanded=False):
+            for registro in alertas[-5:][::-1]:
+                st.caption(f"🔴 {registro.get('tipo', 'Incidente')} | {registro.get('area', 'N/A')} | "
+                           f"Riesgo {registro.get('nivel_riesgo')}")
+            if st.button("✔️ Marcar como vistas", key="alertas_vistas", use_container_width=True):
+                st.session_state.alertas_riesgo = []
+                st.rerun()
+
+    if any(e['tabla'] in tablas_en_vivo for e in eventos):
+        # Las copias de utils.sincronizacion ya tienen el cambio; lo que leía de la
+        # caché invalidada (p.ej. la RPC de KPIs) se vuelve a pedir al servidor
+        st.rerun()
+
+
+try:
+    _monitor = _fragmento(_monitor_cuerpo)
+except AttributeError:
+    # Sin fragmentos (Streamlit antiguo) el monitor corre con cada rerun
+    _monitor = _monitor_cuerpo
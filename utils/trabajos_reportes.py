@@ -0,0 +1,278 @@
+# utils/trabajos_reportes.py
+"""
+Cola de trabajos para generar reportes PDF/Excel fuera del hilo de Streamlit.
+
+- Cada tipo de reporte se registra con `registrar_tipo(tipo, funcion, ...)`;
+  `funcion(params)` devuelve los bytes del archivo o la ruta (`Path`) de un
+  archivo temporal, que se mueve al almacén sin pasar por memoria.
+- `encolar(tipo, params, usuario_id, nombre_archivo)` calcula la huella de
+  (tipo, params, versión de los datos). La versión de los datos es el último
+  `updated_at` y la última lápida de las `tablas` declaradas del tipo: un
+  reporte que cubre hoy se regenera en cuanto cambian sus tablas. Si ya hay
+  un resultado vigente con esa huella el trabajo nace terminado; si hay uno
+  igual en curso, espera a ese resultado.
+- Un pool de `REPORTES_WORKERS` hilos ejecuta los trabajos y guarda el
+  resultado en disco (`REPORTES_DIR`) o en el bucket (`REPORTES_ALMACEN=storage`).
+- `trabajos_de(usuario_id)` alimenta el panel "Mis reportes"; el historial se
+  conserva en `historial.jsonl` para sobrevivir a reinicios.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from supabase_client import supabase
+from utils.data_access import consultar
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = Path(os.getenv("REPORTES_DIR", ".cache/reportes"))
+ALMACEN = os.getenv("REPORTES_ALMACEN", "disco")
+MAX_WORKERS = int(os.getenv("REPORTES_WORKERS", "2"))
+# Un resultado con la misma huella se reutiliza durante este tiempo (segundos)
+VIGENCIA = int(os.getenv("REPORTES_VIGENCIA_HORAS", "24")) * 3600
+MAX_HISTORIAL = 500
+
+MIME = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+_lock = threading.Lock()
+_tipos = {}          # tipo -> (funcion, extension, version, tablas)
+_trabajos = {}       # id -> dict
+_en_curso = {}       # huella -> ids de los trabajos que esperan ese resultado
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="reportes")
+
+
+def registrar_tipo(tipo, funcion, extension='pdf', version=1, tablas=()):
+    """Registra el generador de un tipo de reporte.
+
+    Subir `version` al cambiar el diseño del reporte invalida los resultados
+    guardados con la versión anterior. `tablas` son las tablas que lee (con
+    `updated_at`); sus cambios invalidan los resultados guardados.
+    """
+    _tipos[tipo] = (funcion, extension, version, tuple(tablas))
+
+
+def version_datos(tablas):
+    """Último `updated_at` de cada tabla y última lápida; None si no se pudo leer."""
+    if not tablas:
+        return {}
+    try:
+        version = {}
+        for tabla in tablas:
+            ultima = consultar(tabla, 'updated_at', orden=('updated_at', True), limite=1, ttl=0)
+            version[tabla] = ultima[0]['updated_at'] if ultima else None
+        borrado = consultar('registros_eliminados', 'eliminado_en',
+                            filtros=[('in_', 'tabla', list(tablas))],
+                            orden=('eliminado_en', True), limite=1, ttl=0)
+        version['eliminados'] = borrado[0]['eliminado_en'] if borrado else None
+        return version
+    except Exception as e:
+        logger.warning("Sin versión de datos para %s: %s", ', '.join(tablas), e)
+        return None
+
+
+def huella(tipo, params, datos=None):
+    _, extension, version, _ = _tipos[tipo]
+    clave = json.dumps({'tipo': tipo, 'params': params, 'version': version, 'ext': extension,
+                        'datos': datos}, sort_keys=True, default=str)
+    return hashlib.sha256(clave.encode('utf-8')).hexdigest()
+
+
+# ------------------------------------------------------------
+# Almacenamiento de resultados
+# ------------------------------------------------------------
+def _ruta_objeto(clave, extension):
+    return f"reportes/{clave[:2]}/{clave}.{extension}"
+
+
+def _guardar_resultado(clave, extension, contenido):
+    """Guarda bytes o un archivo temporal (`Path`, que se consume); devuelve el tamaño."""
+    archivo = contenido if isinstance(contenido, Path) else None
+    tamano = archivo.stat().st_size if archivo else len(contenido)
+    try:
+        if ALMACEN == 'storage':
+            opciones = {'content-type': MIME.get(extension, 'application/octet-stream'), 'upsert': 'true'}
+            bucket = supabase.storage.from_(os.getenv("BUCKET_NAME"))
+            if archivo:
+                # Con un archivo abierto httpx envía el multipart por bloques
+                with open(archivo, 'rb') as origen:
+                    bucket.upload(_ruta_objeto(clave, extension), origen, opciones)
+            else:
+                bucket.upload(_ruta_objeto(clave, extension), contenido, opciones)
+        else:
+            destino = DIRECTORIO / _ruta_objeto(clave, extension)
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            temporal = destino.with_suffix('.tmp')
+            if archivo:
+                shutil.move(archivo, temporal)
+            else:
+                temporal.write_bytes(contenido)
+            temporal.replace(destino)
+    finally:
+        if archivo:
+            archivo.unlink(missing_ok=True)
+    _escribir_meta(clave, {'extension': extension, 'generado_en': time.time(), 'bytes': tamano})
+    return tamano
+
+
+def _meta_ruta(clave):
+    return DIRECTORIO / "meta" / f"{clave}.json"
+
+
+def _escribir_meta(clave, meta):
+    ruta = _meta_ruta(clave)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(json.dumps(meta), encoding='utf-8')
+
+
+def _resultado_vigente(clave):
+    try:
+        meta = json.loads(_meta_ruta(clave).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if time.time() - meta['generado_en'] > VIGENCIA:
+        return None
+    if ALMACEN != 'storage' and not (DIRECTORIO / _ruta_objeto(clave, meta['extension'])).exists():
+        return None
+    return meta
+
+
+def leer_resultado(trabajo):
+    """Bytes del archivo de un trabajo terminado."""
+    ruta = _ruta_objeto(trabajo['huella'], trabajo['extension'])
+    if ALMACEN == 'storage':
+        return supabase.storage.from_(os.getenv("BUCKET_NAME")).download(ruta)
+    return (DIRECTORIO / ruta).read_bytes()
+
+
+# ------------------------------------------------------------
+# Historial
+# ------------------------------------------------------------
+def _historial_ruta():
+    return DIRECTORIO / "historial.jsonl"
+
+
+def _anotar_historial(trabajo):
+    try:
+        DIRECTORIO.mkdir(parents=True, exist_ok=True)
+        with open(_historial_ruta(), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(trabajo, default=str) + "\n")
+    except OSError as e:
+        logger.warning("No se pudo escribir el historial de reportes: %s", e)
+
+
+def _cargar_historial():
+    try:
+        lineas = _historial_ruta().read_text(encoding='utf-8').splitlines()[-MAX_HISTORIAL:]
+    except OSError:
+        return
+    for linea in lineas:
+        try:
+            trabajo = json.loads(linea)
+        except ValueError:
+            continue
+        _trabajos[trabajo['id']] = trabajo
+
+
+# ------------------------------------------------------------
+# Cola
+# ------------------------------------------------------------
+def _ejecutar(id_trabajo):
+    with _lock:
+        trabajo = _trabajos[id_trabajo]
+        for id_espera in _en_curso.get(trabajo['huella'], []):
+            _trabajos[id_espera].update(estado='en_proceso', iniciado_en=time.time())
+    funcion, extension, _, _ = _tipos[trabajo['tipo']]
+    try:
+        contenido = funcion(trabajo['params'])
+        tamano = _guardar_resultado(trabajo['huella'], extension, contenido)
+        cambios = {'estado': 'listo', 'bytes': tamano}
+    except Exception as e:
+        logger.exception("Falló el reporte %s", trabajo['tipo'])
+        cambios = {'estado': 'error', 'error': str(e)}
+    with _lock:
+        terminados = []
+        for id_espera in _en_curso.pop(trabajo['huella'], [id_trabajo]):
+            if id_espera in _trabajos:
+                _trabajos[id_espera].update(cambios, terminado_en=time.time())
+                terminados.append(dict(_trabajos[id_espera]))
+    for terminado in terminados:
+        _anotar_historial(terminado)
+
+
+def encolar(tipo, params, usuario_id, nombre_archivo, forzar=False):
+    """Crea un trabajo y devuelve su id. `forzar` ignora el resultado guardado."""
+    _, extension, _, tablas = _tipos[tipo]
+    datos = version_datos(tablas)
+    # Sin versión de los datos no se puede saber si el resultado guardado sigue al día
+    forzar = forzar or datos is None
+    clave = huella(tipo, params, datos)
+    trabajo = {
+        'id': uuid.uuid4().hex,
+        'tipo': tipo,
+        'params': params,
+        'huella': clave,
+        'extension': extension,
+        'mime': MIME.get(extension, 'application/octet-stream'),
+        'nombre_archivo': nombre_archivo,
+        'usuario_id': str(usuario_id),
+        'creado_en': time.time(),
+        'estado': 'en_cola',
+    }
+
+    meta = None if forzar else _resultado_vigente(clave)
+    with _lock:
+        _trabajos[trabajo['id']] = trabajo
+        if meta is not None:
+            trabajo.update(estado='listo', desde_cache=True, bytes=meta.get('bytes'),
+                           terminado_en=time.time())
+        elif clave in _en_curso:
+            # El mismo reporte ya está en curso: este trabajo espera su resultado
+            _en_curso[clave].append(trabajo['id'])
+            return trabajo['id']
+        else:
+            _en_curso[clave] = [trabajo['id']]
+        en_curso = {i for ids in _en_curso.values() for i in ids}
+        for viejo in [i for i in _trabajos if i not in en_curso][:max(0, len(_trabajos) - MAX_HISTORIAL)]:
+            del _trabajos[viejo]
+
+    if meta is None:
+        _pool.submit(_ejecutar, trabajo['id'])
+    else:
+        _anotar_historial(dict(trabajo))
+    return trabajo['id']
+
+
+def trabajo(id_trabajo):
+    with _lock:
+        encontrado = _trabajos.get(id_trabajo)
+        return dict(encontrado) if encontrado else None
+
+
+def trabajos_de(usuario_id, limite=50):
+    """Trabajos del usuario, del más reciente al más antiguo."""
+    with _lock:
+        propios = [dict(t) for t in _trabajos.values() if t['usuario_id'] == str(usuario_id)]
+    propios.sort(key=lambda t: t['creado_en'], reverse=True)
+    return propios[:limite]
+
+
+def hay_pendientes(usuario_id):
+    return any(t['estado'] in ('en_cola', 'en_proceso') for t in trabajos_de(usuario_id))
+
+
+def formatear_instante(marca):
+    return datetime.fromtimestamp(marca).strftime('%d/%m/%Y %H:%M') if marca else '-'
+
+
+_cargar_historial()
@@ -0,0 +1,321 @@
+# utils/uploads.py
+"""
+Servicio compartido de subida de documentos y evidencias a Supabase Storage.
+
+- Las subidas corren en paralelo en un `ThreadPoolExecutor` acotado, así el
+  envío del formulario tarda aproximadamente lo que la subida más lenta.
+- La URL pública se arma localmente a partir de la ruta del objeto (sin la
+  llamada extra a `get_public_url`).
+- El progreso por archivo se reporta desde el hilo de Streamlit.
+- `subidas_con_rollback` borra los objetos subidos si falla la inserción
+  en la base de datos, salvo los del almacén direccionado por contenido.
+- Almacén direccionado por contenido: `ruta_por_contenido` deriva la ruta
+  del SHA-256 de los bytes (`cas/ab/abcd...pdf`). Si el objeto ya existe no
+  se vuelve a subir y todas las filas referencian la misma ruta canónica.
+  Un objeto `cas/` recién subido puede estar ya referenciado por otra sesión
+  que subió el mismo contenido, así que nunca se borra en un rollback: los
+  huérfanos los recoge `barrer_cas`, que solo borra objetos sin referencias
+  en `REFERENCIAS_CAS` y con más de `GRACIA_BARRIDO_HORAS` de antigüedad.
+
+Barrido de objetos `cas/` sin referencias:
+
+    python -m utils.uploads [--gracia-horas 24] [--simular]
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from urllib.parse import quote
+
+import streamlit as st
+
+from supabase_client import SUPABASE_URL, supabase
+from utils.data_access import consultar_pagina
+
+logger = logging.getLogger(__name__)
+
+# Subidas simultáneas como máximo por formulario
+MAX_SUBIDAS_CONCURRENTES = 4
+
+# Prefijo del almacén direccionado por contenido
+PREFIJO_CAS = 'cas'
+
+# Segundos que se confía en que un objeto CAS visto sigue existiendo
+# (otro proceso puede barrerlo); la subida siempre lo verifica en el bucket
+VIGENCIA_CONOCIDOS = 300
+
+# Columnas que guardan URLs de objetos CAS (texto o JSON de evidencias)
+REFERENCIAS_CAS = {
+    'documentos_sst': 'archivo_url',
+    'incidentes': 'evidencia',
+    'inspecciones': 'evidencia',
+    'epp': 'evidencia_entrega',
+}
+GRACIA_BARRIDO_HORAS = 24
+
+_RUTA_CAS = re.compile(rf"{PREFIJO_CAS}/[0-9a-f]{{2}}/[0-9a-f]{{64}}[\w.]*")
+
+_lock = threading.Lock()
+_objetos_conocidos = {}   # (bucket, ruta) -> instante en que se vio en el almacén CAS
+
+
+def _bucket(bucket):
+    return bucket or os.getenv("BUCKET_NAME")
+
+
+def url_publica(ruta, bucket=None):
+    """URL pública de un objeto, equivalente a `get_public_url` sin ir a la red."""
+    return f"{SUPABASE_URL.rstrip('/')}/storage/v1/object/public/{_bucket(bucket)}/{quote(ruta)}"
+
+
+def hash_contenido(contenido):
+    """SHA-256 hexadecimal de los bytes."""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def ruta_por_contenido(contenido=None, extension='', huella=None):
+    """Ruta canónica `cas/<2 hex>/<sha256><extension>`.
+
+    Se puede pasar la `huella` ya calculada para no volver a hashear.
+    """
+    huella = huella or hash_contenido(contenido)
+    if extension and not extension.startswith('.'):
+        extension = f".{extension}"
+    return f"{PREFIJO_CAS}/{huella[:2]}/{huella}{extension.lower()}"
+
+
+def extension_de(nombre):
+    """Extensión (con punto) de un nombre de archivo subido."""
+    return PurePosixPath(nombre).suffix.lower()
+
+
+def _es_cas(ruta):
+    return ruta.startswith(f"{PREFIJO_CAS}/")
+
+
+def existe_objeto(ruta, bucket=None, usar_cache=True):
+    """True si el objeto existe en el bucket (consulta `list` de la carpeta).
+
+    Con `usar_cache` se reutiliza lo visto en los últimos `VIGENCIA_CONOCIDOS`
+    segundos en este proceso.
+    """
+    bucket = _bucket(bucket)
+    if usar_cache:
+        with _lock:
+            visto = _objetos_conocidos.get((bucket, ruta))
+        if visto is not None and time.monotonic() - visto < VIGENCIA_CONOCIDOS:
+            return True
+
+    carpeta, _, nombre = ruta.rpartition('/')
+    try:
+        objetos = supabase.storage.from_(bucket).list(carpeta, {'search': nombre, 'limit': 100})
+    except Exception as e:
+        logger.warning("No se pudo verificar %s en el bucket: %s", ruta, e)
+        return False
+
+    existe = any(o.get('name') == nombre for o in objetos or [])
+    with _lock:
+        if existe:
+            _objetos_conocidos[(bucket, ruta)] = time.monotonic()
+        else:
+            _objetos_conocidos.pop((bucket, ruta), None)
+    return existe
+
+
+def _subir(bucket, ruta, contenido, tipo):
+    """Sube un objeto. Devuelve True si se subió, False si ya existía (CAS)."""
+    # Se consulta el bucket: la caché no prueba que otro proceso no lo haya barrido
+    if _es_cas(ruta) and existe_objeto(ruta, bucket, usar_cache=False):
+        return False
+
+    opciones = {"content-type": tipo} if tipo else None
+    try:
+        supabase.storage.from_(bucket).upload(ruta, contenido, file_options=opciones)
+    except Exception as e:
+        # Otra sesión subió el mismo contenido en paralelo
+        if not (_es_cas(ruta) and 'Duplicate' in str(e)):
+            raise
+        return False
+
+    if _es_cas(ruta):
+        with _lock:
+            _objetos_conocidos[(bucket, ruta)] = time.monotonic()
+    return True
+
+
+def eliminar_archivos(rutas, bucket=None):
+    """Borra objetos del bucket; los errores solo se registran (limpieza best-effort)."""
+    if not rutas:
+        return
+    bucket = _bucket(bucket)
+    try:
+        supabase.storage.from_(bucket).remove(list(rutas))
+    except Exception as e:
+        logger.warning("No se pudieron eliminar %s del bucket: %s", rutas, e)
+    with _lock:
+        for ruta in rutas:
+            _objetos_conocidos.pop((bucket, ruta), None)
+
+
+def _deshacer(rutas, bucket):
+    """Rollback: borra lo subido salvo los objetos CAS, que otra sesión puede
+    haber referenciado entre la subida y el fallo (los recoge `barrer_cas`)."""
+    eliminar_archivos([r for r in rutas if not _es_cas(r)], bucket)
+
+
+def _subir_todos(archivos, bucket, progreso, max_workers):
+    """Sube en paralelo; devuelve las rutas realmente subidas (no las ya existentes)."""
+    nuevas = []
+    error = None
+    completados = 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(archivos))) as executor:
+        futuros = {executor.submit(_subir, bucket, ruta, contenido, tipo): ruta
+                   for ruta, contenido, tipo in archivos}
+        for futuro in as_completed(futuros):
+            try:
+                if futuro.result():
+                    nuevas.append(futuros[futuro])
+            except Exception as e:
+                error = error or e
+                continue
+            completados += 1
+            if progreso:
+                progreso(completados, len(archivos), futuros[futuro])
+
+    if error is not None:
+        _deshacer(nuevas, bucket)
+        raise error
+    return nuevas
+
+
+def subir_archivos(archivos, bucket=None, progreso=None, max_workers=MAX_SUBIDAS_CONCURRENTES):
+    """Sube `archivos` en paralelo y devuelve sus URLs públicas (en el mismo orden).
+
+    `archivos` es una lista de tuplas `(ruta, contenido, content_type)`.
+    `progreso(completados, total, ruta)` se llama tras cada subida terminada.
+    Las rutas bajo `cas/` que ya existen no se vuelven a subir.
+    Si alguna subida falla se eliminan las ya completadas (salvo las `cas/`)
+    y se relanza el error.
+    """
+    bucket = _bucket(bucket)
+    archivos = list(archivos)
+    if not archivos:
+        return []
+    _subir_todos(archivos, bucket, progreso, max_workers)
+    return [url_publica(ruta, bucket) for ruta, _, _ in archivos]
+
+
+@contextmanager
+def subidas_con_rollback(archivos, bucket=None, progreso=None):
+    """Sube los archivos y entrega sus URLs; si el bloque falla, elimina los subidos.
+
+    Los objetos CAS nunca se eliminan aquí: otra sesión con el mismo contenido
+    puede referenciarlos ya. Si quedan huérfanos los borra `barrer_cas`.
+
+    Uso:
+        with subidas_con_rollback(archivos) as urls:
+            supabase.table('...').insert({... urls ...}).execute()
+    """
+    bucket = _bucket(bucket)
+    archivos = list(archivos)
+    nuevas = _subir_todos(archivos, bucket, progreso, MAX_SUBIDAS_CONCURRENTES) if archivos else []
+    try:
+        yield [url_publica(ruta, bucket) for ruta, _, _ in archivos]
+    except Exception:
+        _deshacer(nuevas, bucket)
+        raise
+
+
+def barra_progreso(texto="Subiendo evidencias"):
+    """Callback de progreso que pinta un `st.progress` en la página actual."""
+    barra = st.progress(0.0, text=texto)
+
+    def _actualizar(completados, total, ruta):
+        barra.progress(completados / total, text=f"{texto}: {completados}/{total}")
+
+    return _actualizar
+
+
+# ------------------------------------------------------------
+# Barrido de objetos CAS sin referencias
+# ------------------------------------------------------------
+def _rutas_referenciadas():
+    """Rutas `cas/...` que aparecen en las columnas de `REFERENCIAS_CAS`."""
+    rutas = set()
+    for tabla, columna in REFERENCIAS_CAS.items():
+        cursor = None
+        while True:
+            filas, cursor = consultar_pagina(tabla, f"id,{columna}",
+                                             claves=('id',), cursor=cursor, tamano=1000,
+                                             desc=False, ttl=0)
+            for fila in filas:
+                rutas.update(_RUTA_CAS.findall(str(fila.get(columna) or '')))
+            if cursor is None:
+                break
+    return rutas
+
+
+def _listar(bucket, carpeta):
+    """Entradas de una carpeta del bucket, por páginas."""
+    entradas, desplazamiento = [], 0
+    while True:
+        pagina = supabase.storage.from_(bucket).list(carpeta, {'limit': 1000, 'offset': desplazamiento}) or []
+        entradas.extend(pagina)
+        if len(pagina) < 1000:
+            return entradas
+        desplazamiento += len(pagina)
+
+
+def _antiguedad_horas(objeto):
+    creado = objeto.get('created_at')
+    if not creado:
+        return 0
+    instante = datetime.fromisoformat(creado.replace('Z', '+00:00'))
+    return (datetime.now(timezone.utc) - instante).total_seconds() / 3600
+
+
+def barrer_cas(bucket=None, gracia_horas=GRACIA_BARRIDO_HORAS, simular=False):
+    """Borra los objetos `cas/` sin referencias y más antiguos que `gracia_horas`.
+
+    La gracia cubre las subidas cuya fila aún no se ha insertado. Devuelve
+    las rutas borradas (o que se borrarían con `simular`).
+    """
+    bucket = _bucket(bucket)
+    referenciadas = _rutas_referenciadas()
+    huerfanas = []
+    for carpeta in _listar(bucket, PREFIJO_CAS):
+        # Las subcarpetas (`ab`) no tienen id
+        if carpeta.get('id') is not None:
+            continue
+        prefijo = f"{PREFIJO_CAS}/{carpeta['name']}"
+        for objeto in _listar(bucket, prefijo):
+            ruta = f"{prefijo}/{objeto['name']}"
+            if objeto.get('id') is None or ruta in referenciadas:
+                continue
+            if _antiguedad_horas(objeto) >= gracia_horas:
+                huerfanas.append(ruta)
+    if huerfanas and not simular:
+        for inicio in range(0, len(huerfanas), 100):
+            eliminar_archivos(huerfanas[inicio:inicio + 100], bucket)
+    return huerfanas
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Barrido de objetos CAS sin referencias")
+    parser.add_argument("--bucket", default=None)
+    parser.add_argument("--gracia-horas", type=float, default=GRACIA_BARRIDO_HORAS)
+    parser.add_argument("--simular", action="store_true", help="solo lista lo que se borraría")
+    args = parser.parse_args()
+
+    rutas = barrer_cas(args.bucket, args.gracia_horas, args.simular)
+    for ruta in rutas:
+        print(ruta)
+    print(f"{len(rutas)} objetos {'sin referencias' if args.simular else 'eliminados'}")